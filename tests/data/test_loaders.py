@@ -176,6 +176,55 @@ def class_split_config():
     }
 
 
+def test_persistent_workers(tensor_dataset):
+    seeds = {"torch": 0, "numpy": 0, "random": 0}
+
+    def get_epoch_vals(loader):
+        return torch.cat([torch.stack(batch[1:4], dim=1) for batch in loader])
+
+    loader = thelper.data.DataLoader(tensor_dataset, num_workers=2, batch_size=4, seeds=seeds)
+    expected_vals = [get_epoch_vals(loader) for _ in range(3)]
+    assert not torch.equal(expected_vals[0], expected_vals[1])
+    loader = thelper.data.DataLoader(tensor_dataset, num_workers=2, batch_size=4, seeds=seeds, persistent_workers=True)
+    assert len(loader) == 25
+    assert torch.equal(get_epoch_vals(loader), expected_vals[0])
+    loader.prefetch()
+    assert loader.epoch == 1
+    loader.set_epoch(1)  # same epoch as the prefetched one, should not drop it
+    assert torch.equal(get_epoch_vals(loader), expected_vals[1])
+    assert loader.epoch == 2
+    loader.prefetch()
+    loader.set_epoch(0)  # different epoch, the prefetched batches will be dropped
+    assert torch.equal(get_epoch_vals(loader), expected_vals[0])
+    loader.set_epoch(2)
+    assert torch.equal(get_epoch_vals(loader), expected_vals[2])
+    loader = thelper.data.DataLoader(tensor_dataset, num_workers=0, batch_size=4, seeds=seeds, persistent_workers=False)
+    loader.prefetch()  # no-op without persistent workers
+    assert loader.epoch == 0
+
+
+def test_tar_shard_split(class_split_config, verif_dir_path):
+    dataset = class_split_config["datasets"]["dataset_A"]
+    data_loader = thelper.data.DataLoader(dataset, num_workers=0, batch_size=32)
+    archive_path = os.path.join(verif_dir_path, "test.shards")
+    thelper.data.create_tar_shards(archive_path, dataset.task, data_loader, None, None, shard_size=100)
+    class_split_config["datasets"]["dataset_A"] = thelper.data.TarShardDataset(archive_path)
+    task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(class_split_config)
+    assert train_loader.sample_count == 500 + 700 and valid_loader.sample_count == 400 + 300
+    assert test_loader.sample_count == 100 + 1000
+    samples = {}
+    for loader in [train_loader, valid_loader, test_loader]:
+        for batch in loader:
+            for idx in range(batch["input"].size(0)):
+                name = batch["subset"][idx] + str(batch["idx"][idx].item())
+                assert name not in samples
+                samples[name] = batch["label"][idx].item()
+    assert len([name for name in samples if name.startswith("A")]) == 1000
+    class_split_config["loaders"]["train_sampler"] = {"type": "torch.utils.data.sampler.RandomSampler"}
+    with pytest.raises(AssertionError):
+        _ = thelper.data.create_loaders(class_split_config)
+
+
 def test_classif_split(class_split_config):
     task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(class_split_config)
     assert task.check_compat(class_split_config["datasets"]["dataset_A"].task, exact=True)
@@ -220,6 +269,62 @@ def test_classif_split_no_balancing(class_split_config):
     assert not bool(set(valid_samples) & set(test_samples))
 
 
+def test_classif_split_label_arrays(class_split_config):
+    dataset = class_split_config["datasets"]["dataset_A"]
+    task = dataset.task
+    samples = [{"label": task.class_names[idx % 10]} if idx % 7 else {} for idx in range(len(dataset))]
+    labels = task.get_class_label_array(samples)
+    assert labels.dtype == np.int64 and len(labels) == len(samples)
+    assert np.array_equal(labels, task.get_class_label_array(thelper.data.ColumnarSamples(samples)))
+    class_idxs = task.split_class_label_array(labels)
+    assert len(class_idxs) == len(task.class_names) + 1
+    assert all([np.all(np.diff(idxs) > 0) for idxs in class_idxs])
+    assert class_idxs[-1].tolist() == [idx for idx in range(len(samples)) if not idx % 7]
+    class_map = task.get_class_sample_map(samples, unset_key="<unset>")
+    assert class_map["<unset>"] == class_idxs[-1].tolist()
+    assert all([class_map[name] == class_idxs[idx].tolist() for idx, name in enumerate(task.class_names)])
+    factory = thelper.data.loaders.LoaderFactory(class_split_config["loaders"])
+    splits = factory.get_split(class_split_config["datasets"], task)
+    assert splits == factory.get_split(class_split_config["datasets"], task)
+
+
+def test_label_protocol(class_split_config, mocker):
+    dataset = class_split_config["datasets"]["dataset_A"]
+    task = dataset.task
+    expected_labels = np.asarray([sample["label"].item() for sample in dataset.samples])
+    assert np.array_equal(dataset.get_label_array(), expected_labels)
+    assert len(dataset.get_labels()) == len(dataset)
+    concat_dataset = thelper.data.ConcatDataset([dataset, class_split_config["datasets"]["dataset_B"]])
+    getitem = mocker.spy(DummyClassifDataset, "__getitem__")
+    assert task.get_class_sizes(concat_dataset) == {name: 200 for name in task.class_names}
+    assert len(concat_dataset.get_labels()) == 2000
+    assert dataset.get_label_array(thelper.tasks.Task("input")) is None
+    received_labels = []
+
+    class LabelSampler(torch.utils.data.sampler.Sampler):
+
+        def __init__(self, indices, labels):
+            super().__init__(None)
+            self.indices = indices
+            received_labels.extend(zip(indices, labels))
+
+        def __iter__(self):
+            return iter(self.indices)
+
+        def __len__(self):
+            return len(self.indices)
+
+    class_split_config["loaders"]["skip_class_balancing"] = True
+    class_split_config["loaders"]["train_sampler"] = {"type": LabelSampler, "pass_labels": True}
+    _ = thelper.data.create_loaders(class_split_config)
+    assert getitem.call_count == 0
+    assert len(received_labels) == 500 + 700
+    for idx, label in received_labels:
+        subset_idx, subset_offset = divmod(idx, 1000)
+        subset_dataset = class_split_config["datasets"]["dataset_" + "AB"[subset_idx]]
+        assert label == str(subset_dataset.samples[subset_offset]["label"].item())
+
+
 @pytest.fixture
 def augm_config():
 
@@ -369,6 +474,126 @@ def test_custom_sampler(sampler_config):
         _ = thelper.data.create_loaders(bad_sampler_config)
 
 
+class DummySizedDataset(thelper.data.Dataset):
+    def __init__(self, nb_samples):
+        super().__init__()
+        self.sizes = np.asarray([(12 + idx % 4, 8) if idx % 2 == 0 else (8, 12 + idx % 4) for idx in range(nb_samples)])
+        self.samples = [{"image": np.full((height, width, 3), idx, dtype=np.uint8), "idx": idx}
+                        for idx, (width, height) in enumerate(self.sizes)]
+        self.task = thelper.tasks.Task("image", meta_keys=["idx"])
+
+    def __getitem__(self, idx):
+        if self.transforms:
+            return self.transforms(self.samples[idx])
+        return self.samples[idx]
+
+    def get_sample_sizes(self):
+        return self.sizes
+
+
+def test_bucket_sampler_loader():
+    config = {
+        "datasets": {"sized": DummySizedDataset(40)},
+        "loaders": {
+            "batch_size": 4,
+            "train_split": {"sized": 1.0},
+            "train_sampler": {"type": "thelper.data.samplers.BucketBatchSampler", "params": {"bins": [1.0]},
+                              "pass_sizes": True},
+            "collate_fn": {"type": "thelper.data.loaders.padded_collate",
+                           "params": {"pad_keys": ["image"], "size_divisor": 4}},
+        }
+    }
+    _, train_loader, _, _ = thelper.data.create_loaders(config)
+    assert isinstance(train_loader.batch_sampler, thelper.data.samplers.BucketBatchSampler)
+    assert len(train_loader) == 10 and train_loader.sample_count == 40
+    seen_idxs = []
+    for batch in train_loader:
+        assert batch["image"].shape[0] == 4 and batch["image"].shape[1] % 4 == 0 and batch["image"].shape[2] % 4 == 0
+        assert len(set([idx % 2 for idx in batch["idx"].tolist()])) == 1
+        seen_idxs.extend(batch["idx"].tolist())
+    assert sorted(seen_idxs) == list(range(40))
+    train_loader.set_epoch(3)
+    assert train_loader.batch_sampler.epoch == 3
+    config["loaders"]["train_sampler"]["pass_sizes"] = False
+    with pytest.raises(TypeError):
+        _ = thelper.data.create_loaders(config)
+
+
+def test_padded_collate():
+    batch = [{"image": torch.ones(3, 5, 7), "idx": 0}, {"image": torch.ones(3, 6, 4), "idx": 1}]
+    output = thelper.data.loaders.padded_collate(batch, pad_keys=["image"])
+    assert output["image"].shape == (2, 3, 6, 7) and output["idx"].tolist() == [0, 1]
+    assert output["image"][0, :, :5, :].eq(1).all() and output["image"][0, :, 5:, :].eq(0).all()
+    assert output["image"][1, :, :, :4].eq(1).all() and output["image"][1, :, :, 4:].eq(0).all()
+    assert batch[0]["image"].shape == (3, 5, 7)  # the original samples should not be modified
+    batch = [{"image": np.ones((5, 7), dtype=np.uint8)}, {"image": np.ones((6, 4), dtype=np.uint8)}]
+    output = thelper.data.loaders.padded_collate(batch, pad_keys=["image"], pad_value=9, size_divisor=4)
+    assert output["image"].shape == (2, 8, 8)
+    assert output["image"][1, 6:, :].eq(9).all() and output["image"][1, :6, :4].eq(1).all()
+
+
+def test_defer_normalization():
+    dataset = DummySizedDataset(12)
+    dataset.transforms = thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.CenterCrop", "params": {"size": 8}, "target_key": "image"},
+        {"operation": "thelper.transforms.NormalizeMinMax", "params": {"min": 0, "max": 255}, "target_key": "image"},
+        {"operation": "thelper.transforms.Transpose", "params": {"axes": [2, 0, 1]}, "target_key": "image"},
+    ])
+    config = {"datasets": {"sized": dataset}, "loaders": {"batch_size": 4, "train_split": {"sized": 1.0}}}
+    _, train_loader, _, _ = thelper.data.create_loaders(config)
+    assert train_loader.device_transforms is None
+    expected = {idx: img for batch in train_loader for idx, img in zip(batch["idx"].tolist(), batch["image"])}
+    config["loaders"]["defer_normalization"] = True
+    _, train_loader, _, _ = thelper.data.create_loaders(config)
+    assert isinstance(train_loader.device_transforms, thelper.transforms.DeviceNormalize)
+    for batch in train_loader:
+        assert batch["image"].dtype == torch.uint8 and batch["image"].shape == (4, 8, 8, 3)
+        images = thelper.session.base.SessionRunner._move_input(batch["image"], "cpu", train_loader)
+        assert images.dtype == torch.float32 and images.shape == (4, 3, 8, 8)
+        assert all([torch.allclose(img, expected[idx]) for idx, img in zip(batch["idx"].tolist(), images)])
+    assert dataset.transforms[1].opcall.func.__class__ is thelper.transforms.NormalizeMinMax  # original is untouched
+
+
+def test_label_encoding_collate():
+    task = thelper.tasks.Classification(["cat", "dog", "bird"], "input", "label")
+    collate_fn = thelper.data.LabelEncodingCollate(task)
+    batch = collate_fn([{"input": np.zeros(2, dtype=np.float32), "label": lbl} for lbl in ["dog", "bird", "dog"]])
+    assert batch["label"].dtype == torch.int64 and batch["label"].tolist() == [1, 2, 1]
+    batch = collate_fn([{"input": np.zeros(2, dtype=np.float32), "label": lbl} for lbl in [2, 0]])
+    assert batch["label"].dtype == torch.int64 and batch["label"].tolist() == [2, 0]
+    batch = collate_fn([{"input": np.zeros(2, dtype=np.float32), "label": [lbl, lbl]} for lbl in ["cat", "dog"]])
+    assert isinstance(batch["label"], list) and [lbls.tolist() for lbls in batch["label"]] == [[0, 1], [0, 1]]
+    batch = collate_fn([{"input": np.zeros(2, dtype=np.float32), "label": None}] * 2)
+    assert batch["label"] is None
+    with pytest.raises(AssertionError):
+        _ = collate_fn([{"input": np.zeros(2, dtype=np.float32), "label": "fish"}])
+    task = thelper.tasks.Segmentation(["bg", "fg"], "input", "label_map")
+    collate_fn = thelper.data.LabelEncodingCollate(task)
+    batch = collate_fn([{"input": np.zeros((4, 4), dtype=np.float32), "label_map": np.ones((4, 4), dtype=np.uint8)}] * 2)
+    assert batch["label_map"].dtype == torch.int64 and batch["label_map"].shape == (2, 4, 4)
+    loader = thelper.data.DataLoader([{"input": 0, "label_map": np.ones((4, 4), dtype=np.uint8)}] * 4, batch_size=2)
+    assert loader.label_encoding_task is None
+    loader.set_label_encoding(task)
+    loader.set_label_encoding(task)  # should not wrap the collate function twice
+    assert loader.label_encoding_task is task and loader.collate_fn.collate_fn is thelper.data.default_collate
+    assert all([batch["label_map"].dtype == torch.int64 for batch in loader])
+    loader.set_label_encoding(None)
+    assert loader.collate_fn is thelper.data.default_collate
+
+
+def test_encode_labels_loaders(class_split_config):
+    class_split_config["loaders"]["encode_labels"] = True
+    for dataset in class_split_config["datasets"].values():
+        for sample in dataset.samples:
+            sample["label"] = dataset.task.class_names[sample["label"].item()]
+    task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(class_split_config)
+    for loader in [train_loader, valid_loader, test_loader]:
+        assert loader.label_encoding_task is task
+        batch = next(iter(loader))
+        assert batch["label"].dtype == torch.int64 and batch["label"].shape == (32,)
+        assert (batch["label"] >= 0).all() and (batch["label"] < 10).all()
+
+
 def test_default_collate():
     with pytest.raises(AssertionError):
         _ = thelper.data.loaders.default_collate([{"a": 1}, None, {"a": 3}])
@@ -399,6 +624,78 @@ def test_default_collate():
     assert len(batch) == 3 and all([isinstance(p, Potato) for p in batch])
 
 
+def test_default_collate_plans():
+    thelper.data.loaders._collate_plans.clear()
+    samples = [{"img": np.full((4, 3), idx, dtype=np.uint8), "lbl": idx, "val": idx / 2, "path": str(idx),
+                "t": torch.full((2,), idx, dtype=torch.float32)} for idx in range(5)]
+    for _ in range(2):  # first pass infers plans, second uses them
+        batch = thelper.data.loaders.default_collate(samples)
+        assert batch["img"].shape == (5, 4, 3) and batch["img"].dtype == torch.uint8
+        assert torch.equal(batch["img"][:, 0, 0], torch.arange(5, dtype=torch.uint8))
+        assert batch["lbl"].tolist() == list(range(5))
+        assert batch["val"].dtype == torch.float64
+        assert batch["path"] == [str(idx) for idx in range(5)]
+        assert torch.equal(batch["t"][:, 0], torch.arange(5, dtype=torch.float32))
+    plans = thelper.data.loaders._collate_plans[tuple(samples[0].keys())]
+    assert plans["img"][0] == "ndarray" and plans["img"][2] == (4, 3)
+    samples = [{**s, "img": np.zeros((2, 2), dtype=np.float32)} for s in samples]  # schema change
+    batch = thelper.data.loaders.default_collate(samples)
+    assert batch["img"].shape == (5, 2, 2) and batch["img"].dtype == torch.float32
+    assert plans["img"][1] == np.float32 and plans["img"][2] == (2, 2)
+    samples[1]["img"] = np.zeros((3, 3), dtype=np.float32)
+    with pytest.raises(RuntimeError):
+        _ = thelper.data.loaders.default_collate(samples)
+
+
+class BatchCountingDataset(thelper.data.Dataset):
+    def __init__(self, nb_samples, offset=0):
+        super().__init__()
+        self.samples = [{"idx": idx + offset} for idx in range(nb_samples)]
+        self.task = thelper.tasks.Task("idx")
+        self.batch_calls = 0
+
+    def __getitem__(self, idx):
+        return self.samples[idx]
+
+    def get_batch(self, idxs):
+        self.batch_calls += 1
+        return [{**self.samples[idx], "fetch": "batch"} for idx in idxs]
+
+
+def test_get_batch():
+    dataset = DummyClassifDataset(10, 2, "train")
+    assert dataset.get_batch([3, 1, 3]) == [dataset[3], dataset[1], dataset[3]]
+    dataset = BatchCountingDataset(10)
+    loader = thelper.data.DataLoader(dataset, batch_size=4, num_workers=0)
+    batches = [batch["idx"].tolist() for batch in loader]
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert dataset.batch_calls == (3 if thelper.data.loaders._batch_fetching_supported else 0)
+    datasets = [BatchCountingDataset(5), BatchCountingDataset(5, offset=5)]
+    concat = thelper.data.ConcatDataset(datasets)
+    assert [s["idx"] for s in concat.get_batch([9, 0, 6, 4, -1])] == [9, 0, 6, 4, 9]
+    assert datasets[0].batch_calls == 1 and datasets[1].batch_calls == 1
+    with pytest.raises(AssertionError):
+        _ = concat.get_batch([10])
+
+
+@pytest.mark.skipif(not thelper.data.loaders._batch_fetching_supported, reason="requires PyTorch v1.7+")
+def test_get_batch_workers():
+    dataset = BatchCountingDataset(10)
+    sampler = torch.utils.data.SequentialSampler(dataset)
+    loader = thelper.data.DataLoader(dataset, batch_size=3, sampler=sampler, num_workers=2)
+    assert loader.dataset is dataset and len(loader) == 4
+    for _ in range(2):
+        batches = [batch for batch in loader]
+        assert [batch["idx"].tolist() for batch in batches] == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+        assert all([batch["fetch"] == ["batch"] * len(batch["idx"]) for batch in batches])
+    assert dataset.batch_calls == 0  # all batches were fetched by the workers
+    loader = thelper.data.DataLoader(dataset, batch_size=4, num_workers=2, persistent_workers=True)
+    for _ in range(2):
+        batches = [batch for batch in loader]
+        assert [batch["idx"].tolist() for batch in batches] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        assert all([batch["fetch"] == ["batch"] * len(batch["idx"]) for batch in batches])
+
+
 class ExtDataSamples:
 
     def __init__(self, n=1000, m=10, subset="X", use_samples_attrib=True):
@@ -597,6 +894,30 @@ def test_sample_data_verif(verif_config, verif_dir_path, mocker):
     assert sum([subset == "D" for b in test_loader for subset in b["subset"]]) == 100
 
 
+def test_split_cache(verif_config, verif_dir_path, mocker):
+    verif_config["loaders"]["test_seed"] = 1
+    verif_config["loaders"]["valid_seed"] = 2
+    _, train_loader, valid_loader, test_loader = thelper.data.create_loaders(verif_config, save_dir=verif_dir_path)
+    split_path = os.path.join(verif_dir_path, "split.npz")
+    assert os.path.isfile(split_path)
+    get_split = mocker.spy(thelper.data.loaders.LoaderFactory, "get_split")
+    _, train_loader2, valid_loader2, test_loader2 = thelper.data.create_loaders(verif_config, save_dir=verif_dir_path)
+    assert get_split.call_count == 0
+    for loader, loader2 in [(train_loader, train_loader2), (valid_loader, valid_loader2), (test_loader, test_loader2)]:
+        assert list(loader.sampler.indices) == list(loader2.sampler.indices)
+    verif_config["loaders"]["valid_seed"] = 3
+    _ = thelper.data.create_loaders(verif_config, save_dir=verif_dir_path)
+    assert get_split.call_count == 1
+    factory = thelper.data.loaders.LoaderFactory(verif_config["loaders"])
+    assert factory.load_split(split_path, "potato") is None
+    train_idxs = {"a": [(0, 1), (2, "cat"), (4, (1, 2)), (5, None)], "b": [(1, None)]}
+    factory.save_split(split_path, "potato", train_idxs, {"a": [(3, 0)]}, {})
+    train_idxs2, valid_idxs2, test_idxs2 = factory.load_split(split_path, "potato")
+    assert train_idxs2 == train_idxs and valid_idxs2 == {"a": [(3, 0)], "b": []}
+    assert test_idxs2 == {"a": [], "b": []}
+    assert type(train_idxs2["a"][0][1]) is int and type(train_idxs2["a"][2][1]) is tuple
+
+
 def collate_fn(*args, **kwargs):  # pragma: no cover
     return torch.utils.data.dataloader.default_collate(*args, **kwargs)
 
@@ -703,3 +1024,14 @@ def test_loader_factory(class_split_config, mocker):
     assert factory.seeds["torch"] == 2
     assert factory.seeds["numpy"] == 3
     assert factory.seeds["random"] == 4
+
+
+def test_split_cache_replica(verif_config, verif_dir_path, mocker):
+    mocker.patch("torch.distributed.is_initialized", return_value=True)
+    mocker.patch("torch.distributed.get_rank", return_value=1)
+    mocker.patch("torch.distributed.get_world_size", return_value=2)
+    barrier = mocker.patch("torch.distributed.barrier")
+    _, train_loader, _, _ = thelper.data.create_loaders(verif_config, save_dir=verif_dir_path)
+    assert barrier.call_count == 1 and len(train_loader) > 0
+    assert not os.path.exists(os.path.join(verif_dir_path, "split.npz"))
+    assert not os.path.exists(os.path.join(verif_dir_path, "logs", "task.log"))
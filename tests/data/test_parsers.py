@@ -1,5 +1,8 @@
+import copy
 import os
+import pickle
 import shutil
+import sys
 
 import mock
 import numpy as np
@@ -12,6 +15,8 @@ test_save_path = ".pytest_cache"
 
 test_mnist_path = os.path.join(test_save_path, "mnist")
 test_hdf5_path = os.path.join(test_save_path, "test.hdf5")
+test_memmap_path = os.path.join(test_save_path, "test.memmap")
+test_shards_path = os.path.join(test_save_path, "test.shards")
 test_images_path = os.path.join(test_save_path, "images")
 test_folders_path = os.path.join(test_save_path, "folders")
 
@@ -171,6 +176,242 @@ def test_hdf5_dataset(fake_op, dummy_hdf5):
     hdf5_dataset.close()
 
 
+def test_hdf5_dataset_batched(dummy_hdf5):
+    hdf5_dataset = thelper.data.HDF5Dataset(test_hdf5_path, subset="train")
+    assert hdf5_dataset._archive is None  # handle should only be opened on first read
+    keys = dummy_hdf5.task.keys
+    for idxs in [[5, 2, 2, 9], list(range(10, 20)), [999, 0, 500]]:
+        batch = hdf5_dataset._getitems(idxs)
+        assert len(batch) == len(idxs)
+        for idx, sample in zip(idxs, batch):
+            for key in keys:
+                assert np.array_equal(dummy_hdf5[idx][key], sample[key])
+    assert len(hdf5_dataset.get_batch([3, 1])) == 2
+    assert hdf5_dataset._getitems([]) == []
+    with pytest.raises(AssertionError):
+        _ = hdf5_dataset._getitems([0, len(hdf5_dataset)])
+    # simulate a forked worker; the handle should be reopened, and never pickled
+    first_handle = hdf5_dataset.archive
+    hdf5_dataset._archive_pid = -1
+    assert hdf5_dataset.archive is not first_handle
+    import copy
+    dataset_copy = copy.copy(hdf5_dataset)
+    assert dataset_copy._archive is None
+    assert np.array_equal(dataset_copy[7]["1"], dummy_hdf5[7]["1"])
+    dataset_copy.close()
+    hdf5_dataset.close()
+
+
+def test_hdf5_dataset_parallel_chunked(request):
+
+    def fin():
+        if os.path.exists(test_hdf5_path):
+            os.remove(test_hdf5_path)
+
+    fin()
+    request.addfinalizer(fin)
+
+    class DummyImageDataset(thelper.data.Dataset):
+        def __init__(self, nb_samples, transforms=None, deepcopy=None):
+            super().__init__(transforms=transforms, deepcopy=deepcopy)
+            self.samples = []
+            for idx in range(nb_samples):
+                self.samples.append({"0": np.random.randint(255, size=(8, 6, 3), dtype=np.uint8),
+                                     "1": np.random.rand(4, 5).astype(np.float32), "2": idx})
+            self.task = thelper.tasks.Task(input_key="0", gt_key="1", meta_keys=["2"])
+
+        def __getitem__(self, idx):
+            return self.samples[idx]
+
+    dataset = DummyImageDataset(100)
+    data_loader = thelper.data.DataLoader(dataset, num_workers=0, batch_size=7)
+    compression = {"0": {"type": "png", "decode_params": {"flags": "cv.IMREAD_COLOR"}}}
+    with pytest.raises(AssertionError):
+        thelper.data.create_hdf5(test_hdf5_path, dataset.task, data_loader, None, None, compression, workers=-1)
+    thelper.data.create_hdf5(test_hdf5_path, dataset.task, data_loader, None, None, compression,
+                             workers=2, chunk_size=16, chunk_cache=2 ** 20)
+    import h5py
+    with h5py.File(test_hdf5_path, "r") as fd:
+        assert fd["train"]["1"].dtype == np.float32  # uncompressed arrays are kept in their native type
+        assert fd["train"]["1"].shape == (100, 4, 5)
+        assert fd["train"]["1"].chunks == (16, 4, 5)
+        assert "orig_shape" in fd["train"]["0"].attrs
+    hdf5_dataset = thelper.data.HDF5Dataset(test_hdf5_path, subset="train")
+    assert len(hdf5_dataset) == len(dataset)
+    for idx, sample in enumerate(hdf5_dataset._getitems(list(range(len(dataset))))):
+        for key in dataset.task.keys:
+            assert np.array_equal(dataset[idx][key], sample[key])
+    hdf5_dataset.close()
+    dataset = DummyImageDataset(5)  # fewer samples than the chunk size
+    data_loader = thelper.data.DataLoader(dataset, num_workers=0, batch_size=2)
+    thelper.data.create_hdf5(test_hdf5_path, dataset.task, data_loader, None, None, compression, chunk_size=16)
+    with h5py.File(test_hdf5_path, "r") as fd:
+        assert fd["train"]["1"].chunks == (5, 4, 5)
+        assert fd["train"]["2"].chunks == (5,)
+    hdf5_dataset = thelper.data.HDF5Dataset(test_hdf5_path, subset="train")
+    assert len(hdf5_dataset) == len(dataset)
+    assert np.array_equal(hdf5_dataset[4]["0"], dataset[4]["0"])
+    hdf5_dataset.close()
+
+
+def test_memmap_dataset(request):
+
+    def fin():
+        shutil.rmtree(test_memmap_path, ignore_errors=True)
+
+    fin()
+    request.addfinalizer(fin)
+
+    class DummyStringDataset(thelper.data.Dataset):
+        def __init__(self, nb_samples, transforms=None, deepcopy=None):
+            super().__init__(transforms=transforms, deepcopy=deepcopy)
+            self.samples = []
+            for idx in range(nb_samples):
+                self.samples.append({"0": np.random.rand(4, 5).astype(np.float32), "1": idx, "2": "sample_%d" % idx})
+            self.task = thelper.tasks.Task(input_key="0", gt_key="1", meta_keys=["2"])
+
+        def __getitem__(self, idx):
+            return self.samples[idx]
+
+    dataset = DummyStringDataset(30)
+    data_loader = thelper.data.DataLoader(dataset, num_workers=0, batch_size=4)
+    with pytest.raises(AssertionError):
+        thelper.data.create_memmap(test_memmap_path, dataset.task, data_loader, None, None, {"0": {"type": "png"}})
+    thelper.data.create_memmap(test_memmap_path, dataset.task, data_loader, None, None, shard_size=7)
+    assert len([f for f in os.listdir(os.path.join(test_memmap_path, "train")) if f.startswith("0.")]) == 5
+    memmap_dataset = thelper.data.MemmapDataset(test_memmap_path, subset="train")
+    assert len(memmap_dataset) == len(dataset)
+    assert memmap_dataset.task.check_compat(dataset.task, exact=True)
+    for idx in range(len(dataset)):
+        sample = memmap_dataset[idx]
+        assert np.array_equal(dataset[idx]["0"], sample["0"])
+        assert dataset[idx]["1"] == sample["1"]
+        assert dataset[idx]["2"] == sample["2"]
+    memmap_dataset_copy = copy.copy(memmap_dataset)
+    assert memmap_dataset_copy._shards is None
+    assert np.array_equal(memmap_dataset_copy[len(dataset) - 1]["0"], dataset[len(dataset) - 1]["0"])
+    assert np.array_equal(memmap_dataset[-1]["0"], dataset[len(dataset) - 1]["0"])
+    assert memmap_dataset[-len(dataset)]["1"] == dataset[0]["1"]
+    for idx in [len(dataset), -len(dataset) - 1]:
+        with pytest.raises(AssertionError):
+            _ = memmap_dataset[idx]
+    with pytest.raises(AssertionError):
+        _ = thelper.data.MemmapDataset(test_memmap_path, subset="valid")
+
+
+def test_tar_shard_dataset(request):
+
+    def fin():
+        shutil.rmtree(test_shards_path, ignore_errors=True)
+
+    fin()
+    request.addfinalizer(fin)
+
+    class DummyImageDataset(thelper.data.Dataset):
+        def __init__(self, nb_samples, transforms=None, deepcopy=None):
+            super().__init__(transforms=transforms, deepcopy=deepcopy)
+            self.samples = []
+            for idx in range(nb_samples):
+                self.samples.append({"0": np.random.randint(255, size=(8, 6, 3), dtype=np.uint8),
+                                     "1": idx, "2": "sample_%d" % idx})
+            self.task = thelper.tasks.Task(input_key="0", gt_key="1", meta_keys=["2"])
+
+        def __getitem__(self, idx):
+            return self.samples[idx]
+
+    dataset = DummyImageDataset(30)
+    data_loader = thelper.data.DataLoader(dataset, num_workers=0, batch_size=4)
+    with pytest.raises(AssertionError):
+        thelper.data.create_tar_shards(test_shards_path, dataset.task, data_loader, None, None, {"0": {"type": "lz4"}})
+    thelper.data.create_tar_shards(test_shards_path, dataset.task, data_loader, None, None,
+                                   {"0": {"type": "png"}}, shard_size=7)
+    assert len(os.listdir(os.path.join(test_shards_path, "train"))) == 5
+    shard_dataset = thelper.data.TarShardDataset(test_shards_path, subset="train", shuffle=False)
+    assert len(shard_dataset) == len(dataset) and shard_dataset.shard_count == 5
+    assert shard_dataset.task.check_compat(dataset.task, exact=True)
+    with pytest.raises(AssertionError):
+        _ = shard_dataset[0]
+    samples = list(shard_dataset)
+    assert len(samples) == len(dataset)
+    for idx, sample in enumerate(samples):
+        assert np.array_equal(dataset[idx]["0"], sample["0"])
+        assert dataset[idx]["1"] == sample["1"]
+        assert dataset[idx]["2"] == sample["2"]
+    shard_dataset = thelper.data.TarShardDataset(test_shards_path, subset="train", shuffle_buffer=10,
+                                                 transforms=lambda s: {**s, "1": s["1"] + 100})
+    shard_dataset.set_epoch(0)
+    order0 = [sample["1"] for sample in shard_dataset]
+    assert sorted(order0) == list(range(100, 130)) and order0 != sorted(order0)
+    shard_dataset.set_epoch(0)
+    assert [sample["1"] for sample in shard_dataset] == order0
+    shard_dataset.set_epoch(1)
+    assert [sample["1"] for sample in shard_dataset] != order0
+    subset_dataset = shard_dataset.select_shards([0, 4])
+    assert len(subset_dataset) == 9 and len(shard_dataset) == 30
+    assert sorted([sample["1"] for sample in subset_dataset]) == [*range(100, 107), 128, 129]
+    subset_dataset = thelper.data.TarShardDataset(test_shards_path, subset="train", shuffle=False).select_shards([0, 4])
+    loader = thelper.data.DataLoader(subset_dataset, batch_size=1, num_workers=5)  # more workers than shards
+    assert sorted([batch["1"].item() for batch in loader]) == [*range(0, 7), 28, 29]
+    with pytest.raises(AssertionError):
+        _ = thelper.data.TarShardDataset(test_shards_path, subset="valid")
+
+
+def test_columnar_samples():
+    with pytest.raises(AssertionError):
+        _ = thelper.data.ColumnarSamples()
+    with pytest.raises(AssertionError):
+        _ = thelper.data.ColumnarSamples(columns={"a": [0, 1], "b": [0]})
+    samples = [{"idx": idx, "val": idx / 2, "flag": idx % 2 == 0, "name": "sample%d" % idx,
+                "label": str(idx % 3), "box": [idx, idx + 1]} for idx in range(30)]
+    samples[5]["extra"] = None
+    samples[6]["extra"] = "x"
+    store = thelper.data.ColumnarSamples(samples)
+    assert len(store) == len(samples)
+    assert list(store) == samples
+    assert store[-1] == samples[-1]
+    assert store[2:5] == samples[2:5]
+    with pytest.raises(IndexError):
+        _ = store[len(samples)]
+    assert type(store[3]["idx"]) is int and type(store[3]["flag"]) is bool
+    assert store.keys == ["idx", "val", "flag", "name", "label", "box", "extra"]
+    assert store._columns["idx"][0] == "scalar"
+    assert store._columns["name"][0] == "str"
+    assert store._columns["label"][0] == "category"
+    assert store._columns["box"][0] == "pickle"
+    assert np.array_equal(store.column("idx"), np.arange(30))
+    assert list(store.column("label")) == [s["label"] for s in samples]
+    assert store.column("name") == [s["name"] for s in samples]
+    store_copy = copy.deepcopy(store)
+    assert list(store_copy) == samples
+    store = thelper.data.ColumnarSamples(columns={"p": np.arange(4, dtype=np.int16), "q": ["a", "b", "c", "d"]})
+    assert store[1] == {"p": 1, "q": "b"} and store[1]["p"].dtype == np.int16
+
+
+def test_packed_files(request):
+    def fin():
+        shutil.rmtree(test_images_path, ignore_errors=True)
+    fin()
+    request.addfinalizer(fin)
+    os.makedirs(test_images_path, exist_ok=True)
+    paths = []
+    for idx in range(5):
+        paths.append(os.path.join(test_images_path, str(idx) + ".bin"))
+        with open(paths[-1], "wb") as fd:
+            fd.write(bytes([idx]) * idx * 100)
+    for shared_memory in [False, True] if sys.version_info >= (3, 8) else [False]:
+        files = thelper.data.PackedFiles(paths + [None], io_threads=2, shared_memory=shared_memory, chunk_size=2)
+        assert len(files) == 6 and files.nbytes == 1000
+        for idx in range(5):
+            assert files[idx].tobytes() == bytes([idx]) * idx * 100
+        assert len(files[-1]) == 0
+        with pytest.raises(IndexError):
+            _ = files[6]
+        assert copy.deepcopy(files) is files
+        files_copy = pickle.loads(pickle.dumps(files))
+        assert files_copy[4].tobytes() == files[4].tobytes()
+        files.close()
+
+
 def test_classif_dataset():
     with pytest.raises(AssertionError):
         _ = thelper.data.ClassificationDataset(["0", "1"], None, "label")
@@ -236,6 +477,53 @@ def test_image_dataset(fake_op, fake_image_root, mocker):
         _ = dataset[0]
 
 
+def test_image_dataset_index_cache(fake_image_root, mocker, request):
+    cache_dir = test_images_path + "_cache"
+
+    def fin():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    fin()
+    request.addfinalizer(fin)
+    mocker.patch.object(thelper.data.utils, "default_index_cache_dir", cache_dir)
+    dataset = thelper.data.ImageDataset(fake_image_root)
+    assert len(dataset) == 10 and not os.path.exists(cache_dir)  # the manifest cache is opt-in
+    dataset = thelper.data.ImageDataset(fake_image_root, index_cache=True)
+    assert len(dataset) == 10 and len(os.listdir(cache_dir)) == 1
+    fin()
+    dataset = thelper.data.ImageDataset(fake_image_root, index_cache=cache_dir)
+    assert len(dataset) == 10 and len(os.listdir(cache_dir)) == 1
+
+
+def test_image_dataset_decode_size(fake_image_root, mocker):
+    fake_imread = mocker.patch("cv2.imread")
+    fake_imread.side_effect = lambda path, flags=-1: np.full((2, 2, 3), flags)
+    fake_flags = mocker.patch("thelper.data.utils.get_image_decode_flags")
+    fake_flags.side_effect = lambda image, min_size: min_size[0]
+    with pytest.raises(AssertionError):
+        _ = thelper.data.ImageDataset(fake_image_root, decode_size="potato")
+    dataset = thelper.data.ImageDataset(fake_image_root, decode_size=64)
+    assert dataset[0]["image"][0, 0, 0] == 64
+    dataset = thelper.data.ImageDataset(fake_image_root, decode_size="auto")
+    assert dataset[0]["image"][0, 0, 0] == -1 and fake_flags.call_count == 1
+    dataset.transforms = thelper.transforms.Compose([
+        thelper.transforms.wrappers.TransformWrapper("thelper.transforms.Resize", {"dsize": [32, 16]}, target_keys=["image"]),
+    ])
+    fake_resize = mocker.patch.object(thelper.transforms.Resize, "__call__")
+    fake_resize.side_effect = lambda x: x
+    assert dataset[0]["image"][0, 0, 0] == 32
+
+
+def test_image_dataset_sample_sizes(fake_image_root, mocker):
+    fake_read_sizes = mocker.patch("thelper.data.utils.read_image_sizes")
+    fake_read_sizes.side_effect = lambda images, io_threads: np.tile([[4, 3]], (len(images), 1))
+    dataset = thelper.data.ImageDataset(fake_image_root)
+    assert thelper.data.Dataset.get_sample_sizes(dataset) is None
+    assert dataset.get_sample_sizes().tolist() == [[4, 3]] * 10
+    assert copy.copy(dataset).get_sample_sizes().shape == (10, 2)
+    assert fake_read_sizes.call_count == 1  # sizes are only read once, and shared with copies
+
+
 @pytest.fixture
 def fake_image_folder_root(request):
     def fin():
@@ -291,6 +579,40 @@ def test_image_folder_dataset(fake_op, fake_image_folder_root, mocker):
         _ = thelper.data.ImageFolderDataset(fake_image_folder_root)
 
 
+def test_image_folder_dataset_io_threads(fake_image_folder_root, mocker):
+    fake_imread = mocker.patch("cv2.imread")
+    fake_imread.side_effect = lambda x: x
+    fake_decode = mocker.patch("thelper.data.utils.decode_image")
+    fake_decode.side_effect = lambda x: x
+    with pytest.raises(AssertionError):
+        _ = thelper.data.ImageFolderDataset(fake_image_folder_root, io_threads=-1)
+    dataset = thelper.data.ImageFolderDataset(fake_image_folder_root, io_threads=2)
+    samples = dataset.get_batch([0, 5, -1])
+    assert len(samples) == 3
+    assert fake_decode.call_count == 3 and not fake_imread.called
+    for sample, idx in zip(samples, [0, 5, 99]):
+        assert sample["idx"] == idx
+        assert sample["image"] == b""  # empty placeholder files
+        assert sample["label"] == dataset[idx]["label"]
+    with pytest.raises(AssertionError):
+        _ = dataset.get_batch([len(dataset)])
+
+
+def test_image_folder_dataset_preload(fake_image_folder_root, mocker):
+    fake_imread = mocker.patch("cv2.imread")
+    fake_decode = mocker.patch("thelper.data.utils.decode_image")
+    fake_decode.side_effect = lambda x: np.zeros((4, 4, 3), dtype=np.uint8) if x is not None else None
+    with pytest.raises(AssertionError):
+        _ = thelper.data.ImageFolderDataset(fake_image_folder_root, preload=True)
+    dataset = thelper.data.ImageFolderDataset(fake_image_folder_root, preload="encoded", io_threads=2)
+    assert len(dataset.image_files) == 100 and dataset.image_files.nbytes == 0  # empty placeholder files
+    samples = dataset.get_batch([0, 5, -1])
+    assert [sample["idx"] for sample in samples] == [0, 5, 99]
+    assert fake_decode.call_count == 3 and not fake_imread.called
+    assert dataset[7]["image"].shape == (4, 4, 3)
+    assert not fake_imread.called
+
+
 @mock.patch.object(thelper.transforms.CenterCrop, "__call__")
 def test_superres_dataset(fake_op, fake_image_folder_root, mocker):
     fake_imread = mocker.patch("cv2.imread")
@@ -362,3 +684,68 @@ def test_superres_dataset(fake_op, fake_image_folder_root, mocker):
                 os.remove(os.path.join(folder, file))
     with pytest.raises(AssertionError):
         _ = thelper.data.SuperResFolderDataset(fake_image_folder_root, downscale_factor=4)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="shared memory requires python 3.8+")
+def test_shared_sample_cache():
+    with pytest.raises(AssertionError):
+        _ = thelper.data.SharedSampleCache(0, 10)
+    cache = thelper.data.SharedSampleCache(4 * 1024, 10, block_size=512)
+    assert cache.block_count == 8 and len(cache) == 0
+    assert cache.get(0) is None
+    assert cache.put(0, {"0": np.arange(10)})
+    assert np.array_equal(cache.get(0)["0"], np.arange(10))
+    assert copy.deepcopy(cache) is cache
+    assert not cache.put(1, {"0": np.zeros(8 * 1024, dtype=np.uint8)})  # too large for the whole pool
+    big_sample = {"0": np.full(1500, 7, dtype=np.uint8)}  # 4 blocks once pickled
+    assert cache.put(1, big_sample)
+    assert cache.get(0) is not None  # refresh access time of sample 0 (sample 1 is now the oldest)
+    assert cache.put(2, big_sample)  # does not fit, sample 1 gets evicted
+    assert cache.get(1) is None
+    assert cache.get(0) is not None and np.array_equal(cache.get(2)["0"], big_sample["0"])
+    assert len(cache) == 2
+    cache.close()
+    caches = [thelper.data.SharedSampleCache(4 * 1024, 10, block_size=512, key="same") for _ in range(2)]
+    assert caches[0].put(0, {"0": 0}) and caches[1].put(0, {"0": 1})
+    assert caches[0].get(0)["0"] == 0 and caches[1].get(0)["0"] == 1  # caches never share entries
+    for cache in caches:
+        cache.close()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="shared memory requires python 3.8+")
+def test_cached_dataset():
+    dataset = DummyIntegerDataset(100, transforms=lambda s: {"0": s["0"] + 1000})
+    with pytest.raises(AssertionError):
+        _ = thelper.data.CachedDataset([0, 1, 2], 1024)
+    cached = thelper.data.CachedDataset(dataset, 64 * 1024, block_size=1024)
+    assert dataset.transforms is None and cached.transforms is not None
+    assert len(cached) == 100 and cached.task is dataset.task
+    with mock.patch.object(DummyIntegerDataset, "__getitem__", wraps=dataset.__getitem__) as fake_getitem:
+        assert cached[5]["0"] == 1005
+        assert cached[-1]["0"] == 1099
+        assert fake_getitem.call_count == 2
+        samples = cached.get_batch([5, 6, 99])
+        assert [s["0"] for s in samples] == [1005, 1006, 1099]
+        assert fake_getitem.call_count == 3  # only sample #6 was missing
+        assert copy.copy(cached)[6]["0"] == 1006
+        assert fake_getitem.call_count == 3
+    with pytest.raises(AssertionError):
+        _ = cached[100]
+    cached.close()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason="shared memory requires python 3.8+")
+def test_cached_dataset_config(fake_image_root, mocker):
+    fake_imread = mocker.patch("cv2.imread")
+    fake_imread.side_effect = lambda x: np.zeros((4, 4, 3), dtype=np.uint8)
+    datasets, task = thelper.data.create_parsers({"datasets": {
+        "images": {"type": "thelper.data.ImageDataset", "params": {"root": fake_image_root}, "cache": 1024 * 1024},
+        "images_nocache": {"type": "thelper.data.ImageDataset", "params": {"root": fake_image_root}},
+    }})
+    assert isinstance(datasets["images"], thelper.data.CachedDataset)
+    assert not isinstance(datasets["images_nocache"], thelper.data.CachedDataset)
+    assert datasets["images"].cache.key is not None
+    assert np.array_equal(datasets["images"][3]["image"], datasets["images_nocache"][3]["image"])
+    _ = datasets["images"][3]
+    assert fake_imread.call_count == 2
+    datasets["images"].close()
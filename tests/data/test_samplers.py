@@ -185,3 +185,129 @@ def test_subset_random_epoch_step(fake_dataset, sampler_type):
     for idx in sampler:
         epoch0_reset_label_groups[fake_dataset[1][idx]].append(fake_dataset[0][idx])
     assert epoch0_reset_label_groups == epoch0_label_groups
+
+
+@pytest.mark.parametrize("stype", ["uniform", "random", "root2"])
+def test_sampler_determinism(fake_multimodal_dataset, stype):
+    indices, labels = fake_multimodal_dataset
+    sampler = thelper.data.samplers.WeightedSubsetRandomSampler(
+        indices=indices, labels=labels, stype=stype, scale=1.5, seeds={"torch": 42})
+    assert list(sampler.label_groups.keys()) == [0, 1, 2]
+    assert all([isinstance(group, np.ndarray) for group in sampler.label_groups.values()])
+    epoch0_idxs = list(sampler)
+    assert len(epoch0_idxs) == len(sampler) and all([isinstance(idx, int) for idx in epoch0_idxs])
+    assert set(epoch0_idxs) <= set(indices.tolist())
+    epoch1_idxs = list(sampler)
+    assert epoch0_idxs != epoch1_idxs
+    sampler.set_epoch(0)
+    assert list(sampler) == epoch0_idxs
+    sampler_copy = thelper.data.samplers.WeightedSubsetRandomSampler(
+        indices=list(indices), labels=np.asarray(labels), stype=stype, scale=1.5, seeds={"torch": 42})
+    assert list(sampler_copy) == epoch0_idxs
+    sampler = thelper.data.samplers.SubsetRandomSampler(indices, seeds={"torch": 42}, scale=2.5)
+    epoch0_idxs = list(sampler)
+    sample_counts = np.bincount(epoch0_idxs)[indices]
+    assert len(epoch0_idxs) == 25000 and sample_counts.min() == 2 and sample_counts.max() == 3
+    sampler.set_epoch(0)
+    assert list(sampler) == epoch0_idxs
+
+
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_distributed_subset_random(drop_last):
+    indices = np.random.permutation(1001)
+    shards = [list(thelper.data.samplers.DistributedSubsetRandomSampler(
+        indices, seeds={"torch": 7}, num_replicas=4, rank=rank, drop_last=drop_last)) for rank in range(4)]
+    assert all([len(shard) == (250 if drop_last else 251) for shard in shards])
+    merged = [idx for shard in shards for idx in shard]
+    if drop_last:
+        assert len(set(merged)) == 1000 and set(merged) <= set(indices.tolist())
+    else:
+        assert set(merged) == set(indices.tolist())
+    sampler = thelper.data.samplers.DistributedSubsetRandomSampler(
+        indices, seeds={"torch": 7}, num_replicas=4, rank=1, drop_last=drop_last)
+    assert len(sampler) == len(shards[1]) and list(sampler) == shards[1]
+    assert list(sampler) != shards[1]
+    sampler.set_epoch(0)
+    assert list(sampler) == shards[1]
+
+
+def test_distributed_weighted_subsets(fake_multimodal_dataset):
+    indices, labels = fake_multimodal_dataset
+    sampler = thelper.data.samplers.WeightedSubsetRandomSampler(
+        indices, labels, stype="uniform", scale=1.0, seeds={"torch": 3})
+    full_idxs = list(sampler)
+    shards = [thelper.data.samplers.DistributedWeightedSubsetRandomSampler(
+        indices, labels, stype="uniform", scale=1.0, seeds={"torch": 3}, num_replicas=3, rank=rank)
+        for rank in range(3)]
+    assert all([len(shard) == 3334 for shard in shards])
+    shard_idxs = [list(shard) for shard in shards]
+    assert full_idxs == [shard_idxs[idx % 3][idx // 3] for idx in range(len(full_idxs))]
+    weights = {0: 2.0, 1: 1.0, 2: 0.5}
+    sampler = thelper.data.samplers.FixedWeightSubsetSampler(indices, labels, weights, seeds={"torch": 3})
+    full_idxs = list(sampler)
+    shards = [thelper.data.samplers.DistributedFixedWeightSubsetSampler(
+        indices, labels, weights, seeds={"torch": 3}, num_replicas=2, rank=rank, drop_last=True)
+        for rank in range(2)]
+    assert sorted([idx for shard in shards for idx in shard]) == sorted(full_idxs[:len(full_idxs) // 2 * 2])
+
+
+def test_distributed_process_group(tmpdir):
+    import torch.distributed
+    if not torch.distributed.is_available():  # pragma: no cover
+        pytest.skip("torch.distributed is not available")
+    init_method = "file://" + str(tmpdir.join("dist_store"))
+    torch.distributed.init_process_group("gloo", init_method=init_method, world_size=1, rank=0)
+    try:
+        sampler = thelper.data.samplers.DistributedSubsetRandomSampler(list(range(100)))
+        assert sampler.num_replicas == 1 and sampler.rank == 0
+        assert sorted(sampler) == list(range(100))
+        with pytest.raises(AssertionError):
+            _ = thelper.data.samplers.DistributedSubsetRandomSampler(list(range(100)), num_replicas=2, rank=2)
+    finally:
+        torch.distributed.destroy_process_group()
+
+
+def test_bucket_batch_sampler():
+    indices = list(range(100, 200))
+    sizes = [(640, 480) if idx % 2 == 0 else (480, 640) for idx in range(100)]
+    sizes[99] = (-1, -1)
+    with pytest.raises(AssertionError):
+        _ = thelper.data.samplers.BucketBatchSampler(indices, sizes[:50], batch_size=8)
+    with pytest.raises(AssertionError):
+        _ = thelper.data.samplers.BucketBatchSampler(indices, sizes, batch_size=8, bucket_by="potato")
+    sampler = thelper.data.samplers.BucketBatchSampler(indices, sizes, batch_size=8, seeds={"torch": 0})
+    assert len(sampler) == 13 and sampler.sample_count == 100
+    batches = list(sampler)
+    assert len(batches) == 13 and sorted([idx for batch in batches for idx in batch]) == indices
+    full_batches = [batch for batch in batches if len(batch) == 8]
+    assert len(full_batches) == 12
+    assert all([len(set([idx % 2 for idx in batch])) == 1 for batch in full_batches])
+    assert sampler.epoch == 1
+    assert list(sampler) != batches
+    sampler.set_epoch(0)
+    assert list(sampler) == batches
+    sampler = thelper.data.samplers.BucketBatchSampler(indices, sizes, batch_size=8, drop_last=True, shuffle=False)
+    batches = list(sampler)
+    assert len(sampler) == len(batches) == 12 and sampler.sample_count == 96
+    assert batches == list(sampler)
+    sampler = thelper.data.samplers.BucketBatchSampler(indices, sizes, batch_size=10, bucket_by="size", bins=[500])
+    assert len(sampler.buckets) == 3 and len(sampler) == 10
+
+
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_distributed_bucket_batch_sampler(drop_last):
+    indices = list(range(100))
+    sizes = [(640, 480) if idx % 2 == 0 else (480, 640) for idx in range(100)]
+    sampler = thelper.data.samplers.BucketBatchSampler(indices, sizes, batch_size=8, drop_last=drop_last)
+    shards = [thelper.data.samplers.DistributedBucketBatchSampler(indices, sizes, batch_size=8, drop_last=drop_last,
+                                                                  num_replicas=3, rank=rank) for rank in range(3)]
+    assert all([len(shard) == len(shards[0]) for shard in shards])
+    assert len(shards[0]) == (len(sampler) // 3 if drop_last else -(-len(sampler) // 3))
+    shard_batches = [list(shard) for shard in shards]
+    assert all([len(batch) == 8 for batches in shard_batches for batch in batches])
+    shard_idxs = set([idx for batches in shard_batches for batch in batches for idx in batch])
+    if drop_last:
+        assert len(shard_idxs) == len(shards[0]) * 3 * 8
+    else:
+        assert shard_idxs == set(indices)
+    assert shards[0].sample_count == len(shards[0]) * 8
@@ -1,5 +1,14 @@
+import os
+import shutil
+
+import cv2 as cv
+import numpy as np
+
 import thelper
 
+test_save_path = ".pytest_cache"
+test_index_path = os.path.join(test_save_path, "index")
+
 
 class DummyClassifDataset(thelper.data.Dataset):
     def __init__(self, nb_samples, nb_classes):
@@ -58,3 +67,74 @@ def test_class_weights_root_vs_linear():
         elif lbl_count > len(dataset) / len(dataset.task.class_names):
             assert linear_weights[lbl] > root2_weights[lbl]
             assert root3_weights[lbl] < root2_weights[lbl]
+
+
+def test_index_folder(request):
+
+    def fin():
+        shutil.rmtree(test_index_path, ignore_errors=True)
+
+    fin()
+    request.addfinalizer(fin)
+    data_root, cache_dir = os.path.join(test_index_path, "data"), os.path.join(test_index_path, "cache")
+    for cls in range(3):
+        os.makedirs(os.path.join(data_root, str(cls), "sub"))
+        for idx in range(4):
+            open(os.path.join(data_root, str(cls), "%d.jpg" % idx), "a").close()
+        open(os.path.join(data_root, str(cls), "sub", "x.PNG"), "a").close()
+        open(os.path.join(data_root, str(cls), "dummy.txt"), "a").close()
+    exts = thelper.data.utils.image_folder_exts
+    expected = [(os.path.relpath(folder, data_root) if folder != data_root else "",
+                 [f for f in files if os.path.splitext(f)[1].lower() in exts])
+                for folder, _, files in os.walk(data_root)]
+    for workers in [0, 2]:
+        folders, files = thelper.data.utils.index_folder(data_root, exts, cache_dir=cache_dir, workers=workers)
+        assert list(zip(folders, files)) == expected
+    assert len(os.listdir(cache_dir)) == 1
+    open(os.path.join(data_root, "1", "sub", "y.jpg"), "a").close()
+    os.makedirs(os.path.join(data_root, "3"))
+    open(os.path.join(data_root, "3", "0.jpg"), "a").close()
+    folders, files = thelper.data.utils.index_folder(data_root, exts, cache_dir=cache_dir)
+    assert files[folders.index("3")] == ["0.jpg"]
+    assert sorted(files[folders.index(os.path.join("1", "sub"))]) == ["x.PNG", "y.jpg"]
+    folders, files = thelper.data.utils.index_folder(data_root, None)
+    assert "dummy.txt" in files[folders.index("0")]
+
+
+def test_image_decode_flags(request):
+    def fin():
+        shutil.rmtree(test_index_path, ignore_errors=True)
+    fin()
+    request.addfinalizer(fin)
+    os.makedirs(test_index_path, exist_ok=True)
+    image_path = os.path.join(test_index_path, "large.jpg")
+    cv.imwrite(image_path, np.random.randint(0, 255, (600, 800, 3), dtype=np.uint8))
+    assert thelper.data.utils.get_image_decode_flags(image_path, (100, 100)) == cv.IMREAD_REDUCED_COLOR_4
+    assert thelper.data.utils.get_image_decode_flags(image_path, (224, 224)) == cv.IMREAD_REDUCED_COLOR_2
+    assert thelper.data.utils.get_image_decode_flags(image_path, (640, 480)) is None
+    assert thelper.data.utils.get_image_decode_flags(image_path, (50, 50)) == cv.IMREAD_REDUCED_COLOR_8
+    buffer = thelper.data.utils.read_file(image_path)
+    flags = thelper.data.utils.get_image_decode_flags(buffer, (100, 100))
+    assert thelper.data.utils.decode_image(buffer, flags).shape == (150, 200, 3)
+    assert thelper.data.utils.get_image_decode_flags(b"garbage", (100, 100)) is None
+
+
+def test_read_image_sizes(request):
+    def fin():
+        shutil.rmtree(test_index_path, ignore_errors=True)
+    fin()
+    request.addfinalizer(fin)
+    os.makedirs(test_index_path, exist_ok=True)
+    paths = []
+    for idx, shape in enumerate([(60, 80, 3), (80, 60), (10, 10, 3)]):
+        paths.append(os.path.join(test_index_path, f"{idx}.png"))
+        cv.imwrite(paths[-1], np.zeros(shape, dtype=np.uint8))
+    assert thelper.data.utils.get_image_size(paths[0]) == (80, 60)
+    assert thelper.data.utils.get_image_size(b"garbage") is None
+    expected_sizes = [[80, 60], [60, 80], [10, 10], [-1, -1]]
+    images = paths + [os.path.join(test_index_path, "missing.png")]
+    assert thelper.data.utils.read_image_sizes(images).tolist() == expected_sizes
+    assert thelper.data.utils.read_image_sizes(images, io_threads=2).tolist() == expected_sizes
+    buffers = [thelper.data.utils.read_file(path) for path in paths]
+    assert thelper.data.utils.read_image_sizes(buffers).tolist() == expected_sizes[:3]
+    assert thelper.data.utils.read_image_sizes([]).shape == (0, 2)
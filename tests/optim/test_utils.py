@@ -0,0 +1,31 @@
+import pytest
+import torch
+
+import thelper
+
+
+class DummyClassifModel(torch.nn.Module):
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self.fc = torch.nn.Linear(4, len(task.class_names))
+
+    def forward(self, x):
+        return self.fc(x)
+
+
+def test_create_loss_fn_ddp_model(tmpdir):
+    import torch.distributed
+    if not torch.distributed.is_available():  # pragma: no cover
+        pytest.skip("torch.distributed is not available")
+    task = thelper.tasks.Classification(["a", "b", "c"], "input", "label")
+    config = {"type": "torch.nn.CrossEntropyLoss", "weight_distribution": {"a": 2.0, "b": 1.0, "c": 0.5}}
+    init_method = "file://" + str(tmpdir.join("dist_store"))
+    torch.distributed.init_process_group("gloo", init_method=init_method, world_size=1, rank=0)
+    try:
+        model = torch.nn.parallel.DistributedDataParallel(DummyClassifModel(task))
+        loss = thelper.optim.create_loss_fn(config, model)
+        assert isinstance(loss, torch.nn.CrossEntropyLoss)
+        assert torch.allclose(loss.weight, torch.FloatTensor([2.0, 1.0, 0.5]))
+    finally:
+        torch.distributed.destroy_process_group()
@@ -438,3 +438,37 @@ def test_export_model_weights(export_config):
     ckptdata = thelper.utils.load_checkpoint(export_ckpt_path)
     model = thelper.nn.create_model(config=None, task=None, ckptdata=ckptdata)
     assert model(torch.rand(1, 3, 224, 224)).shape == (1, 10)
+
+
+def test_get_distributed_config(simple_config):
+    assert thelper.train.get_distributed_config(simple_config) is None
+    simple_config["trainer"]["distributed"] = 1
+    assert thelper.train.get_distributed_config(simple_config) is None
+    simple_config["trainer"]["distributed"] = 2
+    dist_config = thelper.train.get_distributed_config(simple_config)
+    assert dist_config["nprocs"] == 2 and dist_config["backend"] == "gloo"
+    assert dist_config["init_method"] is None and dist_config["threads"] >= 1
+    simple_config["trainer"]["distributed"] = {"nprocs": 3, "threads": 2}
+    dist_config = thelper.train.get_distributed_config(simple_config)
+    assert dist_config["nprocs"] == 3 and dist_config["threads"] == 2
+    simple_config["trainer"]["distributed"] = {"threads": 2}
+    with pytest.raises(AssertionError):
+        _ = thelper.train.get_distributed_config(simple_config)
+
+
+def test_create_session_distributed(simple_config, mocker):
+    fake_launch = mocker.patch.object(thelper.train, "launch_distributed", return_value={})
+    fake_train = mocker.patch.object(thelper.train.base.Trainer, "train")
+    simple_config["trainer"]["distributed"] = 2
+    assert thelper.cli.create_session(simple_config, test_save_path) == {}
+    assert fake_launch.call_count == 1
+    assert fake_launch.call_args[0][0] is thelper.cli._create_session
+    assert fake_launch.call_args[0][1]["nprocs"] == 2
+    assert fake_train.call_count == 0
+
+
+def test_launch_distributed():
+    if not torch.distributed.is_available():  # pragma: no cover
+        pytest.skip("torch.distributed is not available")
+    dist_config = {"nprocs": 2, "backend": "gloo", "init_method": None, "threads": 1}
+    assert thelper.train.launch_distributed(torch.distributed.get_world_size, dist_config) == 2
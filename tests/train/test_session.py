@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import torch
+
+import thelper
+
+
+class DummyClassifRunner(thelper.train.ImageClassifTrainer):
+    def __init__(self, task, prefetch_batches):  # skips the session setup, only the batch iteration is tested
+        self.task = task
+        self.prefetch_batches = prefetch_batches
+
+
+@pytest.fixture
+def classif_loader():
+    task = thelper.tasks.Classification(["a", "b", "c"], "input", "label")
+    samples = [{"input": np.full((2, 3), idx, dtype=np.float32), "label": "abc"[idx % 3], "idx": idx} for idx in range(30)]
+    loader = thelper.data.DataLoader(samples, batch_size=4, num_workers=2, seeds={"torch": 0, "numpy": 0, "random": 0})
+    return task, loader
+
+
+def test_iter_batches(classif_loader):
+    task, loader = classif_loader
+    expected = list(DummyClassifRunner(task, 0)._iter_batches(loader, "cpu"))
+    assert len(expected) == len(loader)
+    for sample, input_val, label, input_dev, label_dev in expected:
+        assert input_val.dtype == torch.float32 and input_val.shape[1:] == (2, 3)
+        assert torch.equal(label, torch.as_tensor([idx % 3 for idx in sample["idx"].tolist()]))
+        assert torch.equal(input_dev, input_val) and torch.equal(label_dev, label)
+    for prefetch_batches in [1, 3]:
+        runner = DummyClassifRunner(task, prefetch_batches)
+        batches = list(runner._iter_batches(loader, "cpu"))
+        assert len(batches) == len(expected)
+        for batch, expected_batch in zip(batches, expected):
+            assert torch.equal(batch[0]["idx"], expected_batch[0]["idx"])
+            assert all([torch.equal(t, expected_t) for t, expected_t in zip(batch[1:], expected_batch[1:])])
+        for idx, batch in enumerate(runner._iter_batches(loader, "cpu", upload_gt=False)):
+            assert batch[4] is None
+            if idx == 2:
+                break  # the prefetching thread should be stopped cleanly
+
+
+def test_iter_batches_transforms(classif_loader):
+    task, loader = classif_loader
+    loader.batch_transforms = lambda tensor, target: (tensor * 2, target)
+    for prefetch_batches in [0, 2]:
+        batches = list(DummyClassifRunner(task, prefetch_batches)._iter_batches(loader, "cpu"))
+        assert len(batches) == len(loader)
+        for sample, input_val, label, input_dev, label_dev in batches:
+            assert torch.equal(input_dev, input_val * 2) and label_dev is not None
+            assert torch.equal(label, torch.as_tensor([idx % 3 for idx in sample["idx"].tolist()]))
+    loader.batch_transforms = thelper.transforms.BatchRandomFlip(probability=1)
+    images, label_maps = torch.rand(4, 3, 5, 6), torch.randint(0, 3, (4, 5, 6))
+    batch = ({}, images, label_maps, images.clone(), label_maps.clone())
+    _, input_val, label_map, input_dev, label_map_dev = DummyClassifRunner._apply_batch_transforms(batch, loader)
+    assert input_val is images and torch.equal(input_dev, images.flip(-1))
+    assert torch.equal(label_map, label_maps.flip(-1)) and torch.equal(label_map_dev, label_maps.flip(-1))
+    batch = ({}, images, label_maps, images.clone(), None)
+    _, _, label_map, _, label_map_dev = DummyClassifRunner._apply_batch_transforms(batch, loader)
+    assert torch.equal(label_map, label_maps.flip(-1)) and label_map_dev is None
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import torch
+
+import thelper
+import thelper.transforms
+
+
+@pytest.fixture
+def batch():
+    torch.manual_seed(0)
+    images = torch.rand(16, 3, 6, 8)
+    label_maps = torch.randint(0, 4, (16, 6, 8), dtype=torch.int64)
+    return images, label_maps
+
+
+def test_batch_random_flip(batch):
+    images, label_maps = batch
+    out_images, out_label_maps = thelper.transforms.BatchRandomFlip(probability=0.5)(images, label_maps)
+    flipped = []
+    for idx in range(images.shape[0]):
+        flipped.append(torch.equal(out_images[idx], images[idx].flip(-1)))
+        assert flipped[-1] or torch.equal(out_images[idx], images[idx])
+        assert torch.equal(out_label_maps[idx], label_maps[idx].flip(-1) if flipped[-1] else label_maps[idx])
+    assert any(flipped) and not all(flipped)
+    out_images, out_labels = thelper.transforms.BatchRandomFlip("vertical", probability=1)(images, torch.arange(16))
+    assert torch.equal(out_images, images.flip(-2)) and torch.equal(out_labels, torch.arange(16))
+
+
+def test_batch_random_resized_crop(batch):
+    images, label_maps = batch
+    op = thelper.transforms.BatchRandomResizedCrop(output_size=(8, 6), probability=0)
+    out_images, out_label_maps = op(images, label_maps)
+    assert torch.allclose(out_images, images, atol=1e-5) and torch.equal(out_label_maps, label_maps)
+    op = thelper.transforms.BatchRandomResizedCrop(output_size=(5, 4), scale=(0.2, 0.5))
+    out_images, out_label_maps = op(images, label_maps)
+    assert out_images.shape == (16, 3, 4, 5) and out_images.dtype == torch.float32
+    assert out_label_maps.shape == (16, 4, 5) and out_label_maps.dtype == torch.int64
+    assert set(out_label_maps.unique().tolist()) <= set(label_maps.unique().tolist())
+    out_images, _ = op(torch.full((4, 3, 6, 8), 7, dtype=torch.uint8))
+    assert torch.allclose(out_images, torch.full((4, 3, 4, 5), 7.0))
+    assert "output_size=(5, 4)" in repr(op)
+
+
+def test_batch_random_affine(batch):
+    images, label_maps = batch
+    out_images, out_label_maps = thelper.transforms.BatchRandomAffine()(images, label_maps)
+    assert torch.allclose(out_images, images, atol=1e-5) and torch.equal(out_label_maps, label_maps)
+    op = thelper.transforms.BatchRandomAffine(scale=(0.5, 0.5), target_fill=255)
+    out_images, out_label_maps = op(torch.full((4, 3, 8, 8), 2.0), torch.ones((4, 8, 8), dtype=torch.int64))
+    assert torch.allclose(out_images[:, :, 3:5, 3:5], torch.full((4, 3, 2, 2), 2.0))
+    assert torch.allclose(out_images[:, :, 0, 0], torch.zeros((4, 3)))
+    assert (out_label_maps[:, 3:5, 3:5] == 1).all() and (out_label_maps[:, 0, 0] == 255).all()
+    op = thelper.transforms.BatchRandomAffine(degrees=30, translate=(0.1, 0.1), scale=(0.9, 1.1), probability=0.5)
+    out_images, out_label_maps = op(images, label_maps)
+    assert out_images.shape == images.shape and out_label_maps.shape == label_maps.shape
+    unchanged = [torch.equal(out_label_maps[idx], label_maps[idx]) for idx in range(images.shape[0])]
+    assert any(unchanged) and not all(unchanged)
+
+
+def test_batch_color_jitter(batch):
+    images, label_maps = batch
+    out_images, out_label_maps = thelper.transforms.BatchColorJitter(brightness=0.5, probability=0)(images, label_maps)
+    assert torch.allclose(out_images, images) and out_label_maps is label_maps
+    out_images, _ = thelper.transforms.BatchColorJitter(brightness=0.5)(torch.full((32, 3, 2, 2), 100, dtype=torch.uint8))
+    factors = out_images[:, 0, 0, 0] / 100
+    assert out_images.dtype == torch.float32 and ((factors >= 0.5) & (factors <= 1.5)).all()
+    assert torch.allclose(out_images, factors.view(-1, 1, 1, 1).expand_as(out_images) * 100)
+    gray_images = images[:, :1].expand_as(images).contiguous()
+    out_images, _ = thelper.transforms.BatchColorJitter(saturation=0.5)(gray_images)
+    assert torch.allclose(out_images, gray_images, atol=1e-5)
+    out_images, _ = thelper.transforms.BatchColorJitter(contrast=0.9, max_value=1)(images)
+    assert out_images.min() >= 0 and out_images.max() <= 1
+    assert not torch.allclose(out_images, images)
+
+
+def test_batch_normalize_pipeline(batch):
+    images, label_maps = batch
+    transforms = thelper.transforms.load_batch_transforms([
+        {"operation": "thelper.transforms.batch.BatchRandomFlip", "params": {"probability": 1}},
+        {"operation": "thelper.transforms.batch.BatchNormalize", "params": {"mean": [0.5, 0.2, 0.1], "std": [0.5, 2, 4]}},
+    ])
+    assert isinstance(transforms, thelper.transforms.BatchCompose) and len(transforms.transforms) == 2
+    out_images, out_label_maps = transforms(images, label_maps)
+    mean, std = torch.as_tensor([0.5, 0.2, 0.1]).view(1, 3, 1, 1), torch.as_tensor([0.5, 2, 4]).view(1, 3, 1, 1)
+    assert torch.allclose(out_images, (images.flip(-1) - mean) / std)
+    assert torch.equal(out_label_maps, label_maps.flip(-1))
+    assert "BatchNormalize(mean=[0.5" in repr(transforms)
+    op = thelper.transforms.load_batch_transforms([
+        {"operation": "thelper.transforms.batch.BatchNormalize", "params": {"mean": np.zeros(2), "std": np.ones(2)}}])
+    assert isinstance(op, thelper.transforms.BatchNormalize)
+    assert torch.equal(op(torch.ones(3, 2))[0], torch.ones(3, 2))
+    assert thelper.transforms.load_batch_transforms([]) is None
@@ -1,6 +1,8 @@
 # noinspection PyPackageRequirements
 import mock
 import numpy as np
+import PIL.Image
+import torch
 
 import thelper
 import thelper.transforms
@@ -51,3 +53,118 @@ def test_transform_stochastic_pipeline(fake_op1, fake_op2):
     ])
     out = transforms(sample)
     assert np.array_equal(out, sample)
+
+
+def test_output_size_hint():
+    transforms = thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.Resize", "params": {"dsize": [320, 240]}},
+        {"operation": "thelper.transforms.CenterCrop", "params": {"size": [200, 200]}},
+    ])
+    assert thelper.transforms.get_output_size_hint(transforms) == (320, 240)
+    assert thelper.transforms.get_output_size_hint(thelper.transforms.Compose([
+        thelper.transforms.wrappers.TransformWrapper("thelper.transforms.CenterCrop", {"size": 10}, target_keys=["mask"]),
+        transforms,
+    ]), "image") == (320, 240)
+    assert thelper.transforms.get_output_size_hint(thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.RandomResizedCrop", "params": {"output_size": 224}},
+    ])) is None  # area-based crops depend on the input aspect ratio
+    assert thelper.transforms.get_output_size_hint(thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.RandomResizedCrop",
+         "params": {"output_size": [224, 112], "input_size": [[0.25, 0.1], [1.0, 1.0]], "ratio": None}},
+    ])) == (896, 1120)
+    assert thelper.transforms.get_output_size_hint(thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.RandomResizedCrop", "params": {"output_size": 224, "input_size": [100, 200]}},
+    ])) is None
+    assert thelper.transforms.get_output_size_hint(thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.CenterCrop", "params": {"size": [200, 200]}},
+        {"operation": "thelper.transforms.Resize", "params": {"dsize": [320, 240]}},
+    ])) is None
+    assert thelper.transforms.get_output_size_hint(thelper.transforms.load_transforms([
+        {"operation": "thelper.transforms.Resize", "params": {"dsize": [0, 0], "fx": 0.5}},
+    ])) is None
+    assert thelper.transforms.get_output_size_hint(None) is None
+
+
+def test_split_device_transforms():
+    stages = [
+        {"operation": "thelper.transforms.CenterCrop", "params": {"size": [6, 4]}, "target_key": "image"},
+        {"operation": "thelper.transforms.NormalizeMinMax", "params": {"min": 0, "max": 255}, "target_key": "image"},
+        {"operation": "thelper.transforms.NormalizeZeroMeanUnitVar", "params": {"mean": [0.4, 0.5, 0.6], "std": [0.2, 0.3, 0.4]},
+         "target_key": "image"},
+        {"operation": "thelper.transforms.Transpose", "params": {"axes": [2, 0, 1]}, "target_key": "image"},
+    ]
+    transforms = thelper.transforms.load_transforms(stages)
+    remaining, device_transforms = thelper.transforms.split_device_transforms(transforms, "image")
+    assert isinstance(remaining, thelper.transforms.TransformWrapper) and remaining is transforms[0]
+    assert isinstance(device_transforms, thelper.transforms.DeviceNormalize)
+    assert [step[0] for step in device_transforms.steps] == ["affine", "permute"]  # normalizations were fused
+    images = [np.random.randint(256, size=(8, 8, 3), dtype=np.uint8) for _ in range(4)]
+    expected = np.stack([transforms({"image": image})["image"] for image in images])
+    output = np.stack([remaining({"image": image})["image"] for image in images])
+    assert output.dtype == np.uint8 and output.shape == (4, 4, 6, 3)
+    output = device_transforms(torch.from_numpy(output))
+    assert output.dtype == torch.float32 and output.shape == (4, 3, 4, 6)
+    assert np.allclose(output.numpy(), expected, atol=1e-5)
+    stages[1]["target_key"] = ["image", "mask"]  # stages that also touch other keys cannot be moved
+    transforms = thelper.transforms.load_transforms(stages)
+    remaining, device_transforms = thelper.transforms.split_device_transforms(transforms, "image")
+    assert len(remaining.transforms) == 2 and remaining[0] is transforms[0] and remaining[1] is transforms[1]
+    assert [type(op) for op in device_transforms.operations] == [thelper.transforms.NormalizeZeroMeanUnitVar,
+                                                                 thelper.transforms.Transpose]
+    transforms = thelper.transforms.load_transforms(stages[-1:])
+    assert thelper.transforms.split_device_transforms(transforms, "image") == (transforms, None)
+    assert thelper.transforms.split_device_transforms(None, "image") == (None, None)
+
+
+def test_transform_wrapper_layout_plan():
+    wrapper = thelper.transforms.TransformWrapper(np.flipud, probability=0.5, target_keys=["input", "mask"])
+    samples = [{"input": np.random.rand(4, 3), "mask": np.arange(12).reshape(4, 3), "idx": idx} for idx in range(20)]
+    np.random.seed(0)
+    outputs = [wrapper(sample) for sample in samples]
+    next_val = np.random.randint(1000)
+    assert list(wrapper._layout_plans.values()) == [["input", "mask"]]
+    np.random.seed(0)
+    with mock.patch.object(wrapper, "_get_layout_plan", return_value=None):
+        expected = [wrapper(sample) for sample in samples]
+    assert np.random.randint(1000) == next_val  # the random state should be consumed in the same way
+    flipped = []
+    for out, exp, sample in zip(outputs, expected, samples):
+        assert list(out.keys()) == list(exp.keys()) and out["idx"] == exp["idx"]
+        assert np.array_equal(out["input"], exp["input"]) and np.array_equal(out["mask"], exp["mask"])
+        flipped.append(np.array_equal(out["mask"], sample["mask"][::-1]))
+    assert any(flipped) and not all(flipped)
+    out = wrapper({"input": [samples[0]["input"]] * 2, "mask": [samples[0]["mask"]] * 2})
+    assert len(out["input"]) == 2 and len(out["mask"]) == 2
+    assert len(wrapper._layout_plans) == 2 and list(wrapper._layout_plans.values())[1] is None
+    wrapper = thelper.transforms.TransformWrapper(lambda x: x * 2)
+    out = wrapper({"input": torch.arange(6).view(3, 2), "idx": torch.tensor(3)})
+    assert torch.equal(out["input"], torch.arange(6).view(3, 2) * 2) and out["idx"].item() == 3
+    assert list(wrapper._layout_plans.values()) == [None]
+
+
+def test_transform_wrapper_pil_chain():
+    received, returned = [], []
+
+    def flip(image):
+        received.append(image)
+        returned.append(image.transpose(PIL.Image.FLIP_LEFT_RIGHT))
+        return returned[-1]
+
+    transforms = thelper.transforms.Compose([
+        thelper.transforms.TransformWrapper(flip, convert_pil=True, target_keys=["input"]),
+        thelper.transforms.TransformWrapper(flip, convert_pil=True, target_keys=["input"]),
+        thelper.transforms.TransformWrapper(flip, convert_pil=True, target_keys=["input"]),
+    ])
+    image = (np.random.rand(5, 6, 3) * 255).astype(np.uint8)
+    out = transforms({"input": image, "idx": 0})
+    assert isinstance(out["input"], np.ndarray) and np.array_equal(out["input"], image[:, ::-1])
+    assert len(received) == 3 and all([isinstance(r, PIL.Image.Image) for r in received])
+    assert received[1] is returned[0] and received[2] is returned[1]
+    received.clear()
+    out = transforms(image[..., 0:1])
+    assert isinstance(out, np.ndarray) and np.array_equal(out, image[:, ::-1, 0])
+    assert len(received) == 3 and received[1].mode == "L"
+    transforms.transforms[1].target_keys = None  # breaks the chain on both sides of the second wrapper
+    out = transforms({"input": image, "idx": 0})
+    assert np.array_equal(out["input"], image[:, ::-1])
+    assert returned[-2] is not received[-1]
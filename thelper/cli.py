@@ -27,6 +27,9 @@ def create_session(config, save_dir):
     All generated outputs (model checkpoints and logs) will be saved in a directory named after the
     session (the name itself is specified in ``config``), and located in ``save_dir``.
 
+    If the trainer configuration contains a ``distributed`` field, the session will be run in several
+    worker processes using data-parallel training; see :func:`thelper.train.utils.get_distributed_config`.
+
     Args:
         config: a dictionary that provides all required data configuration and trainer parameters; see
             :class:`thelper.train.base.Trainer` and :func:`thelper.data.utils.create_loaders` for more information.
@@ -45,6 +48,16 @@ def create_session(config, save_dir):
     thelper.utils.setup_globals(config)
     save_dir = thelper.utils.get_save_dir(save_dir, session_name, config)
     logger.debug("session will be saved at '%s'" % os.path.abspath(save_dir).replace("\\", "/"))
+    dist_config = thelper.train.get_distributed_config(config)
+    if dist_config is not None:
+        return thelper.train.launch_distributed(_create_session, dist_config, session_name, config, save_dir)
+    return _create_session(session_name, config, save_dir)
+
+
+def _create_session(session_name, config, save_dir):
+    """Creates the loaders, model, and trainer of a new session, and runs it (possibly inside a distributed worker)."""
+    logger = thelper.utils.get_func_logger()
+    thelper.utils.setup_globals(config)  # redundant in the main process, but required in spawned workers
     task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(config, save_dir)
     model = thelper.nn.create_model(config, task, save_dir=save_dir)
     loaders = (train_loader, valid_loader, test_loader)
@@ -77,6 +90,10 @@ def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat
         A resumed session will not be compatible with its original RNG states if the number of workers
         used is changed. To get 100% reproducible results, make sure you run with the same worker count.
 
+    .. warning::
+        Distributed worker processes cannot query the user; if a resumed distributed session has a task
+        discrepancy, it must be resolved via the ``task_compat`` argument or the loaders configuration.
+
     Args:
         ckptdata: raw checkpoint data loaded via ``torch.load()``; it will be parsed by the various
             parts of the framework that need to reload their previous state.
@@ -105,6 +122,17 @@ def resume_session(ckptdata, save_dir, config=None, eval_only=False, task_compat
     thelper.utils.setup_globals(config)
     save_dir = thelper.utils.get_save_dir(save_dir, session_name, config, resume=True)
     logger.debug("session will be saved at '%s'" % os.path.abspath(save_dir).replace("\\", "/"))
+    dist_config = thelper.train.get_distributed_config(config)
+    if dist_config is not None:
+        return thelper.train.launch_distributed(_resume_session, dist_config, session_name, ckptdata,
+                                                config, save_dir, eval_only, task_compat)
+    return _resume_session(session_name, ckptdata, config, save_dir, eval_only, task_compat)
+
+
+def _resume_session(session_name, ckptdata, config, save_dir, eval_only, task_compat):
+    """Reloads the loaders, model, and trainer of a session, and resumes it (possibly inside a distributed worker)."""
+    logger = thelper.utils.get_func_logger()
+    thelper.utils.setup_globals(config)  # redundant in the main process, but required in spawned workers
     new_task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(config, save_dir)
     if "task" not in ckptdata or not ckptdata["task"] or not isinstance(ckptdata["task"], (thelper.tasks.Task, str)):
         raise AssertionError("invalid checkpoint, cannot reload previous model task")
@@ -252,16 +280,19 @@ def annotate_data(config, save_dir):
 def split_data(config, save_dir):
     """Launches a dataset splitting session.
 
-    This mode will generate an HDF5 archive that contains the split datasets defined in the session
-    configuration file. This archive can then be reused in a new training session to guarantee a fixed
-    distribution of training, validation, and testing samples. It can also be used outside the framework
-    in order to reproduce an experiment.
+    This mode will generate an HDF5 archive (or a memory-mapped array archive, if the ``format`` of the
+    'split' section is set to ``memmap``, or a streaming tar shard archive, if it is set to ``tar``) that
+    contains the split datasets defined in the session configuration file. This archive can then be reused
+    in a new training session to guarantee a fixed distribution of training, validation, and testing samples.
+    It can also be used outside the framework in order to reproduce an experiment.
 
     The configuration dictionary must minimally contain two sections: 'datasets' and 'loaders'. A third
     section, 'split', can be used to provide settings regarding the archive packing and compression
-    approaches to use.
+    approaches to use (``compression``), the number of processes used to encode samples (``workers``),
+    and the HDF5 chunk size (``chunk_size``, in samples) and chunk cache size (``chunk_cache``, in bytes).
+    For memory-mapped and tar shard archives, the number of samples per shard can be set via ``shard_size``.
 
-    The HDF5 archive will be saved in the session's output directory.
+    The archive will be saved in the session's output directory.
 
     Args:
         config: a dictionary that provides all required data configuration parameters; see
@@ -273,7 +304,11 @@ def split_data(config, save_dir):
     .. seealso::
         | :func:`thelper.data.utils.create_loaders`
         | :func:`thelper.data.utils.create_hdf5`
+        | :func:`thelper.data.utils.create_memmap`
+        | :func:`thelper.data.utils.create_tar_shards`
         | :class:`thelper.data.parsers.HDF5Dataset`
+        | :class:`thelper.data.parsers.MemmapDataset`
+        | :class:`thelper.data.parsers.TarShardDataset`
     """
     logger = thelper.utils.get_func_logger()
     session_name = thelper.utils.get_config_session_name(config)
@@ -284,14 +319,31 @@ def split_data(config, save_dir):
     compression = thelper.utils.get_key_def("compression", split_config, default={})
     if not isinstance(compression, dict):
         raise AssertionError("compression params should be given as dictionary")
-    archive_name = thelper.utils.get_key_def("archive_name", split_config, default=(session_name + ".hdf5"))
+    archive_format = thelper.utils.get_key_def("format", split_config, default="hdf5")
+    if archive_format not in ["hdf5", "memmap", "tar"]:
+        raise AssertionError("unexpected archive format '%s' (should be 'hdf5', 'memmap', or 'tar')" % archive_format)
+    archive_ext = "shards" if archive_format == "tar" else archive_format
+    archive_name = thelper.utils.get_key_def("archive_name", split_config, default=(session_name + "." + archive_ext))
+    workers = int(thelper.utils.get_key_def("workers", split_config, default=0))
+    chunk_size = thelper.utils.get_key_def("chunk_size", split_config, default=None)
+    chunk_cache = thelper.utils.get_key_def("chunk_cache", split_config, default=None)
     logger.info("creating new splitting session '%s'..." % session_name)
     thelper.utils.setup_globals(config)
     save_dir = thelper.utils.get_save_dir(save_dir, session_name, config)
     logger.debug("session will be saved at '%s'" % os.path.abspath(save_dir).replace("\\", "/"))
     task, train_loader, valid_loader, test_loader = thelper.data.create_loaders(config, save_dir)
     archive_path = os.path.join(save_dir, archive_name)
-    thelper.data.create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, compression, config)
+    if archive_format == "memmap":
+        shard_size = thelper.utils.get_key_def("shard_size", split_config, default=None)
+        thelper.data.create_memmap(archive_path, task, train_loader, valid_loader, test_loader, compression, config,
+                                   shard_size=shard_size)
+    elif archive_format == "tar":
+        shard_size = thelper.utils.get_key_def("shard_size", split_config, default=None)
+        thelper.data.create_tar_shards(archive_path, task, train_loader, valid_loader, test_loader, compression, config,
+                                       shard_size=shard_size)
+    else:
+        thelper.data.create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, compression, config,
+                                 workers=workers, chunk_size=chunk_size, chunk_cache=chunk_cache)
     logger.debug("all done")
 
 
@@ -14,24 +14,41 @@ import thelper.data.parsers  # noqa: F401
 import thelper.data.pascalvoc  # noqa: F401
 import thelper.data.samplers  # noqa: F401
 import thelper.data.utils  # noqa: F401
+from thelper.data.loaders import ConcatDataset  # noqa: F401
 from thelper.data.loaders import DataLoader  # noqa: F401
 from thelper.data.loaders import DataLoaderWrapper  # noqa: F401
+from thelper.data.loaders import LabelEncodingCollate  # noqa: F401
 from thelper.data.loaders import default_collate  # noqa: F401
+from thelper.data.loaders import padded_collate  # noqa: F401
+from thelper.data.parsers import CachedDataset  # noqa: F401
 from thelper.data.parsers import ClassificationDataset  # noqa: F401
+from thelper.data.parsers import ColumnarSamples  # noqa: F401
 from thelper.data.parsers import Dataset  # noqa: F401
 from thelper.data.parsers import ExternalDataset  # noqa: F401
 from thelper.data.parsers import HDF5Dataset  # noqa: F401
 from thelper.data.parsers import ImageDataset  # noqa: F401
 from thelper.data.parsers import ImageFolderDataset  # noqa: F401
+from thelper.data.parsers import MemmapDataset  # noqa: F401
+from thelper.data.parsers import PackedFiles  # noqa: F401
 from thelper.data.parsers import SegmentationDataset  # noqa: F401
+from thelper.data.parsers import SharedSampleCache  # noqa: F401
 from thelper.data.parsers import SuperResFolderDataset  # noqa: F401
+from thelper.data.parsers import TarShardDataset  # noqa: F401
 from thelper.data.pascalvoc import PASCALVOC  # noqa: F401
+from thelper.data.samplers import BucketBatchSampler  # noqa: F401
+from thelper.data.samplers import DistributedBucketBatchSampler  # noqa: F401
+from thelper.data.samplers import DistributedFixedWeightSubsetSampler  # noqa: F401
+from thelper.data.samplers import DistributedSubsetRandomSampler  # noqa: F401
+from thelper.data.samplers import DistributedWeightedSubsetRandomSampler  # noqa: F401
+from thelper.data.samplers import FixedWeightSubsetSampler  # noqa: F401
 from thelper.data.samplers import SubsetRandomSampler  # noqa: F401
 from thelper.data.samplers import SubsetSequentialSampler  # noqa: F401
 from thelper.data.samplers import WeightedSubsetRandomSampler  # noqa: F401
 from thelper.data.utils import create_hdf5  # noqa: F401
 from thelper.data.utils import create_loaders  # noqa: F401
+from thelper.data.utils import create_memmap  # noqa: F401
 from thelper.data.utils import create_parsers  # noqa: F401
+from thelper.data.utils import create_tar_shards  # noqa: F401
 from thelper.data.utils import get_class_weights  # noqa: F401
 from thelper.tasks.detect import BoundingBox  # noqa: F401
 
@@ -16,6 +16,7 @@ import h5py
 import numpy as np
 
 import thelper.nn.coordconv
+from thelper.data.parsers import HDF5Dataset
 from thelper.data.parsers import SegmentationDataset as BaseSegmentationDataset
 
 logger = logging.getLogger(__name__)
@@ -68,18 +69,37 @@ class SegmentationDataset(BaseSegmentationDataset):
             map_img[map_img == -1] = self.dontcare[1]
         return map_img
 
+    def _get_sample(self, index, sat_img, map_img, meta_idx):
+        metadata = None
+        if meta_idx != -1:
+            metadata = self.metadata[meta_idx]
+        sample = {"sat_img": sat_img, "map_img": map_img, "metadata": metadata}
+        if self.transforms:
+            sample = self.transforms(sample)
+        return sample
+
     def __getitem__(self, index):
         with h5py.File(self.hdf5_path, "r") as hdf5_file:
             sat_img = hdf5_file["sat_img"][index, ...]
             map_img = self._remap_labels(hdf5_file["map_img"][index, ...])
             meta_idx = int(hdf5_file["meta_idx"][index]) if "meta_idx" in hdf5_file else -1
-            metadata = None
-            if meta_idx != -1:
-                metadata = self.metadata[meta_idx]
-        sample = {"sat_img": sat_img, "map_img": map_img, "metadata": metadata}
-        if self.transforms:
-            sample = self.transforms(sample)
-        return sample
+        return self._get_sample(index, sat_img, map_img, meta_idx)
+
+    def get_batch(self, idxs):
+        # opens the archive once, and reads all (sorted) indices of each dataset in a single selection
+        idxs = np.asarray(idxs, dtype=np.int64).reshape(-1)
+        if len(idxs) == 0:
+            return []
+        assert idxs.min() >= 0 and idxs.max() < len(self.samples), "sample index is out-of-range"
+        uniq_idxs, inv_idxs = np.unique(idxs, return_inverse=True)
+        with h5py.File(self.hdf5_path, "r") as hdf5_file:
+            sat_imgs = HDF5Dataset._read_sorted(hdf5_file["sat_img"], uniq_idxs)
+            map_imgs = HDF5Dataset._read_sorted(hdf5_file["map_img"], uniq_idxs)
+            meta_idxs = HDF5Dataset._read_sorted(hdf5_file["meta_idx"], uniq_idxs) \
+                if "meta_idx" in hdf5_file else np.full(len(uniq_idxs), -1)
+        return [self._get_sample(int(uniq_idxs[inv_idx]), sat_imgs[inv_idx].copy(),
+                                 self._remap_labels(map_imgs[inv_idx].copy()), int(meta_idxs[inv_idx]))
+                for inv_idx in inv_idxs]
 
 
 class MetaSegmentationDataset(SegmentationDataset):
@@ -109,14 +129,10 @@ class MetaSegmentationDataset(SegmentationDataset):
             return MetaSegmentationDataset.get_meta_value(val, key[1:])
         return val
 
-    def __getitem__(self, index):
-        with h5py.File(self.hdf5_path, "r") as hdf5_file:
-            sat_img = hdf5_file["sat_img"][index, ...]
-            map_img = self._remap_labels(hdf5_file["map_img"][index, ...])
-            meta_idx = int(hdf5_file["meta_idx"][index]) if "meta_idx" in hdf5_file else -1
-            assert meta_idx != -1, f"metadata unvailable in sample #{index}"
-            metadata = self.metadata[meta_idx]
-            assert isinstance(metadata, (dict, collections.OrderedDict)), "unexpected metadata type"
+    def _get_sample(self, index, sat_img, map_img, meta_idx):
+        assert meta_idx != -1, f"metadata unvailable in sample #{index}"
+        metadata = self.metadata[meta_idx]
+        assert isinstance(metadata, (dict, collections.OrderedDict)), "unexpected metadata type"
         for meta_key, mode in self.meta_map.items():
             meta_val = self.get_meta_value(metadata, meta_key)
             if mode == "const_channel":
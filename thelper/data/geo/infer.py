@@ -96,7 +96,7 @@ class SlidingWindowTester(Tester):
                 center_y0 = self._move_tensor(sample[loader.dataset.center_key][1], dev="cpu", detach=True).data.numpy()
                 n_data = center_x0.shape[0]  # batch-size
                 x_data = sample[loader.dataset.image_key]
-                x_data = self._move_tensor(x_data, dev=dev)
+                x_data = self._move_input(x_data, dev, loader)
                 y_prob = model(x_data)
                 y_prob = normalize(y_prob)
                 y_class_indices = torch.argmax(y_prob, dim=1)
@@ -107,6 +107,7 @@ class VectorCropDataset(Dataset):
         if cropper is None:
             cropper = functools.partial(self._default_feature_cropper, px_size=self.px_size,
                                         skew=self.skew, feature_buffer=self.feature_buffer)
+        # samples share feature geometries and hold bboxes tied to the task, so they are kept as a plain list
         self.samples = self._parse_crops(cropper, self.vector_path, cache_hash)
         # all keys already in sample dicts should be 'meta'; mask & raster will be added later
         meta_keys = list(set([k for s in self.samples for k in s]))
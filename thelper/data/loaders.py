@@ -5,8 +5,11 @@ This module contains a dataset loader specialization used to properly seed sampl
 
 import copy
 import inspect
+import itertools
 import logging
 import math
+import os
+import pickle
 import random
 import sys
 import time
@@ -14,6 +17,7 @@ from collections import Counter
 
 import numpy as np
 import torch
+import torch.distributed
 import torch.utils.data
 import torch.utils.data.sampler
 import tqdm
@@ -25,6 +29,78 @@ import thelper.utils
 logger = logging.getLogger(__name__)
 
 
+_torch_ver = [int(v) for v in torch.__version__.split('+')[0].split(".")[:2]]  # format: X.Y.Z[+cu101]
+_persistent_workers_supported = _torch_ver[0] > 1 or _torch_ver[1] >= 7  # added in PyTorch v1.7
+_batch_fetching_supported = hasattr(torch.utils.data.DataLoader, "_get_iterator")  # added in PyTorch v1.7
+
+_collate_plans = {}  # sample key tuples mapped to per-key collate plans; see ``default_collate``
+_collate_plans_max_count = 64
+
+
+def _use_shared_memory():
+    """Returns whether batches should be collated into shared memory (i.e. if we are in a loader worker)."""
+    if _torch_ver[0] > 1 or _torch_ver[1] > 1:  # ver > 1.1
+        return torch.utils.data.get_worker_info() is not None
+    elif _torch_ver[0] == 1 and _torch_ver[1] == 1:  # ver == 1.1  # pragma: no cover
+        return torch.utils.data._utils.collate._use_shared_memory
+    else:  # ver < 1.1  # pragma: no cover
+        return torch.utils.data.dataloader._use_shared_memory
+
+
+def _new_batch_tensor(shape, dtype, like=None):
+    """Returns an uninitialized tensor for a batch, allocated in shared memory if needed."""
+    if not _use_shared_memory():
+        return torch.empty(shape, dtype=dtype) if like is None else like.new_empty(shape)
+    like = torch.empty(0, dtype=dtype) if like is None else like
+    storage = like.storage()._new_shared(int(np.prod(shape)))
+    return like.new(storage).view(shape)
+
+
+def _get_collate_plan(values):
+    """Returns the collate plan (kind + expected type info) to use for a single field of a batch."""
+    elem = values[0]
+    if type(elem) is np.ndarray and elem.dtype.kind in "biufc":
+        try:
+            return "ndarray", elem.dtype, elem.shape, torch.from_numpy(np.empty(0, dtype=elem.dtype)).dtype
+        except TypeError:
+            return ("generic",)  # unsupported numpy type for the current pytorch version
+    elif type(elem) is torch.Tensor:
+        return "tensor", elem.dtype, elem.shape
+    elif type(elem) in (float, int, str):
+        return (type(elem).__name__,)
+    return ("generic",)
+
+
+def _collate_with_plan(plan, values):
+    """Collates a single batch field using a precomputed plan; returns `None` if the field does not match it."""
+    kind = plan[0]
+    if kind == "ndarray":
+        dtype, shape = plan[1], plan[2]
+        if not all([type(v) is np.ndarray and v.dtype == dtype and v.shape == shape for v in values]):
+            return None
+        out = _new_batch_tensor((len(values), *shape), plan[3])
+        np.stack(values, axis=0, out=out.numpy())  # single copy, straight into the output buffer
+        return out
+    elif kind == "tensor":
+        dtype, shape = plan[1], plan[2]
+        if not all([type(v) is torch.Tensor and v.dtype == dtype and v.shape == shape for v in values]):
+            return None
+        return torch.stack(values, 0, out=_new_batch_tensor((len(values), *shape), dtype, like=values[0]))
+    elif kind == "float":
+        if not all([type(v) is float for v in values]):
+            return None
+        return torch.tensor(values, dtype=torch.float64)
+    elif kind == "int":
+        if not all([type(v) is int for v in values]):
+            return None
+        return torch.tensor(values)
+    elif kind == "str":
+        if not all([type(v) is str for v in values]):
+            return None
+        return values
+    return None
+
+
 def default_collate(batch, force_tensor=True):
     """Puts each data field into a tensor with outer dimension batch size.
 
@@ -32,52 +108,118 @@ def default_collate(batch, force_tensor=True):
     additionally supports custom objects from the framework (such as bounding boxes). These will not
     be converted to tensors, and it will be up to the trainer to handle them accordingly.
 
+    For batches of sample dictionaries, the type, dtype, and shape of each field are inferred from the
+    first batch and cached as a 'collate plan' (one per set of sample keys). Fields that match their plan
+    are collated directly: numpy arrays are copied into a single preallocated (and, in loader workers,
+    shared-memory) output tensor, and scalars/strings skip the type dispatch below. Fields that do not
+    match their plan fall back to the generic (recursive) path, and their plan is updated.
+
     See ``torch.utils.data.DataLoader`` for more information.
     """
+    if all([type(b) is dict for b in batch]):
+        keys = tuple(batch[0].keys())
+        plans = _collate_plans.get(keys)
+        if plans is None:
+            if len(_collate_plans) >= _collate_plans_max_count:
+                _collate_plans.clear()
+            plans = _collate_plans[keys] = {}
+        output = {}
+        for key in keys:
+            values = [d[key] for d in batch]
+            plan = plans.get(key)
+            if plan is None:
+                plan = plans[key] = _get_collate_plan(values)
+            result = _collate_with_plan(plan, values) if plan[0] != "generic" else None
+            if result is None:
+                if plan[0] != "generic":
+                    plans[key] = _get_collate_plan(values)  # schema changed, will retry with new plan next time
+                result = _default_collate(values, force_tensor=force_tensor)
+            output[key] = result
+        return output
+    return _default_collate(batch, force_tensor=force_tensor)
+
+
+def padded_collate(batch, pad_keys, pad_value=0, size_divisor=1, force_tensor=True):
+    """Puts each data field into a tensor with outer dimension batch size, padding images to a common size first.
+
+    The images found under the given keys are padded at their bottom and right edges (so that the coordinates
+    of their bounding boxes or keypoints stay valid) up to the largest height and width in the minibatch,
+    rounded up to a multiple of ``size_divisor``. Numpy arrays are assumed to be in HxW[xC] format, and
+    tensors in [...xC]xHxW format. The padded samples are then collated by
+    :func:`thelper.data.loaders.default_collate`. This is mostly useful with minibatches of images that have
+    similar sizes, e.g. when using :class:`thelper.data.samplers.BucketBatchSampler`.
+
+    Example configuration::
+
+        # ...
+        "loaders": {
+            # ...
+            "collate_fn": {
+                "type": "thelper.data.loaders.padded_collate",
+                "params": {"pad_keys": ["image"], "size_divisor": 32}
+            },
+            # ...
+        },
+        # ...
+
+    Args:
+        batch: the list of samples (dictionaries) to collate.
+        pad_keys: the list of sample keys whose images should be padded.
+        pad_value: the value used to fill the padded regions.
+        size_divisor: the value the padded heights and widths should be multiples of.
+        force_tensor: forwarded to :func:`thelper.data.loaders.default_collate`.
+    """
+    assert all([isinstance(b, dict) for b in batch]), "padded collate expects samples to be dictionaries"
+    assert isinstance(size_divisor, int) and size_divisor > 0, "invalid size divisor (should be positive int)"
+    batch = [dict(sample) for sample in batch]  # shallow copies, the padded images will replace the originals
+    for key in pad_keys:
+        images = [sample[key] for sample in batch]
+        is_tensor = [isinstance(image, torch.Tensor) for image in images]
+        hw_dims = [(image.dim() - 2, image.dim() - 1) if tensor else (0, 1) for image, tensor in zip(images, is_tensor)]
+        target_size = [max([image.shape[dims[axis]] for image, dims in zip(images, hw_dims)]) for axis in range(2)]
+        target_size = [-(-size // size_divisor) * size_divisor for size in target_size]
+        for sample, image, tensor, dims in zip(batch, images, is_tensor, hw_dims):
+            pad_h, pad_w = target_size[0] - image.shape[dims[0]], target_size[1] - image.shape[dims[1]]
+            if pad_h == 0 and pad_w == 0:
+                continue
+            if tensor:
+                sample[key] = torch.nn.functional.pad(image, (0, pad_w, 0, pad_h), value=pad_value)
+            else:
+                sample[key] = np.pad(image, [(0, pad_h), (0, pad_w)] + [(0, 0)] * (image.ndim - 2),
+                                     mode="constant", constant_values=pad_value)
+    return default_collate(batch, force_tensor=force_tensor)
+
+
+def _default_collate(batch, force_tensor=True):
+    """Generic (recursive) implementation of :func:`thelper.data.loaders.default_collate`."""
     from torch._six import container_abcs, string_classes, int_classes
     error_msg_fmt = "batch must contain tensors, numbers, dicts or lists; found {}"
-    torch_ver = [int(v) for v in torch.__version__.split('+')[0].split(".")]  # format: X.Y.Z[+cu101]
     elem_type = type(batch[0])
     if any([b is None for b in batch]):
         assert all([b is None for b in batch]), "cannot mix ``None`` and non-``None`` types"
         return None  # compress and return entire field as unavailable
     elif isinstance(batch[0], torch.Tensor):
         out = None
-        if torch_ver[0] > 1 or torch_ver[1] > 1:  # ver > 1.1
-            if torch.utils.data.get_worker_info() is not None:
-                numel = sum([x.numel() for x in batch])
-                storage = batch[0].storage()._new_shared(numel)
-                out = batch[0].new(storage)
-            return torch.stack(batch, 0, out=out)
-        elif torch_ver[0] == 1 and torch_ver[1] == 1:  # ver == 1.1  # pragma: no cover
-            if torch.utils.data._utils.collate._use_shared_memory:
-                # If we're in a background process, concatenate directly into a
-                # shared memory tensor to avoid an extra copy
-                numel = sum([x.numel() for x in batch])
-                storage = batch[0].storage()._new_shared(numel)
-                out = batch[0].new(storage)
-            return torch.stack(batch, 0, out=out)
-        else:  # ver < 1.1  # pragma: no cover
-            if torch.utils.data.dataloader._use_shared_memory:
-                # If we're in a background process, concatenate directly into a
-                # shared memory tensor to avoid an extra copy
-                numel = sum([x.numel() for x in batch])
-                storage = batch[0].storage()._new_shared(numel)
-                out = batch[0].new(storage)
-            return torch.stack(batch, 0, out=out)
+        if _use_shared_memory():
+            # If we're in a background process, concatenate directly into a
+            # shared memory tensor to avoid an extra copy
+            numel = sum([x.numel() for x in batch])
+            storage = batch[0].storage()._new_shared(numel)
+            out = batch[0].new(storage)
+        return torch.stack(batch, 0, out=out)
     elif elem_type.__module__ == 'numpy' and elem_type.__name__ != 'str_' and \
             elem_type.__name__ != 'string_':
         elem = batch[0]
         if elem_type.__name__ == 'ndarray':
             # array of string classes and object
-            if torch_ver[0] > 1 or torch_ver[1] > 0:  # ver > 1.0
+            if _torch_ver[0] > 1 or _torch_ver[1] > 0:  # ver > 1.0
                 assert torch.utils.data._utils.collate.np_str_obj_array_pattern.search(elem.dtype.str) is None, \
                     error_msg_fmt.format(elem.dtype)
             else:  # ver <= 1.0  # pragma: no cover
                 import re
                 if re.search('[SaUO]', elem.dtype.str) is not None:
                     raise TypeError(error_msg_fmt.format(elem.dtype))
-            return default_collate([torch.from_numpy(b) for b in batch], force_tensor=force_tensor)
+            return _default_collate([torch.from_numpy(b) for b in batch], force_tensor=force_tensor)
         if elem.shape == ():  # scalars  # pragma: no cover
             # simplified as of PyTorch v1.2.0, and similar to <1.1.0
             return torch.as_tensor(batch)
@@ -101,14 +243,223 @@ def default_collate(batch, force_tensor=True):
     return batch
 
 
+class LabelEncodingCollate:
+    """Collate function wrapper that converts the groundtruth of minibatches into tensors for a given task.
+
+    The wrapped collate function is called first, and the groundtruth field of the resulting minibatch
+    (given by the task's ``gt_key``) is then converted in place. For classification tasks, the labels
+    (class names or indices) are converted to a 1-dim ``int64`` tensor of class indices using
+    :meth:`thelper.tasks.classif.Classification.get_class_index_array`. For segmentation tasks, the
+    label maps are converted to ``int64`` tensors. Groundtruth fields for other task types are left
+    untouched. Lists of groundtruth values (e.g. for augmented sample lists) are converted element-wise.
+
+    Since the conversion happens in the collate function, it is executed in the data loader workers
+    instead of in the training loop, and the trainers only need to upload the resulting tensors. The
+    task used to encode the labels should be the one used by the trainer; see
+    :meth:`thelper.data.loaders.DataLoader.set_label_encoding`.
+
+    Attributes:
+        task: the task object that defines the groundtruth key and the class indices map.
+        collate_fn: the wrapped collate function used to create the minibatches.
+    """
+
+    def __init__(self, task, collate_fn=default_collate):
+        assert isinstance(task, thelper.tasks.Task), "invalid task object"
+        assert callable(collate_fn), "invalid collate function"
+        self.task = task
+        self.collate_fn = collate_fn
+
+    def __call__(self, batch):
+        output = self.collate_fn(batch)
+        if isinstance(output, dict) and self.task.gt_key is not None and output.get(self.task.gt_key) is not None:
+            output[self.task.gt_key] = self.encode(output[self.task.gt_key])
+        return output
+
+    def encode(self, labels):
+        """Returns the encoded version of a collated groundtruth field."""
+        if isinstance(labels, (list, tuple)) and \
+                any([isinstance(lbl, (list, tuple)) or (isinstance(lbl, torch.Tensor) and lbl.dim() > 0) for lbl in labels]):
+            return [self.encode(lbl) for lbl in labels]
+        if isinstance(self.task, thelper.tasks.Classification):
+            if isinstance(labels, torch.Tensor) and labels.dtype == torch.int64 and labels.dim() == 1:
+                return labels  # already encoded
+            if isinstance(labels, (list, tuple)) and all([isinstance(lbl, str) for lbl in labels]):
+                labels = np.asarray(labels)  # allows the vectorized lookup of class names
+            return torch.from_numpy(self.task.get_class_index_array(labels))
+        elif isinstance(self.task, thelper.tasks.Segmentation):
+            if isinstance(labels, np.ndarray):
+                labels = torch.from_numpy(labels)
+            if isinstance(labels, torch.Tensor):
+                return labels.long()  # long instead of bytes to support large/negative values for dontcare
+        return labels
+
+    def __repr__(self):
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(task={repr(self.task)}, collate_fn={repr(self.collate_fn)})"
+
+
+class ConcatDataset(torch.utils.data.ConcatDataset):
+    """Dataset concatenation interface that forwards batch-level fetches to the concatenated datasets.
+
+    The indices of each batch are grouped by source dataset so that the parsers which implement
+    :func:`thelper.data.parsers.Dataset.get_batch` can still read their samples in a vectorized way.
+    The label-only access protocol (see :func:`thelper.data.parsers.Dataset.get_label_array`) is
+    also forwarded when all concatenated datasets support it.
+
+    See ``torch.utils.data.ConcatDataset`` for more information.
+    """
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of (0-based, concatenated) indices."""
+        idxs = np.asarray(idxs, dtype=np.int64).reshape(-1)
+        idxs = np.where(idxs < 0, idxs + len(self), idxs)
+        if len(idxs) and (idxs.min() < 0 or idxs.max() >= len(self)):
+            raise AssertionError("sample index is out-of-range")
+        dataset_idxs = np.searchsorted(self.cumulative_sizes, idxs, side="right")
+        samples = [None] * len(idxs)
+        for dataset_idx in np.unique(dataset_idxs).tolist():
+            batch_idxs = np.nonzero(dataset_idxs == dataset_idx)[0]
+            offset = self.cumulative_sizes[dataset_idx - 1] if dataset_idx > 0 else 0
+            dataset = self.datasets[dataset_idx]
+            sample_idxs = (idxs[batch_idxs] - offset).tolist()
+            if hasattr(dataset, "get_batch"):
+                dataset_samples = dataset.get_batch(sample_idxs)
+            else:
+                dataset_samples = [dataset[sample_idx] for sample_idx in sample_idxs]
+            for batch_idx, sample in zip(batch_idxs.tolist(), dataset_samples):
+                samples[batch_idx] = sample
+        return samples
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) sizes of all concatenated samples (or ``None`` if a dataset does not support it)."""
+        sizes = []
+        for dataset in self.datasets:
+            dataset_sizes = dataset.get_sample_sizes() if hasattr(dataset, "get_sample_sizes") else None
+            if dataset_sizes is None:
+                return None
+            sizes.append(dataset_sizes)
+        return np.concatenate(sizes)
+
+    def get_labels(self):
+        """Returns the label values of all concatenated samples (or ``None`` if a dataset does not support it)."""
+        labels = []
+        for dataset in self.datasets:
+            dataset_labels = dataset.get_labels() if hasattr(dataset, "get_labels") else None
+            if dataset_labels is None:
+                return None
+            labels.extend(dataset_labels)
+        return labels
+
+    def get_label_array(self, task=None):
+        """Returns the class indices of all concatenated samples (or ``None`` if a dataset does not support it)."""
+        labels = []
+        for dataset in self.datasets:
+            dataset_labels = dataset.get_label_array(task) if hasattr(dataset, "get_label_array") else None
+            if dataset_labels is None:
+                return None
+            labels.append(dataset_labels)
+        return np.concatenate(labels)
+
+
+def _seed_worker_rngs(seeds, seed_offset):
+    """Sets up the RNGs state of a loader worker (or of the main process) using a seed offset."""
+    if "torch" in seeds:
+        torch.manual_seed(seeds["torch"] + seed_offset)
+        torch.cuda.manual_seed_all(seeds["torch"] + seed_offset)
+    if "numpy" in seeds:
+        np.random.seed(seeds["numpy"] + seed_offset)
+    if "random" in seeds:
+        random.seed(seeds["random"] + seed_offset)
+
+
+_worker_epoch = None  # epoch of the last batch received by a persistent loader worker (worker-side only)
+
+
+def _unpickle_epoch_batch(batch_idxs, epoch, seeds, num_workers):
+    """Reseeds a persistent worker when it receives the first batch of a new epoch, and returns the batch indices.
+
+    This function is called by the workers when they unpickle the index batches sent by the main process, i.e.
+    right before fetching the samples of those batches. The RNG states follow the same epoch- and worker-based
+    offsets as :func:`thelper.data.loaders.DataLoader._worker_init_fn` would give non-persistent workers.
+    """
+    global _worker_epoch
+    worker_info = torch.utils.data.get_worker_info()
+    if worker_info is not None and epoch != _worker_epoch:
+        _worker_epoch = epoch
+        _seed_worker_rngs(seeds, num_workers * epoch + worker_info.id)
+    return batch_idxs
+
+
+class _EpochBatch(list):
+    """List of batch sample indices that reseeds the persistent worker it is sent to on epoch changes."""
+
+    def __init__(self, batch_idxs, epoch, seeds, num_workers):
+        super().__init__(batch_idxs)
+        self.epoch, self.seeds, self.num_workers = epoch, seeds, num_workers
+
+    def __reduce__(self):
+        return _unpickle_epoch_batch, (list(self), self.epoch, self.seeds, self.num_workers)
+
+
+class _EpochBatchSampler:
+    """Batch sampler wrapper used to tag the index batches of a loader with persistent workers with its epoch."""
+
+    def __init__(self, batch_sampler, loader):
+        self.batch_sampler = batch_sampler
+        self.loader = loader
+
+    def __iter__(self):
+        # the epoch must be captured here, as the loader increments it right after creating its iterator
+        epoch, seeds, num_workers = self.loader.epoch, self.loader.seeds, self.loader.num_workers
+        return (_EpochBatch(batch_idxs, epoch, seeds, num_workers) for batch_idxs in self.batch_sampler)
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+
+class _BatchFetchDataset(torch.utils.data.Dataset):
+    """Dataset adapter given to the loader iterators to fetch each minibatch with a single ``get_batch`` call.
+
+    The indices it receives are the full lists of sample indices created by the batch sampler, as the loader
+    disables the per-sample fetching of PyTorch when batched fetching is used.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, batch_idxs):
+        return self.dataset.get_batch(list(batch_idxs))
+
+    def __len__(self):
+        return len(self.dataset)
+
+
 class DataLoader(torch.utils.data.DataLoader):
     """Specialized data loader used to load minibatches from a dataset parser.
 
-    This specialization handles the seeding of samplers and workers.
+    This specialization handles the seeding of samplers and workers. If ``persistent_workers`` is
+    used, the workers are kept alive across epochs, and they are reseeded at the start of each epoch
+    as if they had been recreated. In that case, :func:`thelper.data.loaders.DataLoader.prefetch` can
+    also be used to start loading the first batches of the next epoch ahead of time. Persistent workers
+    require PyTorch v1.7 or above; with older versions, the workers are recreated at every epoch.
+
+    If ``device_transforms`` is set (e.g. to a :class:`thelper.transforms.batch.DeviceNormalize` instance
+    when the trailing normalization stages of the sample transforms are deferred), the session runners will
+    apply it to the minibatch inputs once they are uploaded to their device. Similarly, if ``batch_transforms``
+    is set (e.g. to a :class:`thelper.transforms.batch.BatchCompose` instance), the session runners will apply
+    it to the uploaded minibatch inputs and groundtruth tensors afterwards.
+
+    If the dataset implements :func:`thelper.data.parsers.Dataset.get_batch`, the samples of each minibatch
+    are fetched with a single call to it (inside the workers, if any) instead of one ``__getitem__`` call per
+    sample. The batch sampler indices are then handed to the fetcher as-is, with PyTorch's own per-sample
+    batching disabled. This relies on the iterator creation hook of PyTorch v1.7+; with older versions, the
+    samples are always fetched one at a time.
 
     See ``torch.utils.data.DataLoader`` for more information on attributes/methods.
     """
     def __init__(self, *args, seeds=None, epoch=0, collate_fn=default_collate, **kwargs):
+        if not _persistent_workers_supported and kwargs.pop("persistent_workers", False):
+            logger.warning("persistent workers require PyTorch v1.7+; workers will be recreated at every epoch")
         super().__init__(*args, collate_fn=collate_fn, worker_init_fn=self._worker_init_fn, **kwargs)
         self.seeds = {}
         if seeds is not None:
@@ -119,9 +470,48 @@ class DataLoader(torch.utils.data.DataLoader):
             raise AssertionError("invalid epoch value")
         self.epoch = epoch
         self.num_workers = kwargs["num_workers"] if "num_workers" in kwargs else 0
+        self.device_transforms = None  # applied to the minibatch inputs by the session runner once uploaded
+        self.batch_transforms = None  # applied to the minibatch inputs/groundtruth by the session runner after that
+        self._prefetched_iter = None  # (epoch, iterator) pair started ahead of time by ``prefetch``
+
+    @property
+    def _batch_fetching(self):
+        """Returns whether the minibatches are fetched with a single ``get_batch`` call on the dataset."""
+        return _batch_fetching_supported and self.batch_sampler is not None and hasattr(self.dataset, "get_batch") and \
+            not isinstance(self.dataset, torch.utils.data.IterableDataset)
+
+    @property
+    def _auto_collation(self):
+        # when fetching batches ourselves, the fetcher must pass the batch indices to the dataset as a whole
+        return super()._auto_collation and not self._batch_fetching
+
+    @property
+    def _index_sampler(self):
+        index_sampler = self.batch_sampler if self._batch_fetching else super()._index_sampler
+        if getattr(self, "persistent_workers", False) and self.num_workers > 0 and self.batch_sampler is not None:
+            return _EpochBatchSampler(index_sampler, self)
+        return index_sampler
+
+    def _get_iterator(self):
+        if not self._batch_fetching:
+            return super()._get_iterator()
+        # the iterator (and its workers) only see the adapter; the loader's dataset attribute is left untouched
+        dataset = self.dataset
+        self.__dict__["dataset"] = _BatchFetchDataset(dataset)
+        try:
+            return super()._get_iterator()
+        finally:
+            self.__dict__["dataset"] = dataset
 
     def __iter__(self):
         """Advances the epoch number for the workers initialization function."""
+        if self._prefetched_iter is not None:
+            prefetched_epoch, prefetched_iter = self._prefetched_iter
+            self._prefetched_iter = None
+            if prefetched_epoch == self.epoch:
+                self.epoch += 1
+                return prefetched_iter
+            # otherwise, the epoch was changed since the prefetch; the iterator will be reset below
         self.set_epoch(self.epoch)  # preset for all attributes
         if self.num_workers == 0:
             if "torch" in self.seeds:
@@ -135,6 +525,19 @@ class DataLoader(torch.utils.data.DataLoader):
         self.epoch += 1
         return result
 
+    def prefetch(self):
+        """Starts loading the first batches of the next epoch in the background using persistent workers.
+
+        The next call to ``__iter__`` will return the prefetched iterator, unless the epoch number is changed
+        in between (in which case the prefetched batches are dropped). This does nothing if the workers are not
+        persistent, as there would be no workers to load the batches until the next epoch starts.
+        """
+        if not getattr(self, "persistent_workers", False) or self.num_workers == 0 or self._prefetched_iter is not None:
+            return
+        epoch = self.epoch
+        self._prefetched_iter = (epoch, self.__iter__())
+        self.epoch = epoch  # the iterator is not consumed yet, we are still waiting for the same epoch
+
     def set_epoch(self, epoch=0):
         """Sets the current epoch number in order to offset RNG states for the workers and the sampler."""
         if not isinstance(epoch, int) or epoch < 0:
@@ -143,25 +546,44 @@ class DataLoader(torch.utils.data.DataLoader):
         if self.sampler is not None:
             if hasattr(self.sampler, "set_epoch") and callable(self.sampler.set_epoch):
                 self.sampler.set_epoch(self.epoch)
+        if self.batch_sampler is not None:
+            if hasattr(self.batch_sampler, "set_epoch") and callable(self.batch_sampler.set_epoch):
+                self.batch_sampler.set_epoch(self.epoch)
         if hasattr(self.dataset, "set_epoch") and callable(self.dataset.set_epoch):
             self.dataset.set_epoch(epoch)
         if hasattr(self.dataset, "transforms"):
             if hasattr(self.dataset.transforms, "set_epoch") and callable(self.dataset.transforms.set_epoch):
                 self.dataset.transforms.set_epoch(epoch)
 
+    def set_label_encoding(self, task):
+        """Sets the task used to convert the groundtruth of minibatches into tensors in the collate function.
+
+        If the task is ``None``, the label encoding is removed, and the original collate function is restored.
+        Note that if workers are persistent and already started, the change will only apply once they are recreated.
+
+        .. seealso::
+            | :class:`thelper.data.loaders.LabelEncodingCollate`
+        """
+        collate_fn = self.collate_fn
+        if isinstance(collate_fn, LabelEncodingCollate):
+            collate_fn = collate_fn.collate_fn
+        self.collate_fn = LabelEncodingCollate(task, collate_fn) if task is not None else collate_fn
+
+    @property
+    def label_encoding_task(self):
+        """Returns the task used to encode the groundtruth of minibatches, or ``None`` if labels are not encoded."""
+        return self.collate_fn.task if isinstance(self.collate_fn, LabelEncodingCollate) else None
+
     def _worker_init_fn(self, worker_id):
         """Sets up the RNGs state of each worker based on their unique id and the epoch number."""
-        seed_offset = self.num_workers * self.epoch
-        if "torch" in self.seeds:
-            torch.manual_seed(self.seeds["torch"] + seed_offset + worker_id)
-            torch.cuda.manual_seed_all(self.seeds["torch"] + seed_offset + worker_id)
-        if "numpy" in self.seeds:
-            np.random.seed(self.seeds["numpy"] + seed_offset + worker_id)
-        if "random" in self.seeds:
-            random.seed(self.seeds["random"] + seed_offset + worker_id)
+        _seed_worker_rngs(self.seeds, self.num_workers * self.epoch + worker_id)
 
     @property
     def sample_count(self):
+        if isinstance(self.dataset, torch.utils.data.IterableDataset):
+            return len(self.dataset)
+        if hasattr(self.batch_sampler, "sample_count"):  # custom batch samplers (e.g. bucketed ones)
+            return self.batch_sampler.sample_count
         return len(self.sampler) if self.sampler is not None else len(self.dataset)
 
 
@@ -226,6 +648,10 @@ class LoaderFactory:
         self.valid_shuffle = thelper.utils.str2bool(thelper.utils.get_key_def(["shuffle", "valid_shuffle"], config, False))
         self.test_shuffle = thelper.utils.str2bool(thelper.utils.get_key_def(["shuffle", "test_shuffle"], config, False))
         np.random.seed()  # for seed generation below (if needed); will be reseeded afterwards
+        self.split_seeds_configured = {
+            "test": any([key in config for key in ["test_seed", "test_split_seed"]]),
+            "valid": any([key in config for key in ["valid_seed", "valid_split_seed"]]),
+        }
         test_seed = self._get_seed(["test_seed", "test_split_seed"], config, (int, str))
         valid_seed = self._get_seed(["valid_seed", "valid_split_seed"], config, (int, str))
         torch_seed = self._get_seed(["torch_seed"], config, int)
@@ -245,6 +671,13 @@ class LoaderFactory:
         self.workers = config["workers"] if "workers" in config and config["workers"] >= 0 else 1
         self.pin_memory = thelper.utils.str2bool(config["pin_memory"]) if "pin_memory" in config else False
         self.drop_last = thelper.utils.str2bool(config["drop_last"]) if "drop_last" in config else False
+        self.persistent_workers = thelper.utils.str2bool(thelper.utils.get_key_def("persistent_workers", config, False))
+        self.encode_labels = thelper.utils.str2bool(thelper.utils.get_key_def("encode_labels", config, False))
+        self.defer_normalization = thelper.utils.str2bool(thelper.utils.get_key_def("defer_normalization", config, False))
+        self.persistent_workers = self.persistent_workers and self.workers > 0
+        dist_ready = torch.distributed.is_available() and torch.distributed.is_initialized()
+        self.distributed = thelper.utils.str2bool(thelper.utils.get_key_def(
+            "distributed", config, dist_ready and torch.distributed.get_world_size() > 1))
         default_sampler_config = None
         if "sampler" in config:
             if any([s in config for s in ["train_sampler", "valid_sampler", "test_sampler"]]):
@@ -269,6 +702,11 @@ class LoaderFactory:
         self.base_transforms = None
         if "base_transforms" in config and config["base_transforms"]:
             self.base_transforms = thelper.transforms.load_transforms(config["base_transforms"])
+        self.train_batch_transforms = self._get_batch_transforms(["train_batch_transforms", "batch_transforms"], "train", config)
+        self.valid_batch_transforms = self._get_batch_transforms(
+            ["valid_batch_transforms", "eval_batch_transforms", "batch_transforms"], "valid", config)
+        self.test_batch_transforms = self._get_batch_transforms(
+            ["test_batch_transforms", "eval_batch_transforms", "batch_transforms"], "test", config)
         self.train_split = self._get_ratios_split("train", config)
         self.valid_split = self._get_ratios_split("valid", config)
         self.test_split = self._get_ratios_split("test", config)
@@ -329,6 +767,11 @@ class LoaderFactory:
                 raise AssertionError("unexpected value type for field '%s'" % key)
             return config[key]
         seed = np.random.randint(2 ** 16)
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            # all replicas must split and shuffle the data identically, so they all use the seed of rank 0
+            seed_tensor = torch.tensor([seed], dtype=torch.int64)
+            torch.distributed.broadcast(seed_tensor, src=0)
+            seed = int(seed_tensor.item())
         logger.info("setting '%s' to %d" % (prefixes[0], seed))
         return seed
 
@@ -352,25 +795,29 @@ class LoaderFactory:
                 return augments, augments_append
         return None, False
 
+    @staticmethod
+    def _get_batch_transforms(targets, name, config):
+        for target in targets:
+            if target in config and config[target]:
+                batch_transforms = thelper.transforms.load_batch_transforms(config[target])
+                logger.debug("%s batch transforms: %s" % (name, str(batch_transforms)))
+                return batch_transforms
+        return None
+
     def _get_raw_split(self, indices):
-        for name in self.total_usage:
-            assert name in indices, f"dataset '{name}' does not exist"
-        _indices, train_idxs, valid_idxs, test_idxs = {}, {}, {}, {}
-        for name, indices in indices.items():
-            _indices[name] = copy.deepcopy(indices)
-            train_idxs[name] = []
-            valid_idxs[name] = []
-            test_idxs[name] = []
-        indices = _indices
+        """Splits the given (dataset name to index array) map into train/valid/test index array maps."""
+        indices = {name: np.array(idxs, dtype=np.int64) for name, idxs in indices.items()}
+        train_idxs, valid_idxs, test_idxs = [{name: np.empty(0, dtype=np.int64) for name in indices} for _ in range(3)]
         shuffle = any([self.train_shuffle, self.valid_shuffle, self.test_shuffle])
         if shuffle:
-            np.random.seed(self.seeds["test"])  # test idxs will be picked first, then valid+train
+            rng = np.random.RandomState(self.seeds["test"])  # test idxs will be picked first, then valid+train
             for idxs in indices.values():
-                np.random.shuffle(idxs)
-        offsets = dict.fromkeys(self.total_usage, 0)
+                rng.shuffle(idxs)
+        split_names = [name for name in self.total_usage if name in indices]
+        offsets = dict.fromkeys(split_names, 0)
         for loader_idx, (idxs_map, ratio_map) in enumerate(zip([test_idxs, valid_idxs, train_idxs],
                                                                [self.test_split, self.valid_split, self.train_split])):
-            for name in self.total_usage.keys():
+            for name in split_names:
                 if name in ratio_map:
                     count = int(round(ratio_map[name] * len(indices[name])))
                     assert count >= 0, "ratios should be non-negative values"
@@ -379,11 +826,9 @@ class LoaderFactory:
                     idxs_map[name] = indices[name][begidx:endidx]
                     offsets[name] = endidx
             if loader_idx == 0 and shuffle:
-                np.random.seed(self.seeds["valid"])  # all test idxs are now picked, reshuffle for train/valid
-                for name in self.total_usage.keys():
-                    trainvalid_idxs = indices[name][offsets[name]:]
-                    np.random.shuffle(trainvalid_idxs)
-                    indices[name][offsets[name]:] = trainvalid_idxs
+                rng = np.random.RandomState(self.seeds["valid"])  # all test idxs are now picked, reshuffle for train/valid
+                for name in split_names:
+                    rng.shuffle(indices[name][offsets[name]:])  # in-place, through a view
         if shuffle:
             np.random.seed(self.seeds["numpy"])  # back to default random state for future use
         return train_idxs, valid_idxs, test_idxs
@@ -416,6 +861,10 @@ class LoaderFactory:
 
                 \text{test loader} = {5A + 3B + 2C}
 
+        Iterable datasets (e.g. :class:`thelper.data.parsers.TarShardDataset`) cannot be indexed by sample,
+        so they are split by shard instead, and without class balancing. In that case, the returned indices
+        are shard indices.
+
         Args:
             datasets: the map of datasets to split, where each has a name (key) and a parser (value).
             task: a task object that should be compatible with all provided datasets (can be ``None``).
@@ -424,6 +873,12 @@ class LoaderFactory:
             A three-element tuple containing the maps of the training, validation, and test sets
             respectively. These maps associate dataset names to a list of sample indices.
         """
+        for name in self.total_usage:
+            assert name in datasets, f"dataset '{name}' does not exist"
+        shard_datasets = {name: dataset for name, dataset in datasets.items()
+                          if isinstance(dataset, torch.utils.data.IterableDataset)}
+        shard_split = self._get_raw_split({name: np.arange(dataset.shard_count) for name, dataset in shard_datasets.items()})
+        datasets = {name: dataset for name, dataset in datasets.items() if name not in shard_datasets}
         dataset_sizes = {}
         must_split = {}
         global_size = 0
@@ -435,7 +890,6 @@ class LoaderFactory:
             # if a single dataset is used in more than a single loader, we cannot skip the rebalancing below
             must_split[dataset_name] = sum([dataset_name in split for split in
                                             [self.train_split, self.valid_split, self.test_split]]) > 1
-        global_size = sum(len(dataset) for dataset in datasets.values())
         logger.info("splitting datasets with parsed sizes = %s" % str(dataset_sizes))
         must_split = any(must_split.values())
         if task is not None and isinstance(task, thelper.tasks.Classification) and not self.skip_class_balancing and must_split:
@@ -443,61 +897,130 @@ class LoaderFactory:
             logger.debug("will split evenly over %d classes..." % len(task.class_names))
             unset_class_key = "<unset>"
             global_class_names = task.class_names + [unset_class_key]  # extra name added for unlabeled samples (if needed!)
-            sample_maps = {}
+            class_sample_idxs = {}
             for dataset_name, dataset in datasets.items():
-                # fetching a reference to the list of samples here allows us to bypass the 'loading' process and possibly
-                # directly access sample labels/groundtruth (assuming it is already loaded)
-                samples = dataset.samples if hasattr(dataset, "samples") and dataset.samples is not None \
-                    and len(dataset.samples) == len(dataset) else dataset
-                if isinstance(dataset, thelper.data.ExternalDataset):
-                    if hasattr(samples, "samples") and samples.samples is not None and len(samples.samples) == len(samples):
-                        sample_maps[dataset_name] = task.get_class_sample_map(samples.samples, unset_class_key)
-                    else:
-                        logger.warning(f"must fully parse the external dataset '{dataset_name}' for balanced intra-class shuffling;" +
-                                       " this might take a while!\n\t...consider making a dataset interface that can return labels" +
-                                       " only, it would greatly speed up the analysis of class distributions\n\t...you could also" +
-                                       " add the 'skip_class_balancing' flag to your data configuration to skip this rebalancing")
-                        # to allow glitch-less tqdm printing after latest logger output
-                        sys.stdout.flush(), sys.stderr.flush(), time.sleep(0.01)
-                        samples = []
-                        for sample in tqdm.tqdm(dataset):
-                            assert task.gt_key in sample, f"could not find label key ('{task.gt_key}') in sample dict"
-                            samples.append({task.gt_key: sample[task.gt_key]})
-                        sample_maps[dataset_name] = task.get_class_sample_map(samples, unset_class_key)
-                else:
-                    sample_maps[dataset_name] = task.get_class_sample_map(samples, unset_class_key)
-            train_idxs, valid_idxs, test_idxs = {}, {}, {}
-            for class_name in global_class_names:
-                curr_class_samples, curr_class_size = {}, {}
+                # the label-only access protocol allows us to bypass the 'loading' process and directly access
+                # sample labels/groundtruth (assuming it is already loaded, or that it can be read separately)
+                labels = dataset.get_label_array(task)
+                if labels is None:
+                    logger.warning(f"must fully parse the dataset '{dataset_name}' for balanced intra-class shuffling;" +
+                                   " this might take a while!\n\t...consider implementing 'get_labels' in the dataset" +
+                                   " interface, it would greatly speed up the analysis of class distributions\n\t...you could" +
+                                   " also add the 'skip_class_balancing' flag to your data configuration to skip this rebalancing")
+                    # to allow glitch-less tqdm printing after latest logger output
+                    sys.stdout.flush(), sys.stderr.flush(), time.sleep(0.01)
+                    samples = []
+                    for sample in tqdm.tqdm(dataset):
+                        assert task.gt_key in sample or not isinstance(dataset, thelper.data.ExternalDataset), \
+                            f"could not find label key ('{task.gt_key}') in sample dict"
+                        samples.append({task.gt_key: sample[task.gt_key]} if task.gt_key in sample else {})
+                    assert len(samples) > 0, "invalid sample list "
+                    labels = task.get_class_label_array(samples)
+                # the returned arrays are sorted by class index, with unlabeled samples last (as in the global names)
+                class_sample_idxs[dataset_name] = task.split_class_label_array(labels)
+            split_idxs = [{name: [] for name in datasets} for _ in range(3)]
+            split_labels = [{name: [] for name in datasets} for _ in range(3)]
+            for class_idx, class_name in enumerate(global_class_names):
+                curr_class_samples = {}
                 for dataset_name in datasets:
-                    class_samples = sample_maps[dataset_name][class_name] if class_name in sample_maps[dataset_name] else []
-                    samples_pairs = list(zip(class_samples, [class_name] * len(class_samples)))
-                    curr_class_samples[dataset_name] = samples_pairs
-                    curr_class_size[dataset_name] = len(curr_class_samples[dataset_name])
+                    curr_class_samples[dataset_name] = class_sample_idxs[dataset_name][class_idx]
+                    curr_class_size = len(curr_class_samples[dataset_name])
                     logger.debug("dataset '{}' class '{}' sample count: {} ({}% of local, {}% of total)".format(
                         dataset_name,
                         class_name,
-                        curr_class_size[dataset_name],
-                        int(100 * curr_class_size[dataset_name] / dataset_sizes[dataset_name]),
-                        int(100 * curr_class_size[dataset_name] / global_size)))
-                class_train_idxs, class_valid_idxs, class_test_idxs = self._get_raw_split(curr_class_samples)
-                for idxs_dict_list, class_idxs_dict_list in zip([train_idxs, valid_idxs, test_idxs],
-                                                                [class_train_idxs, class_valid_idxs, class_test_idxs]):
+                        curr_class_size,
+                        int(100 * curr_class_size / dataset_sizes[dataset_name]),
+                        int(100 * curr_class_size / global_size)))
+                class_split = self._get_raw_split(curr_class_samples)
+                for set_idx, class_idxs_map in enumerate(class_split):
                     for dataset_name in datasets:
-                        if dataset_name in idxs_dict_list:
-                            idxs_dict_list[dataset_name] += class_idxs_dict_list[dataset_name]
-                        else:
-                            idxs_dict_list[dataset_name] = class_idxs_dict_list[dataset_name]
+                        split_idxs[set_idx][dataset_name].append(class_idxs_map[dataset_name])
+                        split_labels[set_idx][dataset_name].append(np.full(len(class_idxs_map[dataset_name]), class_idx))
+            # pairs are only built once all class arrays are concatenated (class names are shared, not copied)
+            global_class_names = np.asarray(global_class_names, dtype=object)
+            train_idxs, valid_idxs, test_idxs = [
+                {name: list(zip(np.concatenate(split_idxs[set_idx][name]).tolist(),
+                                global_class_names[np.concatenate(split_labels[set_idx][name])].tolist()))
+                 for name in datasets} for set_idx in range(3)]
         else:  # no balancing to be done
-            dataset_indices = {}
-            for dataset_name in datasets:
-                # note: all indices paired with 'None' below as class is ignored; used for compatibility with code above
-                dataset_indices[dataset_name] = list(
-                    zip(list(range(dataset_sizes[dataset_name])), [None] * dataset_sizes[dataset_name]))
-            train_idxs, valid_idxs, test_idxs = self._get_raw_split(dataset_indices)
+            dataset_indices = {name: np.arange(dataset_sizes[name]) for name in datasets}
+            # note: all indices paired with 'None' below as class is ignored; used for compatibility with code above
+            train_idxs, valid_idxs, test_idxs = [{name: list(zip(idxs.tolist(), itertools.repeat(None)))
+                                                  for name, idxs in idxs_map.items()}
+                                                 for idxs_map in self._get_raw_split(dataset_indices)]
+        for idxs_map, shard_idxs_map in zip([train_idxs, valid_idxs, test_idxs], shard_split):
+            idxs_map.update({name: list(zip(idxs.tolist(), itertools.repeat(None))) for name, idxs in shard_idxs_map.items()})
         return train_idxs, valid_idxs, test_idxs
 
-    def create_loaders(self, datasets, train_idxs, valid_idxs, test_idxs):
+    def get_split_hash(self, datasets, task, datasets_config=None):
+        """Returns the hash that identifies the split computed by :func:`get_split` for the given datasets.
+
+        The hash covers the dataset configurations (if provided), their lengths, the task, the split ratios,
+        the shuffling and balancing flags, and the split seeds. Seeds that were not specified in the
+        configuration (i.e. randomly generated ones) are ignored, so that a resumed session can reuse its
+        original split.
+        """
+        split_seeds = {key: self.seeds[key] if self.split_seeds_configured[key] else None for key in ["test", "valid"]}
+        return thelper.utils.get_params_hash(
+            datasets_config=datasets_config,
+            dataset_sizes={name: len(dataset) for name, dataset in datasets.items()},
+            task=str(task),
+            splits=[self.train_split, self.valid_split, self.test_split],
+            shuffle=[self.train_shuffle, self.valid_shuffle, self.test_shuffle],
+            skip_class_balancing=self.skip_class_balancing,
+            seeds=split_seeds,
+        )
+
+    @staticmethod
+    def load_split(path, split_hash):
+        """Loads the train/valid/test index maps saved by :func:`save_split`, if the file exists and its hash matches.
+
+        Returns:
+            A three-element tuple containing the training, validation, and test index maps, or ``None`` if the
+            file is missing or if it was computed for a different split hash.
+        """
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as fd:
+                if str(fd["hash"]) != split_hash:
+                    logger.info(f"split indices cached at '{path}' are outdated, will recompute them")
+                    return None
+                idxs_maps = []
+                for set_name in ["train", "valid", "test"]:
+                    idxs_map = {}
+                    for dataset_idx, dataset_name in enumerate(fd["names"].tolist()):
+                        idxs = fd[f"{set_name}_idxs_{dataset_idx}"].tolist()
+                        labels_key = f"{set_name}_labels_{dataset_idx}"
+                        labels = pickle.loads(fd[labels_key].tobytes()) if labels_key in fd else [None] * len(idxs)
+                        idxs_map[dataset_name] = list(zip(idxs, labels))
+                    idxs_maps.append(idxs_map)
+        except (OSError, KeyError, ValueError, pickle.UnpicklingError) as e:
+            logger.warning(f"could not load cached split indices from '{path}' ({str(e)}), will recompute them")
+            return None
+        logger.info(f"loaded cached split indices from '{path}'")
+        return tuple(idxs_maps)
+
+    @staticmethod
+    def save_split(path, split_hash, train_idxs, valid_idxs, test_idxs):
+        """Saves the train/valid/test index maps to a compact ``.npz`` file, along with their split hash.
+
+        The sample labels (if any) are pickled into byte arrays, so that their original types are restored on load.
+        """
+        names = list(dict.fromkeys([name for idxs_map in [train_idxs, valid_idxs, test_idxs] for name in idxs_map]))
+        arrays = {"hash": np.asarray(split_hash), "names": np.asarray(names, dtype=str)}
+        for set_name, idxs_map in zip(["train", "valid", "test"], [train_idxs, valid_idxs, test_idxs]):
+            for dataset_idx, dataset_name in enumerate(names):
+                pairs = idxs_map[dataset_name] if dataset_name in idxs_map else []
+                arrays[f"{set_name}_idxs_{dataset_idx}"] = np.asarray([idx for idx, _ in pairs], dtype=np.int64)
+                if any([label is not None for _, label in pairs]):
+                    labels = pickle.dumps([label for _, label in pairs])
+                    arrays[f"{set_name}_labels_{dataset_idx}"] = np.frombuffer(labels, dtype=np.uint8)
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+
+    def create_loaders(self, datasets, train_idxs, valid_idxs, test_idxs, task=None):
         """Returns the data loaders for the train/valid/test sets based on a prior split.
 
         This function essentially takes the dataset parser interfaces and indices maps, and instantiates
@@ -505,17 +1028,23 @@ class LoaderFactory:
         parsers will be deep-copied in each data loader, meaning that they should ideally not contain a
         persistent loading state or a large buffer.
 
+        Iterable datasets are given the shard indices of their split, and they handle the shuffling and the
+        distribution of their samples themselves. They cannot be combined with other datasets in a loader,
+        nor be used with samplers or scale factors.
+
         Args:
             datasets: the map of dataset parsers, where each has a name (key) and a parser (value).
             train_idxs: training data samples indices map.
             valid_idxs: validation data samples indices map.
             test_idxs: test data samples indices map.
+            task: the task used to encode the groundtruth of minibatches if ``encode_labels`` is turned on.
 
         Returns:
             A three-element tuple containing the training, validation, and test data loaders, respectively.
         """
+        assert not self.encode_labels or isinstance(task, thelper.tasks.Task), "label encoding requires a task object"
         loaders = []
-        for idxs_map, (augs, augs_append), shuffle, scale, sampler, batch_size, collate_fn \
+        for idxs_map, (augs, augs_append), shuffle, scale, sampler, batch_size, collate_fn, batch_transforms \
                 in zip([train_idxs, valid_idxs, test_idxs],
                        [(self.train_augments, self.train_augments_append),
                         (self.valid_augments, self.valid_augments_append),
@@ -524,11 +1053,18 @@ class LoaderFactory:
                        [self.train_scale, self.valid_scale, self.test_scale],
                        [self.train_sampler, self.valid_sampler, self.test_sampler],
                        [self.train_batch_size, self.valid_batch_size, self.test_batch_size],
-                       [self.train_collate_fn, self.valid_collate_fn, self.test_collate_fn]):
+                       [self.train_collate_fn, self.valid_collate_fn, self.test_collate_fn],
+                       [self.train_batch_transforms, self.valid_batch_transforms, self.test_batch_transforms]):
             loader_sample_idx_offset = 0
             loader_sample_classes = []
+            loader_sample_sizes = []
             loader_sample_idxs = []
             loader_datasets = []
+            loader_device_transforms = []
+            pass_labels = isinstance(sampler, dict) and \
+                thelper.utils.str2bool(thelper.utils.get_key_def("pass_labels", sampler, False))
+            pass_sizes = isinstance(sampler, dict) and \
+                thelper.utils.str2bool(thelper.utils.get_key_def("pass_sizes", sampler, False))
             for dataset_name, sample_idxs in idxs_map.items():
                 if not sample_idxs:
                     continue
@@ -546,14 +1082,44 @@ class LoaderFactory:
                             dataset.transforms = thelper.transforms.Compose([augs_copy, dataset.transforms])
                     else:
                         dataset.transforms = augs_copy
-                for sample_idx_idx in range(len(sample_idxs)):
-                    # values were paired in tuples earlier, 0=idx, 1=label
-                    loader_sample_idxs.append(sample_idxs[sample_idx_idx][0] + loader_sample_idx_offset)
-                    loader_sample_classes.append(sample_idxs[sample_idx_idx][1])
+                if self.defer_normalization:
+                    dataset.transforms, device_transforms = \
+                        thelper.transforms.split_device_transforms(dataset.transforms, dataset.task.input_key)
+                    loader_device_transforms.append(device_transforms)
+                # values were paired in tuples earlier, 0=idx, 1=label
+                dataset_sample_idxs, dataset_sample_classes = zip(*sample_idxs)
+                if isinstance(dataset, torch.utils.data.IterableDataset):
+                    dataset = dataset.select_shards(dataset_sample_idxs)
+                    dataset.shuffle = shuffle
+                    loader_datasets.append(dataset)
+                    continue
+                if pass_labels and any([label is None for label in dataset_sample_classes]):
+                    # split was not balanced by class, try to fetch the labels without loading the samples
+                    label_array = dataset.get_label_array() if hasattr(dataset, "get_label_array") else None
+                    if label_array is not None:
+                        class_names = np.asarray(dataset.task.class_names + ["<unset>"], dtype=object)
+                        dataset_sample_classes = class_names[label_array[list(dataset_sample_idxs)]].tolist()
+                if pass_sizes:
+                    # sizes are fetched from the original parser, so that any cached metadata is shared between loaders
+                    dataset_sizes = datasets[dataset_name].get_sample_sizes() \
+                        if hasattr(datasets[dataset_name], "get_sample_sizes") else None
+                    assert dataset_sizes is not None, f"could not get the sample sizes of dataset '{dataset_name}'"
+                    loader_sample_sizes.append(np.asarray(dataset_sizes, dtype=np.int64)[list(dataset_sample_idxs)])
+                loader_sample_idxs.extend([sample_idx + loader_sample_idx_offset for sample_idx in dataset_sample_idxs])
+                loader_sample_classes.extend(dataset_sample_classes)
                 loader_sample_idx_offset += len(dataset)
                 loader_datasets.append(dataset)
-            if len(loader_datasets) > 0:
-                dataset = torch.utils.data.ConcatDataset(loader_datasets) if len(loader_datasets) > 1 else loader_datasets[0]
+            if any([isinstance(dataset, torch.utils.data.IterableDataset) for dataset in loader_datasets]):
+                assert len(loader_datasets) == 1, "iterable datasets cannot be combined with other datasets in a loader"
+                assert sampler is None, "iterable datasets cannot be used with samplers"
+                assert scale == 1.0, "iterable datasets currently do not handle scale changes"
+                assert batch_size > 0
+                loaders.append(DataLoader(dataset=loader_datasets[0], batch_size=batch_size,
+                                          num_workers=self.workers, collate_fn=collate_fn,
+                                          pin_memory=self.pin_memory, drop_last=self.drop_last,
+                                          persistent_workers=self.persistent_workers, seeds=self.seeds))
+            elif len(loader_datasets) > 0:
+                dataset = ConcatDataset(loader_datasets) if len(loader_datasets) > 1 else loader_datasets[0]
                 if sampler is not None:
                     if isinstance(sampler, dict):
                         sampler_type = thelper.utils.get_key("type", sampler, msg="sampler config dict missing 'type' attribute")
@@ -563,7 +1129,12 @@ class LoaderFactory:
                         sampler_pass_labels_param_name = thelper.utils.get_key_def("pass_labels_param_name", sampler, "labels")
                         if sampler_pass_labels:
                             sampler_params = {**sampler_params, sampler_pass_labels_param_name: loader_sample_classes}
+                        sampler_pass_sizes_param_name = thelper.utils.get_key_def("pass_sizes_param_name", sampler, "sizes")
+                        if pass_sizes:
+                            sampler_params = {**sampler_params, sampler_pass_sizes_param_name: np.concatenate(loader_sample_sizes)}
                         sampler_sig = inspect.signature(sampler_type)
+                        if "batch_size" in sampler_sig.parameters:  # batch samplers get the loader's batch settings by default
+                            sampler_params = {"batch_size": batch_size, "drop_last": self.drop_last, **sampler_params}
                         if "seeds" in sampler_sig.parameters:
                             sampler_params = {**sampler_params, "seeds": self.seeds}
                         if "scale" in sampler_sig.parameters:
@@ -576,19 +1147,37 @@ class LoaderFactory:
                         assert scale == 1.0, f"could not apply scale factor to (pre-instantiated) sampler with type '{str(sampler)}'"
                     assert isinstance(sampler, torch.utils.data.sampler.Sampler), "invalid sampler type (should be torch-compatible)"
                 else:
-                    if shuffle:
+                    if shuffle and self.distributed:
+                        sampler = thelper.data.DistributedSubsetRandomSampler(loader_sample_idxs, seeds=self.seeds, scale=scale)
+                    elif shuffle:
                         sampler = thelper.data.SubsetRandomSampler(loader_sample_idxs, seeds=self.seeds, scale=scale)
                     else:
                         assert scale == 1.0, "sequential sampler currently does not handle scale changes (turn on shuffling)"
                         sampler = thelper.data.SubsetSequentialSampler(loader_sample_idxs)
                 assert hasattr(sampler, "__len__")
                 assert batch_size > 0
-                loaders.append(DataLoader(dataset=dataset, batch_size=batch_size, sampler=sampler,
-                                          num_workers=self.workers, collate_fn=collate_fn,
-                                          pin_memory=self.pin_memory, drop_last=self.drop_last,
-                                          seeds=self.seeds))
+                if hasattr(sampler, "batch_size"):  # batch samplers (e.g. bucketed ones) yield lists of indices
+                    loaders.append(DataLoader(dataset=dataset, batch_sampler=sampler,
+                                              num_workers=self.workers, collate_fn=collate_fn,
+                                              pin_memory=self.pin_memory,
+                                              persistent_workers=self.persistent_workers, seeds=self.seeds))
+                else:
+                    loaders.append(DataLoader(dataset=dataset, batch_size=batch_size, sampler=sampler,
+                                              num_workers=self.workers, collate_fn=collate_fn,
+                                              pin_memory=self.pin_memory, drop_last=self.drop_last,
+                                              persistent_workers=self.persistent_workers, seeds=self.seeds))
             else:
                 loaders.append(None)
+            if self.encode_labels and loaders[-1] is not None:
+                loaders[-1].set_label_encoding(task)
+            if self.defer_normalization and loaders[-1] is not None:
+                assert len(set([repr(t) for t in loader_device_transforms])) == 1, \
+                    "datasets combined in a loader must end with the same deferrable normalization stages"
+                if loader_device_transforms[0] is None:
+                    logger.warning("could not find trailing normalization stages to defer in the loader transforms")
+                loaders[-1].device_transforms = loader_device_transforms[0]
+            if batch_transforms is not None and loaders[-1] is not None:
+                loaders[-1].batch_transforms = batch_transforms
         train_loader, valid_loader, test_loader = loaders
         logger.info("initialized loaders with batch counts:" +
                     (f"\n\ttrain = {len(train_loader)}" if train_loader else "") +
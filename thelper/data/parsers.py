@@ -4,9 +4,16 @@ This module contains dataset parser interfaces and base classes that define basi
 operations so that the framework can automatically interact with training data.
 """
 
+import copy
 import inspect
+import io
+import json
 import logging
+import multiprocessing
 import os
+import pickle
+import sys
+import tarfile
 from abc import abstractmethod
 
 import cv2 as cv
@@ -22,6 +29,289 @@ import thelper.utils
 logger = logging.getLogger(__name__)
 
 
+class ColumnarSamples:
+    """Columnar (array-based) sample metadata store that can replace the ``samples`` list of a dataset.
+
+    Datasets typically hold their parsed sample metadata as a list of dictionaries. When these datasets are
+    forked into data loader workers, the reference count updates and garbage collection passes that touch these
+    Python objects force the copy-on-write memory pages they live in to be duplicated, meaning that the memory
+    usage of each worker eventually grows by the full size of the metadata. This store instead packs the values
+    of each sample key into a single array: numeric scalars are kept in NumPy arrays, strings are packed as
+    UTF-8 bytes with offsets (or as category codes if they repeat often), and all other values are pickled
+    individually and packed the same way. Rows are rebuilt as new dictionaries on access, so the store acts
+    like a read-only list of sample dictionaries.
+
+    Keys that are missing from some samples are supported via a per-key presence mask.
+
+    .. seealso::
+        | :class:`thelper.data.parsers.Dataset`
+    """
+
+    def __init__(self, samples=None, columns=None):
+        """Builds the columnar store from a list of sample dictionaries or from a dictionary of columns.
+
+        Args:
+            samples: list (or iterable) of sample dictionaries to pack.
+            columns: dictionary of equal-length value lists (or arrays) to pack, indexed by sample key. Cannot
+                be specified along with ``samples``.
+        """
+        if (samples is None) == (columns is None):
+            raise AssertionError("must provide either a list of samples or a dictionary of columns")
+        masks = {}
+        if samples is not None:
+            samples = list(samples)
+            if not all([isinstance(sample, dict) for sample in samples]):
+                raise AssertionError("samples should all be dictionaries")
+            keys = list(dict.fromkeys([key for sample in samples for key in sample]))
+            columns = {}
+            for key in keys:
+                present = np.asarray([key in sample for sample in samples], dtype=bool)
+                if not present.all():
+                    masks[key] = present
+                columns[key] = [sample[key] if key in sample else None for sample in samples]
+            self._len = len(samples)
+        else:
+            if not isinstance(columns, dict):
+                raise AssertionError("columns should be given as a dictionary")
+            lengths = {len(values) for values in columns.values()}
+            if len(lengths) > 1:
+                raise AssertionError("all columns should have the same length")
+            self._len = lengths.pop() if lengths else 0
+        self._columns = {key: self._pack(values, masks.get(key)) for key, values in columns.items()}
+        self._masks = masks
+
+    @staticmethod
+    def _pack_bytes(values):
+        """Packs a list of byte strings into a single byte array with offsets."""
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in values], out=offsets[1:])
+        return np.frombuffer(b"".join(values), dtype=np.uint8), offsets
+
+    @staticmethod
+    def _pack(values, mask=None):
+        """Returns the packed representation of a column of values as a (kind, arrays...) tuple."""
+        if isinstance(values, np.ndarray) and values.ndim == 1 and values.dtype != object:
+            return ("array", values.copy()) if values.dtype.kind != "U" else ColumnarSamples._pack(values.tolist(), mask)
+        values = list(values)
+        present = [v for idx, v in enumerate(values) if mask is None or mask[idx]]
+        types = {type(v) for v in present}
+        if len(types) == 1 and types.pop() in (bool, int, float):
+            try:
+                fill = type(present[0])()
+                return "scalar", np.asarray([v if mask is None or mask[idx] else fill for idx, v in enumerate(values)])
+            except OverflowError:
+                pass  # integers too large for numpy; will be pickled below
+        elif present and all([isinstance(v, str) for v in present]):
+            values = [v if mask is None or mask[idx] else "" for idx, v in enumerate(values)]
+            categories = list(dict.fromkeys(values))
+            if len(categories) <= min(len(values) // 4, 2 ** 16):
+                category_map = {category: code for code, category in enumerate(categories)}
+                codes = np.asarray([category_map[v] for v in values], dtype=np.int32)
+                return "category", codes, categories
+            return ("str", *ColumnarSamples._pack_bytes([v.encode("utf-8", "surrogateescape") for v in values]))
+        return ("pickle", *ColumnarSamples._pack_bytes([pickle.dumps(v) for v in values]))
+
+    @property
+    def keys(self):
+        """Returns the list of sample keys held in the store."""
+        return list(self._columns.keys())
+
+    def column(self, key):
+        """Returns all values of a sample key (as an array for numeric or categorical columns, or as a list).
+
+        For categorical string columns, the returned array contains the category names. Values of samples that
+        did not contain the key are left to a default (zero, empty, or `None`) placeholder.
+        """
+        if key not in self._columns:
+            raise AssertionError("unknown sample key '%s'" % str(key))
+        packed = self._columns[key]
+        if packed[0] in ("array", "scalar"):
+            return packed[1]
+        if packed[0] == "category":
+            return np.asarray(packed[2])[packed[1]]
+        return [self._get_value(packed, idx) for idx in range(self._len)]
+
+    def mask(self, key):
+        """Returns the boolean array that indicates which samples contain a given key (or `None` if all do)."""
+        if key not in self._columns:
+            raise AssertionError("unknown sample key '%s'" % str(key))
+        return self._masks.get(key)
+
+    @staticmethod
+    def _get_value(packed, idx):
+        """Returns a single unpacked value from a packed column."""
+        kind = packed[0]
+        if kind == "array":
+            return packed[1][idx]
+        if kind == "scalar":
+            return packed[1][idx].item()
+        if kind == "category":
+            return packed[2][packed[1][idx]]
+        data = packed[1][packed[2][idx]:packed[2][idx + 1]].tobytes()
+        if kind == "str":
+            return data.decode("utf-8", "surrogateescape")
+        return pickle.loads(data)
+
+    def __len__(self):
+        """Returns the number of samples held in the store."""
+        return self._len
+
+    def __getitem__(self, idx):
+        """Returns a (new) sample dictionary for a specific index, or a list of them for a slice."""
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._len))]
+        if idx < -self._len or idx >= self._len:
+            raise IndexError("sample index is out-of-range")
+        if idx < 0:
+            idx = self._len + idx
+        return {key: self._get_value(packed, idx) for key, packed in self._columns.items()
+                if key not in self._masks or self._masks[key][idx]}
+
+    def __iter__(self):
+        """Returns an iterator over the sample dictionaries of the store."""
+        for idx in range(self._len):
+            yield self[idx]
+
+    def __repr__(self):
+        """Returns a print-friendly representation of this store."""
+        return self.__class__.__qualname__ + f"(len={self._len}, keys={repr(self.keys)})"
+
+
+class PackedFiles:
+    """Read-only store of raw (encoded) file contents packed into a single contiguous byte buffer.
+
+    All files are read once on construction (in chunks, possibly with a thread pool) into one preallocated
+    ``uint8`` array, and located via an array of offsets. Since the whole store is made of only two arrays,
+    forked data loader workers share its memory pages instead of duplicating them (see
+    :class:`thelper.data.parsers.ColumnarSamples` for more information). If the workers are spawned instead,
+    the buffer can be allocated in shared memory so that it is attached by name instead of being copied.
+
+    This is used by the image parsers for their ``preload="encoded"`` mode, where the compressed images are
+    kept in memory and decoded on access: it typically uses 5-10x less memory than preloading decoded images,
+    while avoiding all disk i/o during training.
+
+    .. seealso::
+        | :class:`thelper.data.parsers.ImageDataset`
+        | :func:`thelper.data.utils.read_files`
+    """
+
+    def __init__(self, paths, io_threads=0, shared_memory=None, chunk_size=1024):
+        """Reads and packs the content of a list of files.
+
+        Args:
+            paths: list of paths to the files to read; ``None`` entries are packed as empty files.
+            io_threads: number of threads to use for reading (see :func:`thelper.data.utils.read_files`).
+            shared_memory: specifies whether to allocate the buffer in shared memory instead of in the
+                process heap (useful if data loader workers are spawned instead of forked). If ``None``, shared
+                memory is used only if the default process start method is not 'fork' (and if it is supported,
+                i.e. with Python 3.8 and above).
+            chunk_size: number of files to read at once (bounds the memory used by in-flight reads).
+        """
+        paths = list(paths)
+        sizes = []
+        for path in paths:
+            try:
+                sizes.append(os.path.getsize(path) if path else 0)
+            except OSError:
+                sizes.append(0)  # like an unreadable file, will be rejected when decoded
+        self._offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self._offsets[1:])
+        self._shm, self._owner_pid = None, os.getpid()
+        if shared_memory is None:
+            start_method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+            shared_memory = start_method != "fork" and sys.version_info >= (3, 8)
+        if shared_memory:
+            assert sys.version_info >= (3, 8), "shared memory buffers require python 3.8 or above"
+            from multiprocessing.shared_memory import SharedMemory  # not available in python 3.6/3.7
+            self._shm = SharedMemory(create=True, size=max(int(self._offsets[-1]), 1))
+            self._buffer = np.ndarray((self._offsets[-1],), dtype=np.uint8, buffer=self._shm.buf)
+        else:
+            self._buffer = np.empty((self._offsets[-1],), dtype=np.uint8)
+        for chunk_start in range(0, len(paths), chunk_size):
+            chunk_paths = [path for path in paths[chunk_start:chunk_start + chunk_size] if path]
+            chunk_idxs = [idx for idx in range(chunk_start, min(chunk_start + chunk_size, len(paths))) if paths[idx]]
+            for idx, data in zip(chunk_idxs, thelper.data.utils.read_files(chunk_paths, io_threads)):
+                if len(data) != sizes[idx]:
+                    raise AssertionError("file size changed while reading '%s'" % paths[idx])
+                self._buffer[self._offsets[idx]:self._offsets[idx + 1]] = np.frombuffer(data, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        """Returns the total size of the packed file contents, in bytes."""
+        return int(self._offsets[-1])
+
+    def __len__(self):
+        """Returns the number of files held in the store."""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        """Returns the content of a file as a ``uint8`` array (a view into the packed buffer)."""
+        if idx < -len(self) or idx >= len(self):
+            raise IndexError("file index is out-of-range")
+        if idx < 0:
+            idx = len(self) + idx
+        return self._buffer[self._offsets[idx]:self._offsets[idx + 1]]
+
+    def __copy__(self):
+        """Returns the store itself, as it is read-only."""
+        return self
+
+    def __deepcopy__(self, memo):
+        """Returns the store itself, as it is read-only."""
+        return self
+
+    def __getstate__(self):
+        """Returns the picklable state of this store (the shared buffer is reattached by name on unpickling)."""
+        state = self.__dict__.copy()
+        state["_owner_pid"] = None  # only the original store may destroy the shared buffer
+        if self._shm is not None:
+            state["_buffer"] = None
+        return state
+
+    def __setstate__(self, state):
+        """Restores the state of this store, reattaching its shared buffer if needed."""
+        self.__dict__.update(state)
+        if self._shm is not None:
+            self._buffer = np.ndarray((self._offsets[-1],), dtype=np.uint8, buffer=self._shm.buf)
+
+    def close(self):
+        """Releases the shared buffer (if any), destroying it if it was created in this process."""
+        if self._shm is not None:
+            self._buffer = None
+            self._shm.close()
+            if self._owner_pid == os.getpid():
+                self._shm.unlink()
+            self._shm = None
+
+    def __del__(self):
+        """Releases the shared buffer (if any) on destruction."""
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        """Returns a print-friendly representation of this store."""
+        return self.__class__.__qualname__ + f"(len={len(self)}, nbytes={self.nbytes}, shared={self._shm is not None})"
+
+
+def _get_sample_labels(samples, gt_key):
+    """Returns the list of label values found in a list of sample dictionaries (or ``None`` if not dicts)."""
+    if isinstance(samples, ColumnarSamples):
+        if gt_key not in samples.keys:
+            return [None] * len(samples)
+        values, mask = samples.column(gt_key), samples.mask(gt_key)
+        if mask is None:
+            return values
+        return [value if is_set else None for value, is_set in zip(values, mask)]
+    labels = []
+    for sample in samples:
+        if not isinstance(sample, dict):
+            return None
+        labels.append(sample[gt_key] if gt_key in sample else None)
+    return labels
+
+
 class Dataset(torch.utils.data.Dataset):
     """Abstract dataset parsing interface that holds a task and a list of sample dictionaries.
 
@@ -62,7 +352,9 @@ class Dataset(torch.utils.data.Dataset):
             function is called, as they will most likely then be accomplished in a separate thread.
             Once loaded, these samples should never be modified by another part of the framework. For
             example, transformation and augmentation operations will always be applied to copies
-            of these samples.
+            of these samples. For large datasets, this list can be replaced by a
+            :class:`thelper.data.parsers.ColumnarSamples` store to keep the memory usage of data loader
+            workers from growing with the size of the metadata.
         task: object used to define what keys are used to index the loaded data into sample dictionaries.
 
     .. seealso::
@@ -162,6 +454,73 @@ class Dataset(torch.utils.data.Dataset):
             raise AssertionError("unexpected input (should be slice)")
         return [self[idx] for idx in range(*idxs.indices(len(self)))]
 
+    def get_batch(self, idxs):
+        """Returns a list of data samples (dictionaries) for a list of (0-based) indices.
+
+        This is the batch-level fetching interface used by the data loaders: all the indices of a minibatch are
+        given at once, so that derived classes may read and decode them in a vectorized way (e.g. with a single
+        archive selection). The default implementation simply calls ``__getitem__`` for each index, so existing
+        parsers do not need to implement it. The returned samples must be ordered like the given indices, and
+        must already be transformed. The :class:`thelper.data.loaders.DataLoader` class calls it once per minibatch
+        (inside its workers, if any) instead of fetching samples one at a time, with PyTorch v1.7 or above.
+        """
+        return [self[idx] for idx in idxs]
+
+    def get_labels(self):
+        """Returns the groundtruth (label) values of all samples without loading them.
+
+        This is part of the (optional) label-only access protocol used to compute class statistics, to split
+        datasets, and to build class-aware samplers without decoding any input data. The default implementation
+        looks up the groundtruth key of the task in the internal sample metadata (``self.samples``), which is
+        sufficient for most parsers; derived classes that store their labels elsewhere should override it.
+
+        Returns:
+            A list or array holding one label value per sample (``None`` for unlabeled samples), or ``None``
+            if the labels cannot be obtained without loading the samples.
+        """
+        if self.task is None or self.task.gt_key is None or self.samples is None or \
+                isinstance(self.samples, Dataset) or len(self.samples) != len(self):
+            return None
+        return _get_sample_labels(self.samples, self.task.gt_key)
+
+    def get_label_array(self, task=None):
+        """Returns the class indices of all samples as an array without loading them.
+
+        This is part of the (optional) label-only access protocol; see :meth:`get_labels` for more information.
+
+        Args:
+            task: the classification task whose class names the labels should be mapped to. If ``None``,
+                the task of this dataset parser will be used.
+
+        Returns:
+            A 1-dim ``int64`` array holding one class index per sample (``-1`` for unlabeled samples),
+            or ``None`` if the labels are not available or if the task is not a classification task.
+        """
+        task = self.task if task is None else task
+        if not isinstance(task, thelper.tasks.Classification):
+            return None
+        if isinstance(self.samples, ColumnarSamples) and self.task is not None and self.task.gt_key in self.samples.keys \
+                and len(self.samples) == len(self):
+            return task.get_class_index_array(self.samples.column(self.task.gt_key), self.samples.mask(self.task.gt_key))
+        labels = self.get_labels()
+        if labels is None:
+            return None
+        return task.get_class_index_array(labels)
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) size of the input image of all samples without loading them.
+
+        This is part of the (optional) size-only access protocol used by bucketed batch samplers (see
+        :class:`thelper.data.samplers.BucketBatchSampler`) to group samples of similar sizes or aspect ratios
+        without decoding any image. The default implementation returns ``None``; derived classes that can
+        obtain these sizes from their metadata or from file headers should override it.
+
+        Returns:
+            A 2-dim ``int64`` array holding the (width, height) size of each sample (``-1`` for unknown sizes),
+            or ``None`` if the sizes cannot be obtained without loading the samples.
+        """
+        return None
+
     def __repr__(self):
         """Returns a print-friendly representation of this dataset."""
         return self._get_derived_name() + f"(transforms={repr(self.transforms)}, deepcopy={repr(self.deepcopy)})"
@@ -174,9 +533,17 @@ class HDF5Dataset(Dataset):
     archives it loads contains pre-split datasets that can be reloaded without having to resplit their
     data. The archive also contains useful metadata, and a task interface.
 
+    The archive is only opened long enough in the constructor to parse its metadata; afterwards, the file
+    handle is (re)opened lazily in each process that actually reads samples (i.e. in each data loader worker).
+    This avoids sharing a single HDF5 handle between forked processes, which is not safe. Batches of samples
+    are fetched by the data loaders via :func:`thelper.data.parsers.HDF5Dataset.get_batch`, which reads all
+    requested indices of each key in a single sorted selection instead of issuing one small read per sample.
+
     Attributes:
-        archive: file descriptor for the opened hdf5 dataset.
+        archive_path: path to the hdf5 archive on disk.
+        archive: file descriptor for the opened hdf5 dataset (opened on first access in each process).
         subset: hdf5 group section representing the targeted set.
+        subset_name: name of the targeted set in the hdf5 archive.
         target_args: list decompression args required for each sample key.
         source: source logstamp of the hdf5 dataset.
         git_sha1: framework git tag of the hdf5 dataset.
@@ -197,34 +564,69 @@ class HDF5Dataset(Dataset):
         super(HDF5Dataset, self).__init__(transforms=transforms, deepcopy=False)
         assert subset in ["train", "valid", "test"], f"unrecognized subset '{subset}'"
         import h5py
-        self.archive = h5py.File(root, "r")
-        self.source = self.archive.attrs["source"]
-        self.git_sha1 = self.archive.attrs["git_sha1"]
-        self.version = self.archive.attrs["version"]
-        self.task = thelper.tasks.create_task(self.archive.attrs["task"])
-        self.orig_config = eval(self.archive.attrs["config"])
-        compr_config = eval(self.archive.attrs["compression"])
-        if subset not in self.archive:
-            raise AssertionError(f"subset '{subset}' not found in hdf5 archive")
-        self.subset = self.archive[subset]
-        sample_count = self.subset.attrs["count"]
-        self.samples = [{}] * sample_count
-        self.target_args = {}
-        for key in self.task.keys:
-            dset = self.subset[key]
-            assert dset.len() == len(self.samples)
-            dtype = dset.attrs["orig_dtype"] if "orig_dtype" in dset.attrs else None
-            shape = dset.attrs["orig_shape"] if "orig_shape" in dset.attrs else None
-            compr_config = thelper.utils.get_key_def(key, compr_config, default={})
-            compr_type = thelper.utils.get_key_def("type", compr_config, default="none")
-            compr_kwargs = thelper.utils.get_key_def(["decode_params", "decode_kwargs"], compr_config, default={})
-            self.target_args[key] = {"dset": dset, "dtype": dtype, "shape": shape, "compr_type": compr_type, "compr_kwargs": compr_kwargs}
+        self.archive_path = root
+        self.subset_name = subset
+        self._archive, self._archive_pid, self._dsets = None, None, None
+        with h5py.File(root, "r") as archive:
+            self.source = archive.attrs["source"]
+            self.git_sha1 = archive.attrs["git_sha1"]
+            self.version = archive.attrs["version"]
+            self.task = thelper.tasks.create_task(archive.attrs["task"])
+            self.orig_config = eval(archive.attrs["config"])
+            compr_config = eval(archive.attrs["compression"])
+            if subset not in archive:
+                raise AssertionError(f"subset '{subset}' not found in hdf5 archive")
+            subset_group = archive[subset]
+            sample_count = subset_group.attrs["count"]
+            self.samples = [{}] * sample_count
+            self.target_args = {}
+            for key in self.task.keys:
+                dset = subset_group[key]
+                assert dset.len() == len(self.samples)
+                dtype = dset.attrs["orig_dtype"] if "orig_dtype" in dset.attrs else None
+                shape = dset.attrs["orig_shape"] if "orig_shape" in dset.attrs else None
+                key_compr_config = thelper.utils.get_key_def(key, compr_config, default={})
+                compr_type = thelper.utils.get_key_def("type", key_compr_config, default="none")
+                compr_kwargs = thelper.utils.get_key_def(["decode_params", "decode_kwargs"], key_compr_config, default={})
+                self.target_args[key] = {"dtype": dtype, "shape": shape, "compr_type": compr_type, "compr_kwargs": compr_kwargs}
 
-    def _unpack(self, dset, idx, dtype=None, shape=None, compr_type="none", **compr_kwargs):
+    @property
+    def archive(self):
+        """Returns the hdf5 file handle for the current process, opening it if needed."""
+        if self._archive is None or self._archive_pid != os.getpid():
+            if self._archive is not None:
+                # handle was inherited from a parent process (e.g. via a fork); drop our copy of it
+                try:
+                    self._archive.close()
+                except Exception:
+                    pass
+            import h5py
+            self._archive = h5py.File(self.archive_path, "r")
+            self._archive_pid = os.getpid()
+            self._dsets = None
+        return self._archive
+
+    @property
+    def subset(self):
+        """Returns the hdf5 group section representing the targeted set."""
+        return self.archive[self.subset_name]
+
+    def _get_dset(self, key):
+        """Returns the (cached) hdf5 dataset object tied to a sample key for the current process."""
+        subset = self.subset  # will reopen the archive (and reset the cache) if needed
+        if self._dsets is None:
+            self._dsets = {}
+        if key not in self._dsets:
+            self._dsets[key] = subset[key]
+        return self._dsets[key]
+
+    @staticmethod
+    def _decode(data, dtype=None, shape=None, compr_type="none", **compr_kwargs):
+        """Decodes and reshapes a single raw element read from the archive."""
         if dtype is not None:
-            array = np.frombuffer(thelper.utils.decode_data(dset[idx], compr_type, **compr_kwargs), dtype=dtype)
+            array = np.frombuffer(thelper.utils.decode_data(data, compr_type, **compr_kwargs), dtype=dtype)
         else:
-            array = dset[idx]
+            array = data
         if shape is not None:
             if np.issubdtype(dtype, np.dtype(str).type) and len(shape) == 0:
                 array = "".join(array)  # reassemble string if needed
@@ -232,22 +634,386 @@ class HDF5Dataset(Dataset):
                 array = array.reshape(shape)
         return array
 
+    def _unpack(self, dset, idx, dtype=None, shape=None, compr_type="none", **compr_kwargs):
+        return self._decode(dset[idx], dtype, shape, compr_type, **compr_kwargs)
+
+    @staticmethod
+    def _read_sorted(dset, idxs):
+        """Reads an array of sorted unique indices from a dataset in a single selection call."""
+        begidx, endidx = int(idxs[0]), int(idxs[-1]) + 1
+        if endidx - begidx == len(idxs):
+            return dset[begidx:endidx]  # contiguous block, simplest hyperslab
+        if endidx - begidx <= 2 * len(idxs):
+            # dense selection; reading the whole block and slicing it in memory is cheaper
+            return dset[begidx:endidx][idxs - begidx]
+        return dset[idxs]
+
+    def _getitems(self, idxs):
+        """Returns a list of dictionaries corresponding to the sliced or listed sample indices.
+
+        All requested indices are sorted and deduplicated, and each key of the archive is then read
+        with a single selection before the samples are decoded and transformed one by one.
+        """
+        if isinstance(idxs, slice):
+            idxs = range(*idxs.indices(len(self)))
+        idxs = np.asarray(idxs, dtype=np.int64).reshape(-1)
+        if len(idxs) == 0:
+            return []
+        if idxs.min() < 0 or idxs.max() >= len(self.samples):
+            raise AssertionError("sample index is out-of-range")
+        uniq_idxs, inv_idxs = np.unique(idxs, return_inverse=True)
+        raw_data = {key: self._read_sorted(self._get_dset(key), uniq_idxs) for key in self.target_args}
+        samples = []
+        for inv_idx in inv_idxs:
+            sample = {key: self._decode(raw_data[key][inv_idx], args["dtype"], args["shape"],
+                                        args["compr_type"], **args["compr_kwargs"])
+                      for key, args in self.target_args.items()}
+            if self.transforms:
+                sample = self.transforms(sample)
+            samples.append(sample)
+        return samples
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of indices, read with one selection per archive key."""
+        return self._getitems(idxs)
+
+    def get_labels(self):
+        """Returns the groundtruth (label) values of all samples, read from the archive without loading inputs."""
+        if self.task is None or self.task.gt_key is None or self.task.gt_key not in self.target_args:
+            return None
+        args = self.target_args[self.task.gt_key]
+        raw_data = self._get_dset(self.task.gt_key)[()]
+        if args["dtype"] is None:
+            return raw_data
+        return [self._decode(data, args["dtype"], args["shape"], args["compr_type"], **args["compr_kwargs"]) for data in raw_data]
+
     def __getitem__(self, idx):
         """Returns the data sample (a dictionary) for a specific (0-based) index."""
         if isinstance(idx, slice):
             return self._getitems(idx)
         if idx >= len(self.samples):
             raise AssertionError("sample index is out-of-range")
-        sample = {key: self._unpack(args["dset"], idx, args["dtype"], args["shape"],
+        sample = {key: self._unpack(self._get_dset(key), idx, args["dtype"], args["shape"],
                                     args["compr_type"], **args["compr_kwargs"]) for key, args in self.target_args.items()}
         if self.transforms:
             sample = self.transforms(sample)
         return sample
 
+    def __getstate__(self):
+        """Returns the picklable state of this dataset (without the process-specific file handle)."""
+        state = self.__dict__.copy()
+        state["_archive"], state["_archive_pid"], state["_dsets"] = None, None, None
+        return state
+
     def close(self):
-        """Closes the internal HDF5 file."""
+        """Closes the internal HDF5 file (if it was opened in this process)."""
         # note: if we dont do it explicitly, it will be done by the garbage collector on destruction, but it might take time...
-        self.archive.close()
+        if self._archive is not None and self._archive_pid == os.getpid():
+            self._archive.close()
+        self._archive, self._archive_pid, self._dsets = None, None, None
+
+
+class MemmapDataset(Dataset):
+    """Memory-mapped array archive dataset specialization interface.
+
+    This specialization is compatible with the sharded array archives made by the CLI's "split" operation
+    when its format is set to ``memmap``. These archives contain pre-split datasets stored as raw (uncompressed)
+    ``.npy`` shards with a fixed sample shape per key, and a small JSON index that holds the metadata and task
+    interface. All shards are opened via ``numpy.memmap`` (in copy-on-write mode), meaning that samples are not
+    decoded nor copied on access, and that the OS page cache is shared between all loader workers and sessions.
+
+    Note that the arrays returned for each sample are views into the mapped shards. Modifying them in-place will
+    not alter the archive, but it will trigger a copy of the affected memory pages.
+
+    Attributes:
+        archive_path: path to the root directory of the archive.
+        subset_name: name of the targeted set in the archive.
+        target_args: dtype, shape, and shard info required for each sample key.
+        shard_size: number of samples in each shard (except possibly the last one).
+        source: source logstamp of the archive.
+        git_sha1: framework git tag of the archive.
+        version: version of the framework that saved the archive.
+        orig_config: configuration used to originally generate the archive.
+
+    .. seealso::
+        | :func:`thelper.cli.split_data`
+        | :func:`thelper.data.utils.create_memmap`
+    """
+
+    index_name = "index.json"
+
+    def __init__(self, root, subset="train", transforms=None):
+        """Memory-mapped dataset parser constructor.
+
+        This constructor receives the path to the archive directory as well as a subset indicating which
+        section of the archive to load. By default, it loads the training set.
+        """
+        super(MemmapDataset, self).__init__(transforms=transforms, deepcopy=False)
+        assert subset in ["train", "valid", "test"], f"unrecognized subset '{subset}'"
+        index_path = os.path.join(root, self.index_name)
+        if not os.path.isfile(index_path):
+            raise AssertionError(f"could not locate archive index at '{index_path}'")
+        with open(index_path, "r") as fd:
+            index = json.load(fd)
+        self.archive_path = root
+        self.subset_name = subset
+        self.source = index["source"]
+        self.git_sha1 = index["git_sha1"]
+        self.version = index["version"]
+        self.task = thelper.tasks.create_task(index["task"])
+        self.orig_config = eval(index["config"])
+        if subset not in index["subsets"]:
+            raise AssertionError(f"subset '{subset}' not found in archive")
+        subset_index = index["subsets"][subset]
+        self.shard_size = subset_index["shard_size"]
+        self.samples = [{}] * subset_index["count"]
+        self.target_args = {}
+        for key in self.task.keys:
+            key_index = subset_index["keys"][key]
+            assert sum([shard["count"] for shard in key_index["shards"]]) == len(self.samples)
+            self.target_args[key] = {"dtype": key_index["dtype"], "shape": tuple(key_index["shape"]),
+                                     "shards": [os.path.join(root, shard["path"]) for shard in key_index["shards"]]}
+        self._shards = None
+
+    def _get_shard(self, key, shard_idx):
+        """Returns the (lazily) memory-mapped shard array of a given key for the current process."""
+        if self._shards is None:
+            self._shards = {key: [None] * len(args["shards"]) for key, args in self.target_args.items()}
+        if self._shards[key][shard_idx] is None:
+            self._shards[key][shard_idx] = np.load(self.target_args[key]["shards"][shard_idx], mmap_mode="c")
+        return self._shards[key][shard_idx]
+
+    def __getitem__(self, idx):
+        """Returns the data sample (a dictionary) for a specific (0-based) index."""
+        if isinstance(idx, slice):
+            return self._getitems(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise AssertionError("sample index is out-of-range")
+        shard_idx, shard_offset = divmod(idx, self.shard_size)
+        sample = {key: self._get_shard(key, shard_idx)[shard_offset] for key in self.target_args}
+        if self.transforms:
+            sample = self.transforms(sample)
+        return sample
+
+    def get_labels(self):
+        """Returns the groundtruth (label) values of all samples, read from the mapped shards without loading inputs."""
+        if self.task is None or self.task.gt_key is None or self.task.gt_key not in self.target_args:
+            return None
+        args = self.target_args[self.task.gt_key]
+        return np.concatenate([self._get_shard(self.task.gt_key, shard_idx) for shard_idx in range(len(args["shards"]))])
+
+    def __getstate__(self):
+        """Returns the picklable state of this dataset (without the mapped shards, which would be copied)."""
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+
+class TarShardDataset(Dataset, torch.utils.data.IterableDataset):
+    """Streaming tar shard archive dataset specialization interface.
+
+    This specialization is compatible with the tar shard archives made by the CLI's "split" operation when
+    its format is set to ``tar``. These archives contain pre-split datasets stored as a series of plain tar
+    files (shards) in which the elements of each sample are consecutive members, and a small JSON index that
+    holds the metadata and task interface. The shards are read sequentially in stream mode (without seeking),
+    which gives full throughput on spinning disks and on network storage that only performs well on large
+    sequential reads.
+
+    This is an iterable dataset: samples cannot be accessed by index, but are streamed shard by shard. When
+    ``shuffle`` is enabled, the order of the shards is shuffled at every epoch, and samples are shuffled
+    locally through an in-memory buffer of ``shuffle_buffer`` samples. The shards are distributed between the
+    replicas of the default process group (if one is initialized) and between the data loader workers, so
+    that each worker reads a disjoint set of shards (or, if there are fewer shards than workers, a disjoint
+    interleaved subset of the samples of a shard). When running distributed, every replica yields the same
+    number of samples (rereading some of its shards if needed) so that they all run the same number of
+    iterations. The loaders created by :class:`thelper.data.loaders.LoaderFactory` split this type of dataset
+    by shard (instead of by sample).
+
+    Attributes:
+        archive_path: path to the root directory of the archive.
+        subset_name: name of the targeted set in the archive.
+        keys: list of the sample keys held in the archive (in member index order).
+        key_args: encoding (file extension) and decoding parameters of each sample key.
+        shards: list of shard paths and sample counts.
+        sample_count: total number of samples in the selected shards.
+        shuffle: specifies whether the shards and samples should be shuffled at every epoch.
+        shuffle_buffer: size of the sample shuffling buffer.
+        seed: seed used to shuffle the shards and samples (offset by the epoch index).
+        epoch: current epoch index (set by the data loader).
+        source: source logstamp of the archive.
+        git_sha1: framework git tag of the archive.
+        version: version of the framework that saved the archive.
+        orig_config: configuration used to originally generate the archive.
+
+    .. seealso::
+        | :func:`thelper.cli.split_data`
+        | :func:`thelper.data.utils.create_tar_shards`
+    """
+
+    index_name = "index.json"
+
+    def __init__(self, root, subset="train", transforms=None, shuffle=True, shuffle_buffer=1000, seed=0):
+        """Tar shard dataset parser constructor.
+
+        This constructor receives the path to the archive directory as well as a subset indicating which
+        section of the archive to load. By default, it loads the training set.
+        """
+        super(TarShardDataset, self).__init__(transforms=transforms, deepcopy=False)
+        assert subset in ["train", "valid", "test"], f"unrecognized subset '{subset}'"
+        assert isinstance(shuffle_buffer, int) and shuffle_buffer >= 0, "invalid shuffle buffer size"
+        index_path = os.path.join(root, self.index_name)
+        if not os.path.isfile(index_path):
+            raise AssertionError(f"could not locate archive index at '{index_path}'")
+        with open(index_path, "r") as fd:
+            index = json.load(fd)
+        self.archive_path = root
+        self.subset_name = subset
+        self.source = index["source"]
+        self.git_sha1 = index["git_sha1"]
+        self.version = index["version"]
+        self.task = thelper.tasks.create_task(index["task"])
+        self.orig_config = eval(index["config"])
+        if subset not in index["subsets"]:
+            raise AssertionError(f"subset '{subset}' not found in archive")
+        self.keys = index["keys"]
+        self.key_args = index["key_args"]
+        self.shards = [{"path": os.path.join(root, shard["path"]), "count": shard["count"]}
+                       for shard in index["subsets"][subset]["shards"]]
+        self.sample_count = sum([shard["count"] for shard in self.shards])
+        assert self.sample_count == index["subsets"][subset]["count"], "unexpected shard sample counts"
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+        self._iter_count = 0  # number of iterations started since the epoch was last set (in this process)
+
+    @property
+    def shard_count(self):
+        """Returns the number of shards in this dataset."""
+        return len(self.shards)
+
+    def select_shards(self, shard_idxs):
+        """Returns a copy of this dataset that only streams the samples of the given shards."""
+        assert all([0 <= idx < len(self.shards) for idx in shard_idxs]), "shard index out-of-range"
+        dataset = copy.copy(self)
+        dataset.shards = [self.shards[idx] for idx in shard_idxs]
+        dataset.sample_count = sum([shard["count"] for shard in dataset.shards])
+        return dataset
+
+    def set_epoch(self, epoch=0):
+        """Sets the current epoch index, which offsets the seed used to shuffle shards and samples."""
+        assert isinstance(epoch, int) and epoch >= 0, "invalid epoch value"
+        self.epoch = epoch
+        self._iter_count = 0
+
+    def __len__(self):
+        """Returns the number of samples streamed in a full iteration by this process (i.e. by this replica)."""
+        num_replicas, _ = thelper.data.samplers._get_distributed_info()
+        return self.sample_count // num_replicas if num_replicas > 1 else self.sample_count
+
+    def __getitem__(self, idx):
+        """Raises, as the samples of iterable datasets cannot be accessed by index."""
+        raise AssertionError("tar shard datasets do not support random access (iterate over them instead)")
+
+    def _decode(self, data, key, ext):
+        """Decodes the raw content of a tar member into a sample element."""
+        if ext == "npy":
+            return np.load(io.BytesIO(data), allow_pickle=False)
+        if ext == "pkl":
+            return pickle.loads(data)
+        decode_params = {"flags": "cv.IMREAD_UNCHANGED", **self.key_args[key]["decode_params"]}
+        return thelper.utils.decode_data(np.frombuffer(data, dtype=np.uint8), ext, **decode_params)
+
+    def _read_shard(self, shard, stride=1, offset=0):
+        """Yields the (untransformed) samples of a shard, reading it sequentially.
+
+        If ``stride`` is larger than one, only every ``stride``-th sample (starting at ``offset``) is decoded
+        and returned; this is used to split a shard between several workers.
+        """
+        sample, sample_name, sample_idx = None, None, -1
+        with tarfile.open(shard["path"], "r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                name, key_idx, ext = member.name.split(".")
+                if name != sample_name:
+                    if sample is not None:
+                        yield sample
+                    sample_name, sample_idx = name, sample_idx + 1
+                    sample = {} if sample_idx % stride == offset else None
+                if sample is None:
+                    continue
+                key = self.keys[int(key_idx)]
+                sample[key] = self._decode(tar.extractfile(member).read(), key, ext)
+        if sample is not None:
+            yield sample
+
+    def _read_shards(self, shards, quota=None, stride=1, offset=0):
+        """Yields the samples of a list of shards, cycling over them until the quota is reached (if any)."""
+        count = 0
+        while True:
+            pass_count = 0
+            for shard in shards:
+                for sample in self._read_shard(shard, stride, offset):
+                    if quota is not None and count >= quota:
+                        return
+                    yield sample
+                    count, pass_count = count + 1, pass_count + 1
+            if quota is None or count >= quota or pass_count == 0:
+                return
+
+    @staticmethod
+    def _shuffle_samples(samples, buffer_size, rng):
+        """Yields the samples of an iterator in a random order using a fixed-size shuffling buffer."""
+        buffer = []
+        for sample in samples:
+            if len(buffer) < buffer_size:
+                buffer.append(sample)
+                continue
+            idx = rng.integers(buffer_size)
+            yield buffer[idx]
+            buffer[idx] = sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def __iter__(self):
+        """Returns an iterator over the (transformed) samples of the shards assigned to this process/worker."""
+        epoch = self.epoch + self._iter_count  # persistent workers are never given the new epoch index
+        self._iter_count += 1
+        num_replicas, rank = thelper.data.samplers._get_distributed_info()
+        worker_info = torch.utils.data.get_worker_info()
+        num_workers, worker_id = (worker_info.num_workers, worker_info.id) if worker_info is not None else (1, 0)
+        slot_count, slot = num_replicas * num_workers, rank * num_workers + worker_id
+        shard_idxs = np.arange(len(self.shards))
+        if self.shuffle:
+            np.random.default_rng((self.seed, epoch)).shuffle(shard_idxs)  # same order in all replicas/workers
+        stride, offset = 1, 0
+        if len(shard_idxs) >= slot_count:
+            shard_idxs = shard_idxs[slot::slot_count]
+        elif len(shard_idxs) > 0:
+            # not enough shards for all slots; the slots that share a shard each read an interleaved part of it
+            shard_count = len(shard_idxs)
+            stride = slot_count // shard_count + (1 if slot % shard_count < slot_count % shard_count else 0)
+            offset, shard_idxs = slot // shard_count, shard_idxs[[slot % shard_count]]
+        quota = None
+        if num_replicas > 1:
+            replica_quota = len(self)
+            quota = replica_quota // num_workers + (1 if worker_id < replica_quota % num_workers else 0)
+        samples = self._read_shards([self.shards[idx] for idx in shard_idxs], quota, stride, offset)
+        if self.shuffle and self.shuffle_buffer > 1:
+            samples = self._shuffle_samples(samples, self.shuffle_buffer, np.random.default_rng((self.seed, epoch, slot)))
+        for sample in samples:
+            if self.transforms:
+                sample = self.transforms(sample)
+            yield sample
+
+    def __repr__(self):
+        """Returns a print-friendly representation of this dataset."""
+        return self._get_derived_name() + f"(root={repr(self.archive_path)}, subset={repr(self.subset_name)}, " + \
+            f"shuffle={repr(self.shuffle)}, shuffle_buffer={repr(self.shuffle_buffer)}, seed={repr(self.seed)}, " + \
+            f"transforms={repr(self.transforms)})"
 
 
 class ClassificationDataset(Dataset):
@@ -326,6 +1092,60 @@ class SegmentationDataset(Dataset):
         raise NotImplementedError
 
 
+def _get_sample_idx(idx, sample_count):
+    """Returns the (positive) index of a sample, validating it against the sample count of a dataset."""
+    if idx >= sample_count:
+        raise AssertionError("sample index is out-of-range")
+    if idx < 0:
+        idx = sample_count + idx
+    return idx
+
+
+def _read_image(image_path, image_buffer=None, decode_size=None):
+    """Reads an image from its path or decodes it from its file content, reducing its resolution if possible."""
+    flags = None
+    if decode_size is not None:
+        flags = thelper.data.utils.get_image_decode_flags(image_path if image_buffer is None else image_buffer, decode_size)
+    if image_buffer is None:
+        return cv.imread(image_path) if flags is None else cv.imread(image_path, flags)
+    return thelper.data.utils.decode_image(image_buffer) if flags is None else thelper.data.utils.decode_image(image_buffer, flags)
+
+
+def _get_packed_files(samples, path_key, preload, io_threads):
+    """Returns the packed image files of a dataset if they should be preloaded in their encoded form."""
+    if preload != "encoded":
+        return None
+    logger.info("preloading %d encoded image files..." % len(samples))
+    image_files = PackedFiles(samples.column(path_key), io_threads=io_threads)
+    logger.info("preloaded %d encoded image files (%d MB)" % (len(image_files), image_files.nbytes // (1024 * 1024)))
+    return image_files
+
+
+def _get_image_sizes(dataset):
+    """Returns the (width, height) sizes of the images of an image parser, read once from their file headers."""
+    if dataset._image_sizes is None:
+        images = dataset.image_files if dataset.image_files is not None else dataset.samples.column(dataset.path_key)
+        images = [images[idx] for idx in range(len(images))]
+        dataset._image_sizes = thelper.data.utils.read_image_sizes(images, dataset.io_threads)
+    return dataset._image_sizes
+
+
+def _get_index_cache_dir(index_cache):
+    """Returns the folder manifest cache directory to use given an ``index_cache`` dataset argument."""
+    if index_cache is True:
+        return thelper.data.utils.default_index_cache_dir
+    if not index_cache:
+        return None
+    if not isinstance(index_cache, str):
+        raise AssertionError("unexpected index cache type (should be bool or directory path)")
+    return index_cache
+
+
+def _get_folder_class_map(folders):
+    """Returns an (empty) class map built from the top-level folders of an index (in listing order)."""
+    return {folder: [] for folder in folders if folder and os.sep not in folder}
+
+
 class ImageDataset(Dataset):
     """Image dataset specialization interface.
 
@@ -335,41 +1155,91 @@ class ImageDataset(Dataset):
     directly train a model. It can however be useful when simply visualizing, annotating, or testing raw data
     from a simple directory structure.
 
+    The image folder is indexed via :func:`thelper.data.utils.index_folder`. If ``index_cache`` is set to `True`,
+    its manifest is cached in :attr:`thelper.data.utils.default_index_cache_dir` and only refreshed incrementally
+    in later sessions; it can also be set to a directory path to change this location. The cache is disabled
+    by default, so nothing is written outside of the session directories unless requested.
+
+    If ``io_threads`` is strictly positive, the image files of each minibatch are read concurrently by that
+    many threads (in each loader worker) via :func:`thelper.data.utils.read_files`, and decoded from memory.
+    This helps a few workers saturate high-latency (e.g. network) storage. Set ``preload`` to ``"encoded"`` to
+    instead read all image files once on construction and keep their compressed content in memory (see
+    :class:`thelper.data.parsers.PackedFiles`); images are then decoded on access, without any disk i/o.
+
+    If the images are downscaled right after being loaded, ``decode_size`` can be set to the minimum (width, height)
+    size (or edge size) they should be decoded at; they will then be decoded at 1/2, 1/4, or 1/8 of their resolution
+    when possible (see :func:`thelper.data.utils.get_image_decode_flags`), which is much faster for large JPEGs. If
+    it is set to ``"auto"``, this size is inferred from the first operation of the sample transformation pipeline
+    (see :func:`thelper.transforms.utils.get_output_size_hint`).
+
     .. seealso::
         | :class:`thelper.data.parsers.Dataset`
+        | :func:`thelper.data.utils.index_folder`
+        | :func:`thelper.data.utils.read_files`
     """
 
-    def __init__(self, root, transforms=None, image_key="image", path_key="path", idx_key="idx"):
+    def __init__(self, root, transforms=None, image_key="image", path_key="path", idx_key="idx", index_cache=False,
+                 io_threads=0, preload=False, decode_size=None):
         """Image dataset parser constructor.
 
         This constructor exposes some of the configurable keys used to index sample dictionaries.
         """
         super(ImageDataset, self).__init__(transforms=transforms)
+        assert isinstance(io_threads, int) and io_threads >= 0, "invalid i/o thread count (should be non-negative int)"
+        self.io_threads = io_threads
+        assert preload in [False, "encoded"], "unsupported preload mode (should be False or 'encoded')"
+        self.preload = preload
+        assert decode_size is None or decode_size == "auto" or isinstance(decode_size, int) or \
+            (isinstance(decode_size, (list, tuple)) and len(decode_size) == 2), "invalid decode size hint"
+        self.decode_size = (decode_size, decode_size) if isinstance(decode_size, int) else decode_size
         self.root = root
         if self.root is None or not os.path.isdir(self.root):
             raise AssertionError("invalid input data root '%s'" % self.root)
         self.image_key = image_key
         self.path_key = path_key
         self.idx_key = idx_key
-        self.samples = []
-        for folder, subfolder, files in os.walk(self.root):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in [".jpg", ".jpeg", ".bmp", ".png", ".ppm", ".pgm", ".tif"]:
-                    self.samples.append({self.path_key: os.path.join(folder, file)})
+        folders, files = thelper.data.utils.index_folder(self.root, thelper.data.utils.image_folder_exts,
+                                                         cache_dir=_get_index_cache_dir(index_cache))
+        paths = []
+        for folder, folder_files in zip(folders, files):
+            folder = os.path.join(self.root, folder)
+            paths.extend(os.path.join(folder, file) for file in folder_files)
+        self.samples = ColumnarSamples(columns={self.path_key: paths})
+        self.image_files = _get_packed_files(self.samples, self.path_key, self.preload, self.io_threads)
+        self._image_sizes = None  # read lazily from the file headers, see ``get_sample_sizes``
         self.task = thelper.tasks.Task(self.image_key, None, [self.path_key, self.idx_key])
 
     def __getitem__(self, idx):
         """Returns the data sample (a dictionary) for a specific (0-based) index."""
         if isinstance(idx, slice):
             return self._getitems(idx)
-        if idx >= len(self.samples):
-            raise AssertionError("sample index is out-of-range")
-        if idx < 0:
-            idx = len(self.samples) + idx
+        return self._load_sample(_get_sample_idx(idx, len(self.samples)))
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of indices, reading their files concurrently if possible."""
+        if not self.io_threads or self.image_files is not None:
+            return super().get_batch(idxs)
+        idxs = [_get_sample_idx(idx, len(self.samples)) for idx in idxs]
+        buffers = thelper.data.utils.read_files([self.samples[idx][self.path_key] for idx in idxs], self.io_threads)
+        return [self._load_sample(idx, buffer) for idx, buffer in zip(idxs, buffers)]
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) size of all images, read once from their file headers (without decoding)."""
+        return _get_image_sizes(self)
+
+    def _get_decode_size(self):
+        """Returns the minimum (width, height) size at which images can be decoded (or ``None`` if unknown)."""
+        if self.decode_size == "auto":
+            return thelper.transforms.get_output_size_hint(self.transforms, self.image_key)
+        return self.decode_size
+
+    def _load_sample(self, idx, image_buffer=None):
+        """Loads and transforms a sample, decoding its image from an already-read file buffer if provided."""
         sample = self.samples[idx]
         image_path = sample[self.path_key]
-        image = cv.imread(image_path)
+        if image_buffer is None and self.image_files is not None:
+            image_buffer = self.image_files[idx]
+        image = _read_image(image_path, image_buffer, self._get_decode_size())
         if image is None:
             raise AssertionError("invalid image at '%s'" % image_path)
         sample = {
@@ -387,41 +1257,47 @@ class ImageFolderDataset(ClassificationDataset):
 
     This specialization is used to parse simple image subfolders, and it essentially replaces the very
     basic ``torchvision.datasets.ImageFolder`` interface with similar functionalities. It it used to provide
-    a proper task interface as well as path metadata in each loaded packet for metrics/logging output.
+    a proper task interface as well as path metadata in each loaded packet for metrics/logging output. The
+    folder tree is indexed (and optionally cached) the same way as in :class:`thelper.data.parsers.ImageDataset`, and
+    its image files can also be read concurrently by ``io_threads`` threads, preloaded in their encoded form,
+    or decoded at a reduced resolution via ``decode_size``.
 
     .. seealso::
         | :class:`thelper.data.parsers.ImageDataset`
         | :class:`thelper.data.parsers.ClassificationDataset`
+        | :func:`thelper.data.utils.index_folder`
     """
 
-    def __init__(self, root, transforms=None, image_key="image", label_key="label", path_key="path", idx_key="idx"):
+    def __init__(self, root, transforms=None, image_key="image", label_key="label", path_key="path", idx_key="idx",
+                 index_cache=False, io_threads=0, preload=False, decode_size=None):
         """Image folder dataset parser constructor."""
+        assert isinstance(io_threads, int) and io_threads >= 0, "invalid i/o thread count (should be non-negative int)"
+        self.io_threads = io_threads
+        assert preload in [False, "encoded"], "unsupported preload mode (should be False or 'encoded')"
+        self.preload = preload
+        assert decode_size is None or decode_size == "auto" or isinstance(decode_size, int) or \
+            (isinstance(decode_size, (list, tuple)) and len(decode_size) == 2), "invalid decode size hint"
+        self.decode_size = (decode_size, decode_size) if isinstance(decode_size, int) else decode_size
         self.root = root
         if self.root is None or not os.path.isdir(self.root):
             raise AssertionError("invalid input data root '%s'" % self.root)
-        class_map = {}
-        for child in os.listdir(self.root):
-            if os.path.isdir(os.path.join(self.root, child)):
-                class_map[child] = []
+        folders, files = thelper.data.utils.index_folder(self.root, thelper.data.utils.image_folder_exts,
+                                                         cache_dir=_get_index_cache_dir(index_cache))
+        class_map = _get_folder_class_map(folders)
         if not class_map:
             raise AssertionError("could not find any image folders at '%s'" % self.root)
-        image_exts = [".jpg", ".jpeg", ".bmp", ".png", ".ppm", ".pgm", ".tif"]
         self.image_key = image_key
         self.path_key = path_key
         self.idx_key = idx_key
         self.label_key = label_key
-        samples = []
-        for class_name in class_map:
-            class_folder = os.path.join(self.root, class_name)
-            for folder, subfolder, files in os.walk(class_folder):
-                for file in files:
-                    ext = os.path.splitext(file)[1].lower()
-                    if ext in image_exts:
-                        class_map[class_name].append(len(samples))
-                        samples.append({
-                            self.path_key: os.path.join(folder, file),
-                            self.label_key: class_name
-                        })
+        paths, labels = [], []
+        for folder, folder_files in zip(folders[1:], files[1:]):  # first folder is the root itself
+            class_name = folder.split(os.sep, 1)[0]
+            folder = os.path.join(self.root, folder)
+            class_map[class_name].extend(range(len(paths), len(paths) + len(folder_files)))
+            paths.extend(os.path.join(folder, file) for file in folder_files)
+            labels.extend([class_name] * len(folder_files))
+        samples = ColumnarSamples(columns={self.path_key: paths, self.label_key: labels})
         old_unsorted_class_names = list(class_map.keys())
         class_map = {k: class_map[k] for k in sorted(class_map.keys()) if len(class_map[k]) > 0}
         if old_unsorted_class_names != list(class_map.keys()):
@@ -435,18 +1311,40 @@ class ImageFolderDataset(ClassificationDataset):
         super(ImageFolderDataset, self).__init__(class_names=list(class_map.keys()), input_key=self.image_key,
                                                  label_key=self.label_key, meta_keys=meta_keys, transforms=transforms)
         self.samples = samples
+        self.image_files = _get_packed_files(self.samples, self.path_key, self.preload, self.io_threads)
+        self._image_sizes = None  # read lazily from the file headers, see ``get_sample_sizes``
 
     def __getitem__(self, idx):
         """Returns the data sample (a dictionary) for a specific (0-based) index."""
         if isinstance(idx, slice):
             return self._getitems(idx)
-        if idx >= len(self.samples):
-            raise AssertionError("sample index is out-of-range")
-        if idx < 0:
-            idx = len(self.samples) + idx
+        return self._load_sample(_get_sample_idx(idx, len(self.samples)))
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of indices, reading their files concurrently if possible."""
+        if not self.io_threads or self.image_files is not None:
+            return super().get_batch(idxs)
+        idxs = [_get_sample_idx(idx, len(self.samples)) for idx in idxs]
+        buffers = thelper.data.utils.read_files([self.samples[idx][self.path_key] for idx in idxs], self.io_threads)
+        return [self._load_sample(idx, buffer) for idx, buffer in zip(idxs, buffers)]
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) size of all images, read once from their file headers (without decoding)."""
+        return _get_image_sizes(self)
+
+    def _get_decode_size(self):
+        """Returns the minimum (width, height) size at which images can be decoded (or ``None`` if unknown)."""
+        if self.decode_size == "auto":
+            return thelper.transforms.get_output_size_hint(self.transforms, self.image_key)
+        return self.decode_size
+
+    def _load_sample(self, idx, image_buffer=None):
+        """Loads and transforms a sample, decoding its image from an already-read file buffer if provided."""
         sample = self.samples[idx]
         image_path = sample[self.path_key]
-        image = cv.imread(image_path)
+        if image_buffer is None and self.image_files is not None:
+            image_buffer = self.image_files[idx]
+        image = _read_image(image_path, image_buffer, self._get_decode_size())
         if image is None:
             raise AssertionError("invalid image at '%s'" % image_path)
         sample = {
@@ -465,11 +1363,18 @@ class SuperResFolderDataset(Dataset):
     This specialization is used to parse simple image subfolders, and it essentially replaces the very
     basic ``torchvision.datasets.ImageFolder`` interface with similar functionalities. It it used to provide
     a proper task interface as well as path/class metadata in each loaded packet for metrics/logging output.
+    Its image files can also be read concurrently by ``io_threads`` threads or preloaded in their encoded form
+    (see :class:`thelper.data.parsers.ImageDataset`).
     """
 
     def __init__(self, root, downscale_factor=2.0, rescale_lowres=True, center_crop=None, transforms=None,
-                 lowres_image_key="lowres_image", highres_image_key="highres_image", path_key="path", idx_key="idx", label_key="label"):
+                 lowres_image_key="lowres_image", highres_image_key="highres_image", path_key="path", idx_key="idx", label_key="label",
+                 index_cache=False, io_threads=0, preload=False):
         """Image folder dataset parser constructor."""
+        assert isinstance(io_threads, int) and io_threads >= 0, "invalid i/o thread count (should be non-negative int)"
+        self.io_threads = io_threads
+        assert preload in [False, "encoded"], "unsupported preload mode (should be False or 'encoded')"
+        self.preload = preload
         if isinstance(downscale_factor, int):
             downscale_factor = float(downscale_factor)
         if not isinstance(downscale_factor, float) or downscale_factor <= 1.0:
@@ -485,30 +1390,24 @@ class SuperResFolderDataset(Dataset):
         self.root = root
         if self.root is None or not os.path.isdir(self.root):
             raise AssertionError("invalid input data root '%s'" % self.root)
-        class_map = {}
-        for child in os.listdir(self.root):
-            if os.path.isdir(os.path.join(self.root, child)):
-                class_map[child] = []
+        folders, files = thelper.data.utils.index_folder(self.root, thelper.data.utils.image_folder_exts,
+                                                         cache_dir=_get_index_cache_dir(index_cache))
+        class_map = _get_folder_class_map(folders)
         if not class_map:
             raise AssertionError("could not find any image folders at '%s'" % self.root)
-        image_exts = [".jpg", ".jpeg", ".bmp", ".png", ".ppm", ".pgm", ".tif"]
         self.lowres_image_key = lowres_image_key
         self.highres_image_key = highres_image_key
         self.path_key = path_key
         self.idx_key = idx_key
         self.label_key = label_key  # to provide folder names
-        samples = []
-        for class_name in class_map:
-            class_folder = os.path.join(self.root, class_name)
-            for folder, subfolder, files in os.walk(class_folder):
-                for file in files:
-                    ext = os.path.splitext(file)[1].lower()
-                    if ext in image_exts:
-                        class_map[class_name].append(len(samples))
-                        samples.append({
-                            self.path_key: os.path.join(folder, file),
-                            self.label_key: class_name
-                        })
+        paths, labels = [], []
+        for folder, folder_files in zip(folders[1:], files[1:]):  # first folder is the root itself
+            class_name = folder.split(os.sep, 1)[0]
+            folder = os.path.join(self.root, folder)
+            class_map[class_name].extend(range(len(paths), len(paths) + len(folder_files)))
+            paths.extend(os.path.join(folder, file) for file in folder_files)
+            labels.extend([class_name] * len(folder_files))
+        samples = ColumnarSamples(columns={self.path_key: paths, self.label_key: labels})
         class_map = {k: v for k, v in class_map.items() if len(v) > 0}
         if not class_map:
             raise AssertionError("could not locate any subdir in '%s' with images to load" % self.root)
@@ -516,18 +1415,36 @@ class SuperResFolderDataset(Dataset):
         super(SuperResFolderDataset, self).__init__(transforms=transforms)
         self.task = thelper.tasks.SuperResolution(input_key=self.lowres_image_key, target_key=self.highres_image_key, meta_keys=meta_keys)
         self.samples = samples
+        self.image_files = _get_packed_files(self.samples, self.path_key, self.preload, self.io_threads)
+        self._image_sizes = None  # read lazily from the file headers, see ``get_sample_sizes``
 
     def __getitem__(self, idx):
         """Returns the data sample (a dictionary) for a specific (0-based) index."""
         if isinstance(idx, slice):
             return self._getitems(idx)
-        if idx >= len(self.samples):
-            raise AssertionError("sample index is out-of-range")
-        if idx < 0:
-            idx = len(self.samples) + idx
+        return self._load_sample(_get_sample_idx(idx, len(self.samples)))
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of indices, reading their files concurrently if possible."""
+        if not self.io_threads or self.image_files is not None:
+            return super().get_batch(idxs)
+        idxs = [_get_sample_idx(idx, len(self.samples)) for idx in idxs]
+        buffers = thelper.data.utils.read_files([self.samples[idx][self.path_key] for idx in idxs], self.io_threads)
+        return [self._load_sample(idx, buffer) for idx, buffer in zip(idxs, buffers)]
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) size of all high-resolution images (after center cropping, if any)."""
+        if self.center_crop is not None:
+            return np.tile(np.asarray(self.center_crop, dtype=np.int64), (len(self.samples), 1))
+        return _get_image_sizes(self)
+
+    def _load_sample(self, idx, image_buffer=None):
+        """Loads and transforms a sample, decoding its image from an already-read file buffer if provided."""
         sample = self.samples[idx]
         image_path = sample[self.path_key]
-        image = cv.imread(image_path)
+        if image_buffer is None and self.image_files is not None:
+            image_buffer = self.image_files[idx]
+        image = cv.imread(image_path) if image_buffer is None else thelper.data.utils.decode_image(image_buffer)
         if image is None:
             raise AssertionError("invalid image at '%s'" % image_path)
         if self.center_crop is not None:
@@ -604,6 +1521,40 @@ class ExternalDataset(Dataset):
         """Returns a pretty-print version of the external class's name."""
         return self.dataset_type.__module__ + "." + self.dataset_type.__qualname__
 
+    def get_labels(self):
+        """Returns the groundtruth (label) values of all samples without loading them, if supported.
+
+        The labels are obtained from the ``get_labels`` method of the external dataset object if it has one,
+        or from its ``samples`` attribute if it holds a list of sample dictionaries. Otherwise, ``None`` is
+        returned, and the samples will have to be fully loaded to obtain their labels.
+        """
+        if hasattr(self.samples, "get_labels"):
+            return self.samples.get_labels()
+        if self.task is None or self.task.gt_key is None:
+            return None
+        samples = getattr(self.samples, "samples", None)
+        if samples is None or isinstance(samples, Dataset) or len(samples) != len(self):
+            return None
+        return _get_sample_labels(samples, self.task.gt_key)
+
+    def get_label_array(self, task=None):
+        """Returns the class indices of all samples as an array without loading them, if supported.
+
+        The class indices are obtained from the ``get_label_array`` method of the external dataset object if it
+        has one (the returned indices must then correspond to the task's class names), and from the label values
+        returned by :meth:`get_labels` otherwise.
+        """
+        task = self.task if task is None else task
+        if not isinstance(task, thelper.tasks.Classification):
+            return None
+        if isinstance(self.samples, Dataset):
+            return self.samples.get_label_array(task)
+        if hasattr(self.samples, "get_label_array"):
+            labels = self.samples.get_label_array()
+            if labels is not None:
+                return task.get_class_index_array(np.asarray(labels, dtype=np.int64))
+        return super(ExternalDataset, self).get_label_array(task)
+
     def __getitem__(self, idx):
         """Returns the data sample (a dictionary) for a specific (0-based) index."""
         if isinstance(idx, slice):
@@ -633,3 +1584,288 @@ class ExternalDataset(Dataset):
         if self.transforms:
             sample = self.transforms(sample)
         return sample
+
+
+class SharedSampleCache:
+    """Size-bounded pool of serialized samples held in shared memory and visible to all loader workers.
+
+    The pool is allocated once as a single shared memory segment that is split into fixed-size blocks. Each
+    cached sample is pickled and stored in a chain of these blocks, so that samples of different sizes do not
+    fragment the pool. A table indexed by sample index holds the first block, the byte count, and the last
+    access time of each entry; when blocks run out, the least recently used entries are evicted. The segment
+    is attached by name when the cache is pickled, so data loader workers (forked or spawned) all share the
+    same entries, and copies of the cache are the cache itself. All accesses are serialized by a lock. Shared
+    memory segments are only supported with Python 3.8 and above.
+
+    Note that on Linux, the shared memory segment is allocated in ``/dev/shm``, which might be limited in size
+    (e.g. in docker containers); its pages are only committed once they are written to.
+
+    Attributes:
+        key: identifier of the data held in the cache (e.g. the hash of a dataset configuration), only used
+            to identify the cache in logs; each cache allocates its own (uniquely-named) shared memory segment.
+        length: number of samples (indices) that may be cached.
+        block_count: number of blocks in the pool.
+        block_size: size of each block of the pool, in bytes.
+
+    .. seealso::
+        | :class:`thelper.data.parsers.CachedDataset`
+    """
+
+    def __init__(self, cache_size, length, block_size=64 * 1024, key=None):
+        """Allocates the shared memory pool of the cache.
+
+        Args:
+            cache_size: maximum size of the cached data, in bytes.
+            length: number of samples (indices) that may be cached.
+            block_size: size of the blocks the pool is split into, in bytes.
+            key: identifier of the data held in the cache (only used for logging).
+        """
+        assert isinstance(cache_size, (int, float)) and cache_size > 0, "invalid cache size (should be positive byte count)"
+        assert isinstance(length, int) and length > 0, "invalid cache length (should be positive sample count)"
+        assert isinstance(block_size, int) and block_size > 0, "invalid cache block size (should be positive byte count)"
+        self.key = key
+        self.length = length
+        self.block_count = max(int(cache_size) // block_size, 1)
+        self.block_size = block_size
+        table_size = (3 + self.block_count + 3 * length) * np.dtype(np.int64).itemsize
+        assert sys.version_info >= (3, 8), "shared sample caches require python 3.8 or above"
+        from multiprocessing.shared_memory import SharedMemory  # not available in python 3.6/3.7
+        self._shm = SharedMemory(create=True, size=table_size + self.block_count * block_size)
+        self._owner_pid = os.getpid()
+        self._lock = multiprocessing.Lock()
+        self._views = None
+        header, next_block, entries, _ = self._get_views()
+        header[:] = (0, self.block_count, 0)  # free list head, free block count, access clock
+        next_block[:] = np.arange(1, self.block_count + 1)
+        next_block[-1] = -1
+        entries[0], entries[1], entries[2] = -1, 0, 0  # first block, byte count, last access time
+
+    def _get_views(self):
+        """Returns the (header, block chain table, entry table, block pool) arrays mapped onto the segment."""
+        if self._views is None:
+            offset, buffer = 0, self._shm.buf
+            header = np.ndarray((3,), dtype=np.int64, buffer=buffer, offset=offset)
+            offset += header.nbytes
+            next_block = np.ndarray((self.block_count,), dtype=np.int64, buffer=buffer, offset=offset)
+            offset += next_block.nbytes
+            entries = np.ndarray((3, self.length), dtype=np.int64, buffer=buffer, offset=offset)
+            offset += entries.nbytes
+            blocks = np.ndarray((self.block_count, self.block_size), dtype=np.uint8, buffer=buffer, offset=offset)
+            self._views = (header, next_block, entries, blocks)
+        return self._views
+
+    @staticmethod
+    def _get_chain(next_block, block):
+        """Returns the list of blocks chained from a given first block."""
+        chain = []
+        while block >= 0:
+            chain.append(block)
+            block = next_block[block]
+        return chain
+
+    def _evict(self, target_count):
+        """Evicts the least recently used entries until the given number of blocks is free (lock must be held)."""
+        header, next_block, entries, _ = self._views
+        cached_idxs = np.flatnonzero(entries[0] >= 0)
+        for idx in cached_idxs[np.argsort(entries[2, cached_idxs], kind="stable")]:
+            if header[1] >= target_count:
+                break
+            chain = self._get_chain(next_block, entries[0, idx])
+            next_block[chain[-1]] = header[0]
+            header[0] = chain[0]
+            header[1] += len(chain)
+            entries[:, idx] = (-1, 0, 0)
+
+    def get(self, idx):
+        """Returns a copy of the sample cached at the given index, or ``None`` if it is not cached."""
+        header, next_block, entries, blocks = self._get_views()
+        with self._lock:
+            if entries[0, idx] < 0:
+                return None
+            header[2] += 1
+            entries[2, idx] = header[2]
+            chain = self._get_chain(next_block, entries[0, idx])
+            data = blocks[chain].reshape(-1)[:entries[1, idx]]
+        return pickle.loads(data)
+
+    def put(self, idx, sample):
+        """Stores a sample at the given index, evicting the least recently used ones if needed.
+
+        Returns whether the sample is cached; it will not be if it is larger than the whole pool.
+        """
+        data = np.frombuffer(pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+        block_count = -(-len(data) // self.block_size)
+        if block_count > self.block_count:
+            return False
+        header, next_block, entries, blocks = self._get_views()
+        with self._lock:
+            if entries[0, idx] >= 0:
+                return True  # already cached by another worker
+            if header[1] < block_count:
+                # free a bit more than needed so that the (linear) lookup of old entries is not done every time
+                self._evict(min(block_count + self.block_count // 32, self.block_count))
+            chain, block = [], header[0]
+            for _ in range(block_count):
+                chain.append(block)
+                block = next_block[block]
+            header[0] = block
+            header[1] -= block_count
+            next_block[chain[-1]] = -1
+            full_size = (block_count - 1) * self.block_size
+            blocks[chain[:-1]] = data[:full_size].reshape(block_count - 1, self.block_size)
+            blocks[chain[-1], :len(data) - full_size] = data[full_size:]
+            header[2] += 1
+            entries[:, idx] = (chain[0], len(data), header[2])
+        return True
+
+    def __len__(self):
+        """Returns the number of samples currently held in the cache."""
+        return int(np.count_nonzero(self._get_views()[2][0] >= 0))
+
+    def __copy__(self):
+        """Returns the cache itself, as it is a shared resource."""
+        return self
+
+    def __deepcopy__(self, memo):
+        """Returns the cache itself, as it is a shared resource."""
+        return self
+
+    def __getstate__(self):
+        """Returns the picklable state of this cache (the segment is reattached by name on unpickling)."""
+        state = self.__dict__.copy()
+        state["_owner_pid"] = None  # only the original cache may destroy the shared memory segment
+        state["_views"] = None
+        return state
+
+    def close(self):
+        """Detaches the shared memory segment, and destroys it if it was created in this process."""
+        if self._shm is not None:
+            self._views = None
+            self._shm.close()
+            if self._owner_pid == os.getpid():
+                self._shm.unlink()
+            self._shm = None
+
+    def __del__(self):
+        """Releases the shared memory segment on destruction."""
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        """Returns a print-friendly representation of this cache."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(cache_size={self.block_count * self.block_size}, length={self.length}, " + \
+            f"block_size={self.block_size}, key={repr(self.key)})"
+
+
+class CachedDataset(Dataset):
+    """Dataset parser wrapper that caches the decoded samples of another parser in shared memory.
+
+    The wrapped parser's samples are stored in a :class:`thelper.data.parsers.SharedSampleCache` before being
+    transformed, so that they are only loaded and decoded once per run, and then shared by all data loader
+    workers across epochs. To do so, the wrapper takes over the transforms of the wrapped parser, and applies
+    them after fetching samples from the cache; stochastic augmentations therefore still differ every time.
+    The wrapped parser must return the same (pre-transform) sample every time a given index is loaded.
+
+    Entries are keyed by sample index in a cache that belongs to this wrapper only, so different parsers never
+    share (or overwrite) each other's entries; the dataset hash is only used to identify the cache. When it is
+    full, the least recently used samples are evicted. Uncached samples are fetched from the wrapped parser
+    with :meth:`thelper.data.parsers.Dataset.get_batch`, so batched/threaded reads are still used on misses.
+
+    This wrapper is created automatically by :func:`thelper.data.utils.create_parsers` for datasets that have
+    a ``cache`` field in their configuration, which should hold either the cache size (in bytes) or a dict of
+    constructor arguments. For example::
+
+        "datasets": {
+            "dataset_A": {
+                "type": "thelper.data.ImageFolderDataset",
+                "params": {
+                    # ...
+                },
+                "cache": {
+                    "cache_size": 8e9,  # up to 8 GB of decoded samples will be kept in shared memory
+                    "block_size": 262144  # optional, size of the blocks of the pool (default=64KB)
+                }
+            },
+            # ...
+        },
+
+    Attributes:
+        dataset: the wrapped dataset parser (whose transforms have been removed).
+        cache: the shared sample cache.
+
+    .. seealso::
+        | :class:`thelper.data.parsers.Dataset`
+        | :class:`thelper.data.parsers.SharedSampleCache`
+    """
+
+    def __init__(self, dataset, cache_size, block_size=64 * 1024, dataset_hash=None, transforms=None):
+        """Cached dataset parser wrapper constructor.
+
+        Args:
+            dataset: the dataset parser to wrap; its transforms will be moved to this wrapper.
+            cache_size: maximum size of the cached data, in bytes.
+            block_size: size of the blocks the shared memory pool is split into, in bytes.
+            dataset_hash: hash that identifies the wrapped dataset in logs; if ``None``, it is derived from its
+                representation and length.
+            transforms: function or object that should be applied to all samples fetched from the cache; if
+                ``None``, the transforms of the wrapped dataset will be used.
+        """
+        assert isinstance(dataset, Dataset), "cached dataset must be derived from thelper.data.parsers.Dataset"
+        assert len(dataset) > 0, "cached dataset should not be empty"
+        if transforms is None:
+            transforms = dataset.transforms
+        super(CachedDataset, self).__init__(transforms=transforms, deepcopy=dataset.deepcopy)
+        dataset.transforms = None  # the wrapped parser must now return pre-transform samples
+        self.dataset = dataset
+        self.samples = dataset.samples
+        self.task = dataset.task
+        if dataset_hash is None:
+            dataset_hash = thelper.utils.get_params_hash(repr(dataset), len(dataset))
+        self.cache = SharedSampleCache(cache_size, len(dataset), block_size=block_size, key=dataset_hash)
+
+    def __len__(self):
+        """Returns the total number of samples available from the wrapped dataset."""
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        """Returns the data sample (a dictionary) for a specific (0-based) index."""
+        if isinstance(idx, slice):
+            return self._getitems(idx)
+        return self.get_batch([idx])[0]
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of indices, loading only those that are not cached."""
+        idxs = [_get_sample_idx(idx, len(self)) for idx in idxs]
+        samples = [self.cache.get(idx) for idx in idxs]
+        missing = [pos for pos, sample in enumerate(samples) if sample is None]
+        if missing:
+            for pos, sample in zip(missing, self.dataset.get_batch([idxs[pos] for pos in missing])):
+                self.cache.put(idxs[pos], sample)
+                samples[pos] = sample
+        if self.transforms:
+            samples = [self.transforms(sample) for sample in samples]
+        return samples
+
+    def get_labels(self):
+        """Returns the groundtruth (label) values of all samples of the wrapped dataset without loading them."""
+        return self.dataset.get_labels()
+
+    def get_label_array(self, task=None):
+        """Returns the class indices of all samples of the wrapped dataset as an array without loading them."""
+        return self.dataset.get_label_array(task)
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) size of all samples of the wrapped dataset without loading them."""
+        return self.dataset.get_sample_sizes()
+
+    def close(self):
+        """Releases the shared memory cache (if it was created in this process)."""
+        self.cache.close()
+
+    def __repr__(self):
+        """Returns a print-friendly representation of this dataset."""
+        return self._get_derived_name() + f"(dataset={repr(self.dataset)}, cache={repr(self.cache)}, " + \
+            f"transforms={repr(self.transforms)})"
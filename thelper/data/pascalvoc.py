@@ -27,6 +27,13 @@ class PASCALVOC(Dataset):
     detection. The task object it exposes will be changed accordingly. In all cases, the 2012 version
     of the dataset will be used.
 
+    If ``preload`` is ``True``, all images (and segmentation groundtruth maps) are decoded on construction and
+    kept in memory. If it is ``"encoded"``, their files are instead read once and kept in their compressed form
+    (see :class:`thelper.data.parsers.PackedFiles`), and decoded on access; this uses much less memory, and
+    still avoids all disk i/o during training. If the samples are not preloaded and ``io_threads`` is strictly
+    positive, the image (and segmentation groundtruth) files of each minibatch are read concurrently by that
+    many threads in each loader worker via :func:`thelper.data.utils.read_files`, and decoded from memory.
+
     TODO: Add support for semantic instance segmentation.
 
     .. seealso::
@@ -70,7 +77,8 @@ class PASCALVOC(Dataset):
 
     def __init__(self, root, task="segm", subset="trainval", target_labels=None, download=False, preload=True, use_difficult=False,
                  use_occluded=True, use_truncated=True, transforms=None, image_key="image", sample_name_key="name", idx_key="idx",
-                 image_path_key="image_path", gt_path_key="gt_path", bboxes_key="bboxes", label_map_key="label_map"):
+                 image_path_key="image_path", gt_path_key="gt_path", bboxes_key="bboxes", label_map_key="label_map",
+                 io_threads=0):
         self.task_name = task
         assert self.task_name in self._supported_tasks, f"unrecognized task type '{self.task_name}'"
         assert subset in self._supported_subsets, f"unrecognized data subset '{subset}'"
@@ -96,7 +104,10 @@ class PASCALVOC(Dataset):
         imagesets_path = os.path.join(dataset_path, "ImageSets")
         assert os.path.isdir(dataset_path), f"could not locate image sets folder at '{imagesets_path}'"
         super().__init__(transforms=transforms)
+        assert preload in [True, False, "encoded"], "unsupported preload mode (should be True, False, or 'encoded')"
         self.preload = preload
+        assert isinstance(io_threads, int) and io_threads >= 0, "invalid i/o thread count (should be non-negative int)"
+        self.io_threads = io_threads
         # should use_difficult be true for training, but false for validation?
         self.image_key = image_key
         self.idx_key = idx_key
@@ -166,6 +177,7 @@ class PASCALVOC(Dataset):
         action = "preloading" if self.preload else "initializing"
         logger.info("%s pascal voc dataset for task='%s' and set='%s'..." % (action, self.task_name, subset))
         self.samples = []
+        image_sizes, images, gts = [], [], []
         if self.preload:
             from tqdm import tqdm
         else:
@@ -186,14 +198,14 @@ class PASCALVOC(Dataset):
             image_path = os.path.join(image_folder_path, filename)
             assert os.path.isfile(image_path), "cannot locate image for sample '%s'" % sample_name
             image = None
-            if self.preload:
+            if self.preload is True:
                 image = cv.imread(image_path)
                 assert image is not None, "could not load image '%s' via opencv" % image_path
             gt, gt_path = None, None
             if self.task_name == "segm" and subset != "test":
                 assert int(annotation.find("segmented").text) == 1, "unexpected segmented flag for sample '%s'" % sample_name
                 gt_path = os.path.join(dataset_path, "SegmentationClass", sample_name + ".png")
-                if self.preload:
+                if self.preload is True:
                     gt = cv.imread(gt_path)
                     assert gt is not None and gt.shape != image.shape, "unexpected gt shape for sample '%s'" % sample_name
                     gt = self.encode_label_map(gt)
@@ -223,13 +235,26 @@ class PASCALVOC(Dataset):
                                                        confidence=None, image_id=image_id, task=self.task))
                 if not gt:
                     continue
+            image_size = annotation.find("size") if annotation is not None else None
+            image_sizes.append((int(image_size.find("width").text), int(image_size.find("height").text))
+                               if image_size is not None else (-1, -1))
             self.samples.append({
                 self.sample_name_key: sample_name,
                 self.image_path_key: image_path,
                 self.gt_path_key: gt_path,
-                self.image_key: image,
-                self.gt_key: gt,
             })
+            images.append(image)
+            gts.append(gt)
+        # only the lightweight metadata is packed; preloaded arrays and bbox lists would be pickled on every access
+        self.samples = thelper.data.ColumnarSamples(self.samples)
+        self.images = images if self.preload is True else None
+        self.gts = gts if self.preload is True or self.task_name == "detect" else None
+        self.image_sizes = np.asarray(image_sizes, dtype=np.int64).reshape(-1, 2)  # from annotations, -1 = unknown
+        self.image_files, self.gt_files = None, None
+        if self.preload == "encoded":
+            self.image_files = thelper.data.PackedFiles(self.samples.column(self.image_path_key), io_threads=self.io_threads)
+            if self.task_name == "segm":
+                self.gt_files = thelper.data.PackedFiles(self.samples.column(self.gt_path_key), io_threads=self.io_threads)
         logger.info("initialized %d samples" % len(self.samples))
 
     def __getitem__(self, idx):
@@ -239,23 +264,60 @@ class PASCALVOC(Dataset):
         assert idx < len(self.samples), "sample index is out-of-range"
         if idx < 0:
             idx = len(self.samples) + idx
+        return self._load_sample(idx)
+
+    def get_batch(self, idxs):
+        """Returns a list of data samples for a list of indices, reading their files concurrently if possible."""
+        if self.preload or not self.io_threads:
+            return super().get_batch(idxs)
+        assert all([idx < len(self.samples) for idx in idxs]), "sample index is out-of-range"
+        idxs = [idx if idx >= 0 else len(self.samples) + idx for idx in idxs]
+        samples = [self.samples[idx] for idx in idxs]
+        paths = [sample[self.image_path_key] for sample in samples]
+        gt_paths = [thelper.utils.get_key_def(self.gt_path_key, sample) if self.task_name == "segm" else None
+                    for sample in samples]
+        buffers = thelper.data.utils.read_files(paths + [path for path in gt_paths if path], self.io_threads)
+        image_buffers = [next(buffers) for _ in paths]
+        gt_buffers = [next(buffers) if path else None for path in gt_paths]
+        return [self._load_sample(idx, image_buffer, gt_buffer)
+                for idx, image_buffer, gt_buffer in zip(idxs, image_buffers, gt_buffers)]
+
+    def get_labels(self):
+        """Returns the groundtruth of all samples (bbox lists, or preloaded label maps), or ``None`` if not loaded."""
+        return list(self.gts) if self.gts is not None else None
+
+    def get_sample_sizes(self):
+        """Returns the (width, height) size of all images, parsed from the annotations or from the file headers."""
+        missing_idxs = np.flatnonzero(self.image_sizes[:, 0] < 0)
+        if len(missing_idxs) > 0:  # test set images have no annotation; read their headers once
+            images = [self.image_files[idx] if self.image_files is not None else self.samples[idx][self.image_path_key]
+                      for idx in missing_idxs.tolist()]
+            self.image_sizes[missing_idxs] = thelper.data.utils.read_image_sizes(images, self.io_threads)
+        return self.image_sizes
+
+    def _load_sample(self, idx, image_buffer=None, gt_buffer=None):
+        """Loads and transforms a sample, decoding its files from already-read buffers if provided."""
         sample = self.samples[idx]
-        if not self.preload:
-            image = cv.imread(sample[self.image_path_key])
+        if self.preload == "encoded":
+            image_buffer = self.image_files[idx]
+            gt_buffer = self.gt_files[idx] if self.gt_files is not None else None
+        if self.preload is not True:
+            image = cv.imread(sample[self.image_path_key]) if image_buffer is None \
+                else thelper.data.utils.decode_image(image_buffer)
             assert image is not None, "could not load image '%s' via opencv" % sample[self.image_path_key]
             image = image[..., ::-1]  # BGR to RGB
             gt = None
             if self.task_name == "segm":
                 if self.gt_path_key in sample and sample[self.gt_path_key]:
-                    gt = cv.imread(sample[self.gt_path_key])
+                    gt = cv.imread(sample[self.gt_path_key]) if gt_buffer is None \
+                        else thelper.data.utils.decode_image(gt_buffer)
                     assert gt is not None and gt.shape == image.shape, \
                         f"unexpected gt shape for sample '{sample[self.sample_name_key]}'"
                     gt = self.encode_label_map(gt)
             elif self.task_name == "detect":
-                gt = thelper.utils.get_key_def(self.gt_key, sample)
+                gt = self.gts[idx]
         else:
-            image = sample[self.image_key]
-            gt = thelper.utils.get_key_def(self.gt_key, sample)
+            image, gt = self.images[idx], self.gts[idx]
         sample = {
             self.sample_name_key: sample[self.sample_name_key],
             self.image_path_key: sample[self.image_path_key],
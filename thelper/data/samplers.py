@@ -7,11 +7,11 @@ All samplers here should aim to be compatible with PyTorch's sampling interface
 through a configuration file and used as the input of a data loader.
 """
 import collections
-import copy
 import logging
 
 import numpy as np
 import torch
+import torch.distributed
 import torch.utils.data.sampler
 
 import thelper.data.utils
@@ -19,6 +19,101 @@ import thelper.data.utils
 logger = logging.getLogger(__name__)
 
 
+def _get_generator(seeds, epoch):
+    """Returns the numpy random generator to use for sampling indices in a given epoch.
+
+    If a 'torch' seed is specified, the generator is seeded deterministically with it (offset by the epoch
+    number). Otherwise, its seed is drawn from PyTorch's global RNG, meaning it still follows ``torch.manual_seed``.
+    """
+    if "torch" in seeds:
+        return np.random.default_rng(seeds["torch"] + epoch)
+    return np.random.default_rng(int(torch.randint(2 ** 31 - 1, (1,)).item()))
+
+
+def _get_label_groups(indices, labels):
+    """Splits an array of indices into groups (arrays) based on their labels, in first-appearance order."""
+    if len(labels) == 0:
+        return {}
+    if isinstance(labels, np.ndarray) and labels.ndim == 1 and labels.dtype.kind in "biuU":
+        label_codes = labels
+    else:
+        label_map = {}
+        label_codes = np.fromiter((label_map.setdefault(label, len(label_map)) for label in labels),
+                                  dtype=np.int64, count=len(labels))
+    order = np.argsort(label_codes, kind="stable")
+    sorted_codes = label_codes[order]
+    bounds = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+    groups = np.split(indices[order], bounds)
+    first_idxs = order[np.concatenate([[0], bounds])]  # the sort is stable, so these are the first appearances
+    return {labels[first_idx]: groups[group_idx]
+            for group_idx, first_idx in zip(np.argsort(first_idxs).tolist(), np.sort(first_idxs).tolist())}
+
+
+def _pick_from_group(rng, group, count):
+    """Randomly picks a number of elements from a group without replacement, repeating the group if needed.
+
+    The returned array contains as many full permutations of the group as required, followed by a random
+    subset of it for the remainder (this is equivalent to concatenating successive random permutations).
+    """
+    nb_rounds, remainder = divmod(count, len(group))
+    picks = [group[rng.permutation(len(group))] for _ in range(nb_rounds)]
+    if remainder > 0:
+        picks.append(rng.choice(group, remainder, replace=False))
+    return np.concatenate(picks) if picks else group[:0]
+
+
+def _get_distributed_info(num_replicas=None, rank=None):
+    """Returns the number of replicas (world size) and the rank to use for sharding sample indices.
+
+    Missing values are fetched from the default process group if it is initialized; otherwise, they default to a
+    single replica with rank zero (i.e. the samplers will behave as their non-distributed counterparts).
+    """
+    if num_replicas is None or rank is None:
+        dist_ready = torch.distributed.is_available() and torch.distributed.is_initialized()
+        if num_replicas is None:
+            num_replicas = torch.distributed.get_world_size() if dist_ready else 1
+        if rank is None:
+            rank = torch.distributed.get_rank() if dist_ready else 0
+    assert isinstance(num_replicas, int) and num_replicas > 0, "invalid number of replicas (should be positive int)"
+    assert isinstance(rank, int) and 0 <= rank < num_replicas, "invalid rank (should be in [0, num_replicas))"
+    return num_replicas, rank
+
+
+def _get_distributed_seeds(seeds):
+    """Returns the seed pack to use in a distributed sampler, making sure that a 'torch' seed is defined.
+
+    All replicas must draw the same global list of indices before sharding it, so we cannot rely on the
+    (possibly rank-specific) global RNG state to seed the generator when no seed is provided.
+    """
+    assert seeds is None or isinstance(seeds, dict), "unexpected seed pack type"
+    seeds = {**seeds} if seeds is not None else {}
+    if "torch" not in seeds:
+        seeds["torch"] = 0
+    return seeds
+
+
+def _get_shard_size(nb_samples, num_replicas, drop_last):
+    """Returns the number of sample indices that will be assigned to each replica."""
+    if drop_last:
+        return nb_samples // num_replicas
+    return -(-nb_samples // num_replicas)
+
+
+def _get_shard(indices, num_replicas, rank, drop_last):
+    """Returns the subset of an array of sample indices assigned to a given replica.
+
+    The array is either truncated (if ``drop_last`` is true) or padded by wrapping around its start so that
+    its size is a multiple of the number of replicas, and indices are then dealt out in round-robin fashion.
+    """
+    shard_size = _get_shard_size(len(indices), num_replicas, drop_last)
+    if shard_size == 0:
+        return indices[:0]
+    total_size = shard_size * num_replicas
+    if total_size > len(indices):
+        indices = np.resize(indices, total_size)  # repeats the array from its start to fill the padding
+    return indices[rank:total_size:num_replicas]
+
+
 class WeightedSubsetRandomSampler(torch.utils.data.sampler.Sampler):
     r"""Provides a rebalanced list of sample indices to use in a data loader.
 
@@ -84,10 +179,9 @@ class WeightedSubsetRandomSampler(torch.utils.data.sampler.Sampler):
 
     Attributes:
         nb_samples: total number of samples to rebalance (i.e. scaled size of original dataset).
-        label_groups: map that splits all samples indices into groups based on labels.
+        label_groups: map that splits all samples indices into groups (arrays) based on labels.
         stype: name of the rebalancing strategy to use.
-        indices: copy of the original list of sample indices provided in the constructor.
-        sample_weights: list of weights used for random sampling.
+        indices: copy of the original list of sample indices provided in the constructor (as an array).
         label_counts: number of samples in each class for the ``uniform`` and ``root`` strategies.
         seeds: dictionary of seeds to use when initializing RNG state.
         epoch: epoch number used to reinitialize the RNG to an epoch-specific state.
@@ -129,19 +223,13 @@ class WeightedSubsetRandomSampler(torch.utils.data.sampler.Sampler):
         self.nb_samples = int(round(len(indices) * scale))
         if self.nb_samples > 0:
             self.stype = stype
-            self.indices = copy.deepcopy(indices)
-            self.label_groups = {}
-            for idx, label in enumerate(labels):
-                if label in self.label_groups:
-                    self.label_groups[label].append(indices[idx])
-                else:
-                    self.label_groups[label] = [indices[idx]]
+            self.indices = np.array(indices, dtype=np.int64)
+            self.label_groups = _get_label_groups(self.indices, labels)
             assert isinstance(stype, str) and (stype in ["uniform", "random"] or "root" in stype), \
                 "unexpected sampling type"
-            if stype == "random":
-                self.sample_weights = [1.0 / len(self.label_groups[label]) for label in labels]
-            else:
-                weights = thelper.data.utils.get_class_weights(self.label_groups, stype, invmax=False)
+            if stype != "random":
+                label_sizes = {label: len(group) for label, group in self.label_groups.items()}
+                weights = thelper.data.utils.get_class_weights(label_sizes, stype, invmax=False)
                 self.label_counts = {}
                 curr_nb_samples, max_sample_label = 0, None
                 for label_idx, (label, _) in enumerate(self.label_groups.items()):
@@ -164,33 +252,31 @@ class WeightedSubsetRandomSampler(torch.utils.data.sampler.Sampler):
         eliminated due to undersampling (or duplicated due to oversampling) might not receive the same
         treatment twice.
 
-        This function will reseed the RNGs it uses every time it is called, and revert their state before
-        returning its output.
+        All indices are picked at once using a numpy generator that is reseeded every time this function
+        is called (the global RNG states are left untouched).
         """
+        result = self._get_epoch_indices()
+        self.epoch += 1
+        return map(int, result)
+
+    def _get_epoch_indices(self):
+        """Returns the array of rebalanced sample indices for the current epoch (without incrementing it)."""
         if self.nb_samples == 0:
-            self.epoch += 1
-            return iter([])
-        rng_state = None
-        if "torch" in self.seeds:
-            rng_state = torch.random.get_rng_state()
-            torch.random.manual_seed(self.seeds["torch"] + self.epoch)
+            return np.empty((0,), dtype=np.int64)
+        rng = _get_generator(self.seeds, self.epoch)
         assert self.stype in ["random", "uniform"] or "root" in self.stype, "invalid stype"
         if self.stype == "random":
-            result = (self.indices[idx] for idx in torch.multinomial(
-                torch.FloatTensor(self.sample_weights), self.nb_samples, replacement=True))
+            # equivalent to picking samples with replacement using the inverse of their class size as weight
+            groups = list(self.label_groups.values())
+            group_sizes = np.asarray([len(group) for group in groups], dtype=np.int64)
+            group_offsets = np.cumsum(group_sizes) - group_sizes
+            group_picks = rng.integers(len(groups), size=self.nb_samples)
+            result = np.concatenate(groups)[group_offsets[group_picks] + rng.integers(group_sizes[group_picks])]
         else:  # if self.stype == "uniform" or "root" in self.stype:
-            indices = []
-            for label, count in self.label_counts.items():
-                while count > 0:
-                    subidxs = torch.randperm(len(self.label_groups[label]))
-                    for subidx in range(min(count, len(subidxs))):
-                        indices.append(self.label_groups[label][subidxs[subidx]])
-                    count -= len(subidxs)
+            indices = np.concatenate([_pick_from_group(rng, self.label_groups[label], count)
+                                      for label, count in self.label_counts.items()])
             assert len(indices) == self.nb_samples, "messed up something internally..."
-            result = (indices[i] for i in torch.randperm(len(indices)))
-        if rng_state is not None:
-            torch.random.set_rng_state(rng_state)
-        self.epoch += 1
+            result = rng.permutation(indices)
         return result
 
     def __len__(self):
@@ -222,7 +308,7 @@ class SubsetRandomSampler(torch.utils.data.sampler.Sampler):
             self.seeds = seeds
         assert isinstance(epoch, int) and epoch >= 0, "invalid epoch index value"
         self.epoch = epoch
-        self.indices = indices
+        self.indices = np.array(indices, dtype=np.int64)
         assert isinstance(scale, float) and scale >= 0, "invalid scale parameter; should be greater than zero"
         self.num_samples = int(round(len(self.indices) * scale))
 
@@ -232,23 +318,16 @@ class SubsetRandomSampler(torch.utils.data.sampler.Sampler):
         self.epoch = epoch
 
     def __iter__(self):
-        rng_state = None
-        if "torch" in self.seeds:
-            rng_state = torch.random.get_rng_state()
-            torch.random.manual_seed(self.seeds["torch"] + self.epoch)
-        indices = []
-        max_samples = len(self.indices)
-        req_count = self.num_samples
-        while req_count > 0:
-            subidxs = torch.randperm(max_samples)
-            for subidx in range(min(req_count, max_samples)):
-                indices.append(self.indices[subidxs[subidx]])
-            req_count -= max_samples
-        result = (indices[i] for i in torch.randperm(len(indices)))
-        if rng_state is not None:
-            torch.random.set_rng_state(rng_state)
+        result = self._get_epoch_indices()
         self.epoch += 1
-        return result
+        return map(int, result)
+
+    def _get_epoch_indices(self):
+        """Returns the array of shuffled sample indices for the current epoch (without incrementing it)."""
+        if self.num_samples == 0:
+            return np.empty((0,), dtype=np.int64)
+        rng = _get_generator(self.seeds, self.epoch)
+        return rng.permutation(_pick_from_group(rng, self.indices, self.num_samples))
 
     def __len__(self):
         return self.num_samples
@@ -346,12 +425,7 @@ class FixedWeightSubsetSampler(torch.utils.data.sampler.Sampler):
         assert isinstance(weights, (dict, collections.OrderedDict)), "invalid weights map type"
         assert all([weight >= 0 for weight in weights.values()]), "weights must all be non-negative"
         self.weights = weights
-        self.label_groups = {}
-        for idx, label in enumerate(labels):
-            if label in self.label_groups:
-                self.label_groups[label].append(indices[idx])
-            else:
-                self.label_groups[label] = [indices[idx]]
+        self.label_groups = _get_label_groups(np.array(indices, dtype=np.int64), labels)
         self.class_sample_counts = {label: int(round(self.weights[label] * len(self.label_groups[label])))
                                     for label in self.label_groups}
         self.nb_samples = sum(self.class_sample_counts.values())
@@ -368,28 +442,22 @@ class FixedWeightSubsetSampler(torch.utils.data.sampler.Sampler):
         eliminated due to undersampling (or duplicated due to oversampling) might not receive the same
         treatment twice.
 
-        This function will reseed the RNGs it uses every time it is called, and revert their state before
-        returning its output.
+        All indices are picked at once using a numpy generator that is reseeded every time this function
+        is called (the global RNG states are left untouched).
         """
+        result = self._get_epoch_indices()
+        self.epoch += 1
+        return map(int, result)
+
+    def _get_epoch_indices(self):
+        """Returns the array of rebalanced sample indices for the current epoch (without incrementing it)."""
         if self.nb_samples == 0:
-            self.epoch += 1
-            return iter([])
-        rng_state = None
-        if "torch" in self.seeds:
-            rng_state = torch.random.get_rng_state()
-            torch.random.manual_seed(self.seeds["torch"] + self.epoch)
-        result = []
-        for label, group in self.label_groups.items():
-            count_to_sample = self.class_sample_counts[label]
-            while count_to_sample > 0:
-                perm_size = min(count_to_sample, len(group))
-                result += [group[idx] for idx in torch.randperm(len(group))[0:perm_size].tolist()]
-                count_to_sample -= perm_size
+            return np.empty((0,), dtype=np.int64)
+        rng = _get_generator(self.seeds, self.epoch)
+        result = np.concatenate([_pick_from_group(rng, group, self.class_sample_counts[label])
+                                 for label, group in self.label_groups.items()])
         assert len(result) == self.nb_samples
-        if rng_state is not None:
-            torch.random.set_rng_state(rng_state)
-        self.epoch += 1
-        return iter(result)
+        return result
 
     def __len__(self):
         """Returns the number of sample indices that will be generated by this interface.
@@ -397,3 +465,292 @@ class FixedWeightSubsetSampler(torch.utils.data.sampler.Sampler):
         This number is the scaled size of the originally provided sample indices list.
         """
         return self.nb_samples
+
+
+class _DistributedSamplerMixin:
+    """Shards the indices generated by a subset sampler across the replicas of a distributed process group.
+
+    The sampler this is mixed into must implement ``_get_epoch_indices`` and ``__len__``; every replica draws
+    the same (epoch-seeded) global array of indices, and only keeps its own shard of it. Shards always have
+    the same size across replicas, which is required to keep collective operations in sync.
+    """
+
+    def _init_distributed(self, num_replicas, rank, drop_last):
+        self.num_replicas, self.rank = _get_distributed_info(num_replicas, rank)
+        self.drop_last = drop_last
+
+    def __iter__(self):
+        result = _get_shard(self._get_epoch_indices(), self.num_replicas, self.rank, self.drop_last)
+        self.epoch += 1
+        return map(int, result)
+
+    def __len__(self):
+        return _get_shard_size(super().__len__(), self.num_replicas, self.drop_last)
+
+
+class DistributedSubsetRandomSampler(_DistributedSamplerMixin, SubsetRandomSampler):
+    r"""Samples elements randomly from a given list of indices, and keeps only those of the current replica.
+
+    This specialization of :class:`thelper.data.samplers.SubsetRandomSampler` is meant for data-parallel training
+    over multiple processes. All replicas must use the same seeds (which is the case when they share a session
+    configuration); if no 'torch' seed is provided, a fixed default seed is used instead of the global RNG.
+
+    Example configuration file::
+
+        # ...
+        "loaders": {
+            # ...
+            "sampler": {
+                "type": "thelper.data.samplers.DistributedSubsetRandomSampler",
+                "params": {
+                    # if not specified, these are fetched from the default process group
+                    "num_replicas": 4,
+                    "rank": 0,
+                    # pad (false) or truncate (true) the indices to get identical shard sizes
+                    "drop_last": false
+                }
+            },
+            # ...
+        },
+        # ...
+
+    Arguments:
+        indices (list): a list of indices
+        seeds (dict): dictionary of seeds to use when initializing RNG state.
+        epoch (int): epoch number used to reinitialize the RNG to an epoch-specific state.
+        scale (float): scaling factor used to increase/decrease the final number of samples.
+        num_replicas (int): number of processes participating in the training (i.e. world size).
+        rank (int): rank of the current process among the replicas.
+        drop_last (bool): defines whether to drop the tail of the indices (or to pad them) to even out shards.
+
+    .. seealso::
+        | :class:`thelper.data.samplers.SubsetRandomSampler`
+    """
+
+    def __init__(self, indices, seeds=None, epoch=0, scale=1.0, num_replicas=None, rank=None, drop_last=False):
+        super().__init__(indices, seeds=_get_distributed_seeds(seeds), epoch=epoch, scale=scale)
+        self._init_distributed(num_replicas, rank, drop_last)
+
+
+class DistributedWeightedSubsetRandomSampler(_DistributedSamplerMixin, WeightedSubsetRandomSampler):
+    r"""Provides a rebalanced list of sample indices to use in a data loader, sharded across replicas.
+
+    This specialization of :class:`thelper.data.samplers.WeightedSubsetRandomSampler` is meant for data-parallel
+    training over multiple processes. The rebalancing is done on the global list of indices (identically on all
+    replicas), and each replica then keeps its own shard of it. It is configured like its parent class, with the
+    additional ``num_replicas``, ``rank``, and ``drop_last`` parameters of
+    :class:`thelper.data.samplers.DistributedSubsetRandomSampler`.
+
+    .. seealso::
+        | :class:`thelper.data.samplers.WeightedSubsetRandomSampler`
+        | :class:`thelper.data.samplers.DistributedSubsetRandomSampler`
+    """
+
+    def __init__(self, indices, labels, stype="uniform", scale=1.0, seeds=None, epoch=0,
+                 num_replicas=None, rank=None, drop_last=False):
+        super().__init__(indices, labels, stype=stype, scale=scale, seeds=_get_distributed_seeds(seeds), epoch=epoch)
+        self._init_distributed(num_replicas, rank, drop_last)
+
+
+class DistributedFixedWeightSubsetSampler(_DistributedSamplerMixin, FixedWeightSubsetSampler):
+    r"""Provides a list of sample indices rebalanced with fixed weights, sharded across replicas.
+
+    This specialization of :class:`thelper.data.samplers.FixedWeightSubsetSampler` is meant for data-parallel
+    training over multiple processes. The rebalancing is done on the global list of indices (identically on all
+    replicas), and each replica then keeps its own shard of it. It is configured like its parent class, with the
+    additional ``num_replicas``, ``rank``, and ``drop_last`` parameters of
+    :class:`thelper.data.samplers.DistributedSubsetRandomSampler`.
+
+    .. seealso::
+        | :class:`thelper.data.samplers.FixedWeightSubsetSampler`
+        | :class:`thelper.data.samplers.DistributedSubsetRandomSampler`
+    """
+
+    def __init__(self, indices, labels, weights, seeds=None, epoch=0, num_replicas=None, rank=None, drop_last=False):
+        super().__init__(indices, labels, weights, seeds=_get_distributed_seeds(seeds), epoch=epoch)
+        self._init_distributed(num_replicas, rank, drop_last)
+
+
+class BucketBatchSampler(torch.utils.data.sampler.Sampler):
+    r"""Groups sample indices into minibatches of images that have similar aspect ratios or sizes.
+
+    This is a batch sampler (i.e. it yields lists of indices) meant for datasets of images with widely varying
+    sizes, such as detection or super-resolution datasets. Samples are put into buckets based on the aspect
+    ratio (width / height) or on the size of their image, and minibatches are only formed within buckets. The
+    leftover samples of all buckets are then merged (in bucket order, so that neighbouring buckets are grouped
+    together) into the last few minibatches. Once collated with padding (see
+    :func:`thelper.data.loaders.padded_collate`), these minibatches contain much less padding than random ones.
+
+    The image sizes are provided by the loader factory when ``pass_sizes`` is set in the sampler configuration;
+    they are fetched from the dataset parsers via the size-only access protocol (see
+    :meth:`thelper.data.parsers.Dataset.get_sample_sizes`), i.e. without decoding any image. Note that these
+    are the sizes of the images before any transformation: aspect ratio buckets remain valid when the images
+    are resized while preserving their aspect ratio, but size buckets may not. Samples with an unknown size
+    (``-1``) are put in their own bucket.
+
+    Example configuration file::
+
+        # ...
+        "loaders": {
+            # ...
+            "train_sampler": {
+                "type": "thelper.data.samplers.BucketBatchSampler",
+                "params": {
+                    # group images by aspect ratio (default) or by size ("size")
+                    "bucket_by": "aspect_ratio",
+                    # bucket edges (default = [1/2, 2/3, 1, 3/2, 2] for aspect ratios)
+                    "bins": [0.75, 1.0, 1.333]
+                },
+                # specifies that the sampler should receive the (width, height) image sizes
+                "pass_sizes": true
+            },
+            # the loader's batch size (and 'drop_last' flag) are passed to the sampler
+            "collate_fn": {
+                "type": "thelper.data.loaders.padded_collate",
+                "params": {"pad_keys": ["image"], "size_divisor": 32}
+            },
+            # ...
+        },
+        # ...
+
+    Arguments:
+        indices (list): a list of indices
+        sizes (list): the (width, height) image size of each sample index (``-1`` for unknown sizes).
+        batch_size (int): number of samples in each minibatch.
+        bucket_by (str): bucketing criterion; can be ``aspect_ratio`` or ``size``.
+        bins (list): the edges of the buckets. For ``aspect_ratio``, these are aspect ratio values, and for
+            ``size``, these are pixel counts applied to both the width and height of the images. If ``None``,
+            default aspect ratio edges are used, or images are bucketed by exact size.
+        shuffle (bool): specifies whether to shuffle samples within buckets and minibatches at every epoch.
+        drop_last (bool): specifies whether to drop the last incomplete minibatch.
+        seeds (dict): dictionary of seeds to use when initializing RNG state.
+        epoch (int): epoch number used to reinitialize the RNG to an epoch-specific state.
+
+    .. seealso::
+        | :func:`thelper.data.utils.create_loaders`
+        | :func:`thelper.data.loaders.padded_collate`
+        | :meth:`thelper.data.parsers.Dataset.get_sample_sizes`
+    """
+
+    default_aspect_ratio_bins = [1 / 2, 2 / 3, 1.0, 3 / 2, 2.0]
+    """Default aspect ratio (width / height) bucket edges."""
+
+    def __init__(self, indices, sizes, batch_size, bucket_by="aspect_ratio", bins=None, shuffle=True, drop_last=False,
+                 seeds=None, epoch=0):
+        super().__init__(indices)
+        self.seeds = {}
+        if seeds is not None:
+            assert isinstance(seeds, dict), "unexpected seed pack type"
+            self.seeds = seeds
+        assert isinstance(epoch, int) and epoch >= 0, "invalid epoch index value"
+        self.epoch = epoch
+        assert isinstance(batch_size, int) and batch_size > 0, "invalid batch size (should be positive int)"
+        assert bucket_by in ["aspect_ratio", "size"], f"unexpected bucketing criterion '{bucket_by}'"
+        self.indices = np.array(indices, dtype=np.int64)
+        sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 2)
+        assert len(sizes) == len(self.indices), "mismatched index and size counts"
+        self.batch_size = batch_size
+        self.bucket_by = bucket_by
+        if bins is None and bucket_by == "aspect_ratio":
+            bins = self.default_aspect_ratio_bins
+        self.bins = np.sort(np.asarray(bins, dtype=np.float64)) if bins is not None else None
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.buckets = self._get_buckets(sizes)
+        nb_leftovers = sum([len(bucket) % batch_size for bucket in self.buckets])
+        self.nb_batches = sum([len(bucket) // batch_size for bucket in self.buckets]) + nb_leftovers // batch_size
+        if nb_leftovers % batch_size > 0 and not drop_last:
+            self.nb_batches += 1
+
+    def _get_buckets(self, sizes):
+        """Returns the list of sample index arrays of each bucket, sorted by bucket key."""
+        if len(self.indices) == 0:
+            return []
+        if self.bucket_by == "aspect_ratio":
+            keys = np.digitize(sizes[:, 0] / np.maximum(sizes[:, 1], 1), self.bins).reshape(-1, 1)
+        elif self.bins is not None:
+            keys = np.digitize(sizes, self.bins)
+        else:
+            keys = sizes
+        keys = np.where((sizes > 0).all(axis=1, keepdims=True), keys, -1)  # unknown sizes get their own bucket
+        _, bucket_codes = np.unique(keys, axis=0, return_inverse=True)
+        bucket_codes = bucket_codes.reshape(-1)
+        order = np.argsort(bucket_codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(bucket_codes[order])) + 1
+        return np.split(self.indices[order], bounds)
+
+    @property
+    def sample_count(self):
+        """Returns the number of sample indices yielded in each epoch."""
+        if self.drop_last:
+            return self.nb_batches * self.batch_size
+        return len(self.indices)
+
+    def set_epoch(self, epoch=0):
+        """Sets the current epoch number in order to offset the RNG state for sampling."""
+        assert isinstance(epoch, int) and epoch >= 0, "invalid epoch index value"
+        self.epoch = epoch
+
+    def _get_epoch_batches(self, pad_last=False):
+        """Returns the list of minibatch index arrays for the current epoch (without incrementing it)."""
+        rng = _get_generator(self.seeds, self.epoch) if self.shuffle else None
+        batches, leftovers = [], []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = rng.permutation(bucket)
+            nb_full = len(bucket) // self.batch_size
+            batches.extend(np.split(bucket[:nb_full * self.batch_size], nb_full) if nb_full > 0 else [])
+            leftovers.append(bucket[nb_full * self.batch_size:])
+        leftovers = np.concatenate(leftovers) if leftovers else np.empty((0,), dtype=np.int64)
+        nb_full = len(leftovers) // self.batch_size
+        batches.extend(np.split(leftovers[:nb_full * self.batch_size], nb_full) if nb_full > 0 else [])
+        if len(leftovers) % self.batch_size > 0 and not self.drop_last:
+            last_batch = leftovers[nb_full * self.batch_size:]
+            batches.append(np.resize(last_batch, self.batch_size) if pad_last else last_batch)
+        if self.shuffle:
+            batches = [batches[idx] for idx in rng.permutation(len(batches)).tolist()]
+        return batches
+
+    def __iter__(self):
+        batches = self._get_epoch_batches()
+        self.epoch += 1
+        return (batch.tolist() for batch in batches)
+
+    def __len__(self):
+        return self.nb_batches
+
+
+class DistributedBucketBatchSampler(BucketBatchSampler):
+    r"""Groups sample indices into minibatches of images with similar aspect ratios or sizes, sharded across replicas.
+
+    This specialization of :class:`thelper.data.samplers.BucketBatchSampler` is meant for data-parallel training
+    over multiple processes. All replicas form the same (epoch-seeded) global list of minibatches, and each of
+    them keeps its own share of it. If ``drop_last`` is false, the last incomplete minibatch is padded with
+    repeated indices, and the list of minibatches is padded by wrapping around its start so that all replicas
+    run the same number of iterations. It is configured like its parent class, with the additional
+    ``num_replicas`` and ``rank`` parameters of :class:`thelper.data.samplers.DistributedSubsetRandomSampler`.
+
+    .. seealso::
+        | :class:`thelper.data.samplers.BucketBatchSampler`
+        | :class:`thelper.data.samplers.DistributedSubsetRandomSampler`
+    """
+
+    def __init__(self, indices, sizes, batch_size, bucket_by="aspect_ratio", bins=None, shuffle=True, drop_last=False,
+                 seeds=None, epoch=0, num_replicas=None, rank=None):
+        super().__init__(indices, sizes, batch_size, bucket_by=bucket_by, bins=bins, shuffle=shuffle,
+                         drop_last=drop_last, seeds=_get_distributed_seeds(seeds), epoch=epoch)
+        self.num_replicas, self.rank = _get_distributed_info(num_replicas, rank)
+
+    @property
+    def sample_count(self):
+        """Returns the number of sample indices yielded to the current replica in each epoch."""
+        return len(self) * self.batch_size
+
+    def __iter__(self):
+        batches = self._get_epoch_batches(pad_last=not self.drop_last)
+        self.epoch += 1
+        batch_idxs = _get_shard(np.arange(len(batches)), self.num_replicas, self.rank, self.drop_last)
+        return (batches[batch_idx].tolist() for batch_idx in batch_idxs.tolist())
+
+    def __len__(self):
+        return _get_shard_size(self.nb_batches, self.num_replicas, self.drop_last)
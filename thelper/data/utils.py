@@ -4,12 +4,17 @@ This module contains utility functions and tools used to instantiate data loader
 """
 
 import inspect
+import io
 import json
 import logging
 import os
+import pickle
 import sys
+import tarfile
+import time
 
 import numpy as np
+import torch
 import tqdm
 
 import thelper.tasks
@@ -39,6 +44,23 @@ def create_loaders(config, save_dir=None):
       loaders. If you get an 'out of memory' error at runtime, try reducing it.
     - ``<train_/valid_/test_>collate_fn`` (optional): specifies the collate function to use in data
       loaders. The default one is typically fine, but some datasets might require a custom function.
+    - ``encode_labels`` (optional, default=False): specifies whether the groundtruth of minibatches
+      should be converted into tensors (e.g. class names into class indices) by the collate function
+      in the loader workers instead of in the training loop. The trainer will update the task used
+      for the conversion if it differs from the dataset task.
+    - ``defer_normalization`` (optional, default=False): specifies whether the trailing normalization
+      stages of the sample transforms (mean/std or min/max normalization, transposes, and channel
+      reordering applied to the input key only) should be moved out of the workers and applied to the
+      minibatches by the trainer once uploaded to their device. This allows the images to be transported
+      in their original format (e.g. ``uint8``), which is four times smaller than ``float32``. This is
+      currently supported by the classification, segmentation, and regression trainers.
+    - ``<train_/valid_/test_/eval_>batch_transforms`` (optional): list of batch-level transformation stages
+      (e.g. from :mod:`thelper.transforms.batch`) applied by the trainer to the minibatches once uploaded to
+      their device (and normalized, if ``defer_normalization`` is used). These operations process all the
+      samples of a minibatch with single tensor ops, and can replace costly per-sample augmentations in the
+      workers. The stages without prefix are used for all loaders that do not define their own; see
+      :func:`thelper.transforms.utils.load_batch_transforms` for more information. This is currently
+      supported by the classification, segmentation, and regression trainers.
     - ``shuffle`` (optional, default=True): specifies whether the data loaders should shuffle
       their samples or not.
     - ``test_seed`` (optional): specifies the RNG seed to use when splitting test data. If no seed
@@ -56,13 +78,24 @@ def create_loaders(config, save_dir=None):
       time-related seed.
     - ``workers`` (optional, default=1): specifies the number of threads to use to preload batches in
       parallel; can be 0 (loading will be on main thread), or an integer >= 1.
+    - ``persistent_workers`` (optional, default=False): specifies whether the loader workers should be kept
+      alive across epochs instead of being recreated every time. This avoids reinitializing heavy dataset
+      parsers in each worker, and allows the first batches of the next epoch to be loaded while validation
+      runs. The workers are still reseeded at the start of every epoch. Requires PyTorch v1.7+.
     - ``pin_memory`` (optional, default=False): specifies whether the data loaders will copy tensors
       into CUDA-pinned memory before returning them.
     - ``drop_last`` (optional, default=False): specifies whether to drop the last incomplete batch
       or not if the dataset size is not a multiple of the batch size.
     - ``sampler`` (optional): specifies a type of sampler and its constructor parameters to be used
       in the data loaders. This can be used for example to help rebalance a dataset based on its
-      class distribution. See :mod:`thelper.data.samplers` for more information.
+      class distribution. See :mod:`thelper.data.samplers` for more information. Samplers can receive
+      the class labels of the samples (``pass_labels``) or their image sizes (``pass_sizes``, see
+      :class:`thelper.data.samplers.BucketBatchSampler`). Batch samplers (i.e. those that take a
+      ``batch_size`` argument) receive the loader's batch size and ``drop_last`` flag by default.
+    - ``distributed`` (optional, default=auto): specifies whether the default shuffling sampler should
+      shard its indices across the replicas of the default process group (see
+      :class:`thelper.data.samplers.DistributedSubsetRandomSampler`). By default, this is enabled when
+      a process group with more than one replica is initialized.
     - ``augments`` (optional): provides a list of transformation operations used to augment all samples
       of a dataset. See :func:`thelper.transforms.utils.load_augments` for more info.
     - ``train_augments`` (optional): provides a list of transformation operations used to augment the
@@ -83,7 +116,8 @@ def create_loaders(config, save_dir=None):
     - ``test_split`` (optional): provides the proportion of samples of each dataset to hand off to the
       test data loader. These proportions are given in a dictionary format (``name: ratio``).
     - ``skip_verif`` (optional, default=True): specifies whether the dataset split should be verified
-      if resuming a session by parsing the log files generated earlier.
+      if resuming a session by parsing the log files generated earlier. Note that the split indices
+      themselves are reloaded from the session's cache when possible (see below).
     - ``skip_split_norm`` (optional, default=False): specifies whether the question about normalizing
       the split ratios should be skipped or not.
     - ``skip_class_balancing`` (optional, default=False): specifies whether the balancing of class
@@ -152,12 +186,23 @@ def create_loaders(config, save_dir=None):
                     "params": {
                         # ...
                     }
+                },
+                # optionally, decoded samples can be cached in shared memory (see 'thelper.data.CachedDataset')
+                "cache": {
+                    "cache_size": 8e9  # maximum size of the cache, in bytes
                 }
             },
             # ...
         },
         # ...
 
+    If a session directory is provided, the computed train/valid/test indices are saved in a ``split.npz``
+    file inside it, along with a hash of the dataset configurations, lengths, split ratios, and split seeds
+    (see :func:`thelper.data.loaders.LoaderFactory.get_split_hash`). When the session is resumed with the
+    same parameters, the indices are reloaded directly from this file instead of being recomputed.
+    In distributed sessions, only the first replica writes this file (and the data logs); the other replicas
+    wait for it and reload the indices from it.
+
     Args:
         config: a dictionary that provides all required data configuration information under two fields,
             namely 'datasets' and 'loaders'.
@@ -177,18 +222,21 @@ def create_loaders(config, save_dir=None):
     logstamp = thelper.utils.get_log_stamp()
     repover = thelper.__version__ + ":" + thelper.utils.get_git_stamp()
     session_name = config["name"] if "name" in config else "session"
+    dist_ready = torch.distributed.is_available() and torch.distributed.is_initialized()
+    rank = torch.distributed.get_rank() if dist_ready else 0  # only the first replica writes to the session directory
     data_logger_dir = None
     if save_dir is not None:
         thelper.utils.init_logger()  # make sure all logging is initialized before attaching this part
         data_logger_dir = os.path.join(save_dir, "logs")
         os.makedirs(data_logger_dir, exist_ok=True)
-        data_logger_path = os.path.join(data_logger_dir, "data.log")
-        data_logger_format = logging.Formatter("[%(asctime)s - %(process)s] %(levelname)s : %(message)s")
-        data_logger_fh = logging.FileHandler(data_logger_path)
-        data_logger_fh.setLevel(logging.NOTSET)
-        data_logger_fh.setFormatter(data_logger_format)
-        thelper.data.logger.addHandler(data_logger_fh)
-        thelper.data.logger.info(f"created data log for session '{session_name}'")
+        if rank == 0:  # other replicas only log to the console
+            data_logger_path = os.path.join(data_logger_dir, "data.log")
+            data_logger_format = logging.Formatter("[%(asctime)s - %(process)s] %(levelname)s : %(message)s")
+            data_logger_fh = logging.FileHandler(data_logger_path)
+            data_logger_fh.setLevel(logging.NOTSET)
+            data_logger_fh.setFormatter(data_logger_format)
+            thelper.data.logger.addHandler(data_logger_fh)
+            thelper.data.logger.info(f"created data log for session '{session_name}'")
     logger.debug("loading data usage config")
     # todo: 'data_config' field is deprecated, might be removed later
     if "data_config" in config:
@@ -203,8 +251,23 @@ def create_loaders(config, save_dir=None):
         logger.info(f"parsed dataset: {str(dataset)}")
     logger.info(f"task info: {str(task)}")
     logger.debug("splitting datasets and creating loaders...")
-    train_idxs, valid_idxs, test_idxs = loader_factory.get_split(datasets, task)
-    if save_dir is not None:
+    split_cache_path = os.path.join(save_dir, "split.npz") if save_dir is not None else None
+    split_hash = loader_factory.get_split_hash(datasets, task, thelper.utils.get_key_def("datasets", config))
+    split = None
+    if rank == 0:
+        split = loader_factory.load_split(split_cache_path, split_hash)
+        if split is None:
+            split = loader_factory.get_split(datasets, task)
+            if split_cache_path is not None:
+                loader_factory.save_split(split_cache_path, split_hash, *split)
+    if dist_ready:
+        torch.distributed.barrier()  # the other replicas wait for the split file to be written by the first one
+    if split is None:
+        split = loader_factory.load_split(split_cache_path, split_hash)
+        if split is None:  # all replicas use the same seeds, so they would get the same split anyway
+            split = loader_factory.get_split(datasets, task)
+    train_idxs, valid_idxs, test_idxs = split
+    if save_dir is not None and rank == 0:
         with open(os.path.join(data_logger_dir, "task.log"), "a+") as fd:
             fd.write(f"session: {session_name}-{logstamp}\n")
             fd.write(f"version: {repover}\n")
@@ -272,7 +335,7 @@ def create_loaders(config, save_dir=None):
             # now, always overwrite, as it can get too big otherwise
             with open(dataset_log_file, "w") as fd:
                 json.dump(log_content, fd, indent=4, sort_keys=False)
-    train_loader, valid_loader, test_loader = loader_factory.create_loaders(datasets, train_idxs, valid_idxs, test_idxs)
+    train_loader, valid_loader, test_loader = loader_factory.create_loaders(datasets, train_idxs, valid_idxs, test_idxs, task=task)
     return task, train_loader, valid_loader, test_loader
 
 
@@ -287,7 +350,9 @@ def create_parsers(config, base_transforms=None):
 
     The provided configuration will be parsed for a 'datasets' dictionary entry. The keys in this dictionary
     are treated as unique dataset names and are used for lookups. The value associated to each key (or dataset
-    name) should be a type-params dictionary that can be parsed to instantiate the dataset interface.
+    name) should be a type-params dictionary that can be parsed to instantiate the dataset interface. If this
+    dictionary also has a 'cache' field, the instantiated parser will be wrapped in a shared memory sample cache
+    (see :class:`thelper.data.parsers.CachedDataset`).
 
     An example configuration dictionary is given in :func:`thelper.data.utils.create_loaders`.
 
@@ -359,6 +424,13 @@ def create_parsers(config, base_transforms=None):
                 task = thelper.tasks.create_task(dataset_config["task"])
                 # assume that __getitem__ and __len__ are implemented, but we need to make it sampling-ready
                 dataset = thelper.data.ExternalDataset(dataset_type, task, transforms=transforms, **dataset_params)
+            if "cache" in dataset_config and dataset_config["cache"]:
+                logger.debug("wrapping dataset '%s' in shared memory sample cache..." % dataset_name)
+                cache_params = dataset_config["cache"]
+                if not isinstance(cache_params, dict):
+                    cache_params = {"cache_size": cache_params}
+                dataset_hash = thelper.utils.get_params_hash(dataset_name, dataset_config)
+                dataset = thelper.data.CachedDataset(dataset, dataset_hash=dataset_hash, **cache_params)
         if task is None:
             raise AssertionError("parsed task interface should not be None anymore (old code doing something strange?)")
         tasks.append(task)
@@ -366,7 +438,13 @@ def create_parsers(config, base_transforms=None):
     return datasets, thelper.tasks.create_global_task(tasks)
 
 
-def create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, compression=None, config_backup=None):
+def _encode_hdf5_payload(array, approach, encode_params):
+    """Encodes a single sample element into a flat byte array (picklable helper for process pools)."""
+    return np.frombuffer(thelper.utils.encode_data(array, approach, **encode_params), dtype=np.uint8)
+
+
+def create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, compression=None, config_backup=None,
+                workers=0, chunk_size=None, chunk_cache=None):
     """Saves the samples loaded from train/valid/test data loaders into an HDF5 archive.
 
     The loaded minibatches are decomposed into individual samples. The keys provided via the task interface are used
@@ -378,6 +456,12 @@ def create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, com
     each sample will be compressed individually, not as an array. Therefore, if you are trying to compress very
     correlated samples (e.g. frames in a video sequence), this approach will be pretty bad.
 
+    Uncompressed array elements are stored in fixed-shape datasets using their native type (this requires all
+    samples to have the same shape, which is already a requirement for the element to be reshaped on decoding).
+    Compressed elements are stored as variable-length byte arrays. Samples are accumulated into large blocks
+    before being written to the archive, and the encoding of compressed elements can be distributed to a pool of
+    processes; while a block is being encoded, the next one is being loaded.
+
     Args:
         archive_path: path pointing where the HDF5 archive should be created.
         task: task object that defines the input, groundtruth, and meta keys tied to elements that should be
@@ -388,6 +472,9 @@ def create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, com
         compression: the compression configuration dictionary that will be parsed to determine how sample
             elements should be compressed. If a mapping is missing, that element will not be compressed.
         config_backup: optional session configuration file that should be saved in the HDF5 archive.
+        workers: number of processes used to encode compressed elements (0 = encode on the main thread).
+        chunk_size: number of samples per HDF5 chunk in each dataset (``None`` = let h5py pick a size).
+        chunk_cache: size of the HDF5 raw chunk cache, in bytes (``None`` = h5py default).
 
     Example compression configuration::
 
@@ -423,68 +510,613 @@ def create_hdf5(archive_path, task, train_loader, valid_loader, test_loader, com
         compression = {}
     if config_backup is None:
         config_backup = {}
+    assert isinstance(workers, int) and workers >= 0, "invalid encoding worker count"
+    assert chunk_size is None or (isinstance(chunk_size, int) and chunk_size > 0), "invalid chunk size"
+    assert chunk_cache is None or (isinstance(chunk_cache, int) and chunk_cache > 0), "invalid chunk cache size"
+    block_max_bytes = 64 * 1024 * 1024  # approximate size of the raw sample blocks accumulated before writing
     import h5py
-    with h5py.File(archive_path, "w") as fd:
-        fd.attrs["source"] = thelper.utils.get_log_stamp()
-        fd.attrs["git_sha1"] = thelper.utils.get_git_stamp()
-        fd.attrs["version"] = thelper.__version__
-        fd.attrs["task"] = str(task)
-        fd.attrs["config"] = str(config_backup)
-        fd.attrs["compression"] = str(compression)
-        dtype = h5py.special_dtype(vlen=np.uint8)
-        target_keys = task.keys
-
-        def create_dataset(name, max_len, array_template, compr_args):
-            if array_template.ndim > 1:
-                dset = fd.create_dataset(name, shape=(max_len,), maxshape=(max_len,), dtype=dtype)
-                dset.attrs["orig_dtype"] = str(array_template.dtype)
-                dset.attrs["orig_shape"] = array_template.shape[1:]  # removes batch dim
-            else:
-                assert thelper.utils.is_scalar(array_template[0])
-                if "type" in compr_args and compr_args["type"] != "none":
-                    raise AssertionError("cannot compress scalar elements")
-                if np.issubdtype(array_template.dtype, np.number):
-                    dset = fd.create_dataset(name, shape=(max_len,), maxshape=(max_len,), dtype=array_template.dtype)
+    file_kwargs = {"rdcc_nbytes": chunk_cache} if chunk_cache is not None else {}
+    pool = None
+    if workers > 0:
+        import concurrent.futures
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        with h5py.File(archive_path, "w", **file_kwargs) as fd:
+            fd.attrs["source"] = thelper.utils.get_log_stamp()
+            fd.attrs["git_sha1"] = thelper.utils.get_git_stamp()
+            fd.attrs["version"] = thelper.__version__
+            fd.attrs["task"] = str(task)
+            fd.attrs["config"] = str(config_backup)
+            fd.attrs["compression"] = str(compression)
+            dtype = h5py.special_dtype(vlen=np.uint8)
+            target_keys = task.keys
+
+            def create_dataset(name, max_len, array_template, compr_args):
+                # chunks cannot be larger than the (fixed) max shape of the datasets
+                dset_chunk_size = max(1, min(chunk_size, max_len)) if chunk_size is not None else None
+                if array_template.ndim > 1:
+                    if compr_args[0] == "none":
+                        # fixed-shape dataset with native type, read back as-is (no decoding needed)
+                        sample_shape = array_template.shape[1:]
+                        chunks = (dset_chunk_size, *sample_shape) if dset_chunk_size is not None else True
+                        dset = fd.create_dataset(name, shape=(max_len, *sample_shape), maxshape=(max_len, *sample_shape),
+                                                 dtype=array_template.dtype, chunks=chunks)
+                    else:
+                        chunks = (dset_chunk_size,) if dset_chunk_size is not None else True
+                        dset = fd.create_dataset(name, shape=(max_len,), maxshape=(max_len,), dtype=dtype, chunks=chunks)
+                        dset.attrs["orig_dtype"] = str(array_template.dtype)
+                        dset.attrs["orig_shape"] = array_template.shape[1:]  # removes batch dim
                 else:
-                    dset = fd.create_dataset(name, shape=(max_len,), maxshape=(max_len,), dtype=dtype)
-                    dset.attrs["orig_dtype"] = str(array_template.dtype)
-                    dset.attrs["orig_shape"] = ()
-            return dset
-
-        def fill_dataset(dset, dset_idx, array_idx, array, compr, **compr_kwargs):
-            if array.ndim > 1:
-                dset[dset_idx] = np.frombuffer(thelper.utils.encode_data(array[array_idx], compr, **compr_kwargs), dtype=np.uint8)
-            elif not np.issubdtype(array.dtype, np.number):
-                sample = array[array_idx].tobytes() if np.issubdtype(array[array_idx].dtype, np.dtype(str).type) else array[array_idx]
-                dset[dset_idx] = np.frombuffer(sample, dtype=np.uint8)
-            else:
-                dset[dset_idx] = array[array_idx]
-
-        def get_compr_args(key, config):
-            config = thelper.utils.get_key_def(key, config, default={})
-            compr_type = thelper.utils.get_key_def("type", config, default="none")
-            encode_params = thelper.utils.get_key_def("encode_params", config, default={})
-            return compr_type, encode_params
-
-        for loader, group in [(train_loader, "train"), (valid_loader, "valid"), (test_loader, "test")]:
-            if loader is None:
-                continue
-            max_dataset_len = len(loader) * loader.batch_size
-            datasets = {key: None for key in target_keys}
-            datasets_len = {key: 0 for key in target_keys}
-            datasets_compr = {key: get_compr_args(key, compression) for key in target_keys}
-            for batch in tqdm.tqdm(loader, desc=f"packing {group} loader"):
+                    assert thelper.utils.is_scalar(array_template[0])
+                    if compr_args[0] != "none":
+                        raise AssertionError("cannot compress scalar elements")
+                    chunks = (dset_chunk_size,) if dset_chunk_size is not None else True
+                    if np.issubdtype(array_template.dtype, np.number):
+                        dset = fd.create_dataset(name, shape=(max_len,), maxshape=(max_len,),
+                                                 dtype=array_template.dtype, chunks=chunks)
+                    else:
+                        dset = fd.create_dataset(name, shape=(max_len,), maxshape=(max_len,), dtype=dtype, chunks=chunks)
+                        dset.attrs["orig_dtype"] = str(array_template.dtype)
+                        dset.attrs["orig_shape"] = ()
+                return dset
+
+            def to_payload(element):
+                # converts a non-numeric scalar (e.g. a string) into a flat byte array
+                element = element.tobytes() if np.issubdtype(element.dtype, np.dtype(str).type) else element
+                return np.frombuffer(element, dtype=np.uint8)
+
+            def get_compr_args(key, config):
+                config = thelper.utils.get_key_def(key, config, default={})
+                compr_type = thelper.utils.get_key_def("type", config, default="none")
+                encode_params = thelper.utils.get_key_def("encode_params", config, default={})
+                return compr_type, encode_params
+
+            def to_object_array(payloads):
+                payloads = list(payloads)  # might be waiting on the encoding pool here
+                array = np.empty(len(payloads), dtype=dtype)
+                for idx, payload in enumerate(payloads):
+                    array[idx] = payload  # assigned one by one to avoid broadcasting same-size payloads
+                return array
+
+            def encode_block(datasets, datasets_compr, block, block_offset):
+                # returns a list of deferred write jobs, one per key, to run once the encoding is done
+                jobs = []
+                for key, elements in block.items():
+                    dset = datasets[key]
+                    compr_type, encode_params = datasets_compr[key]
+                    if compr_type != "none":
+                        if pool is not None:
+                            chunksize = max(len(elements) // (workers * 4), 1)
+                            payloads = pool.map(_encode_hdf5_payload, elements, [compr_type] * len(elements),
+                                                [encode_params] * len(elements), chunksize=chunksize)
+                        else:
+                            payloads = [_encode_hdf5_payload(e, compr_type, encode_params) for e in elements]
+                        jobs.append((dset, block_offset, payloads, True))
+                    elif dset.dtype == dtype:
+                        jobs.append((dset, block_offset, [to_payload(e) for e in elements], True))
+                    else:
+                        jobs.append((dset, block_offset, elements, False))
+                return jobs
+
+            def write_block(jobs):
+                for dset, block_offset, payloads, is_vlen in jobs:
+                    payloads = to_object_array(payloads) if is_vlen else np.stack(payloads)
+                    # note: write_direct avoids h5py's reinterpretation of same-length vlen payloads as 2D arrays
+                    dset.write_direct(payloads, dest_sel=np.s_[block_offset:block_offset + len(payloads)])
+
+            for loader, group in [(train_loader, "train"), (valid_loader, "valid"), (test_loader, "test")]:
+                if loader is None:
+                    continue
+                max_dataset_len = loader.sample_count
+                datasets = {key: None for key in target_keys}
+                datasets_compr = {key: get_compr_args(key, compression) for key in target_keys}
+                block = {key: [] for key in target_keys}
+                block_bytes, block_offset, dataset_len = 0, 0, 0
+                pending_jobs = None
+                for batch in tqdm.tqdm(loader, desc=f"packing {group} loader"):
+                    batch_size = None
+                    for key in target_keys:
+                        tensor = thelper.utils.to_numpy(batch[key])
+                        if datasets[key] is None:
+                            datasets[key] = create_dataset(group + "/" + key, max_dataset_len, tensor, datasets_compr[key])
+                        if tensor.ndim > 1:
+                            dset_shape = datasets[key].attrs["orig_shape"] if "orig_shape" in datasets[key].attrs \
+                                else datasets[key].shape[1:]
+                            assert tuple(dset_shape) == tensor.shape[1:], \
+                                f"sample shape mismatch for key '{key}' (got {tensor.shape[1:]}, expected {tuple(dset_shape)})"
+                        assert batch_size is None or batch_size == tensor.shape[0], "mismatched element counts in batch"
+                        batch_size = tensor.shape[0]
+                        block[key].extend(tensor[idx] for idx in range(batch_size))
+                        block_bytes += tensor.nbytes
+                    dataset_len += batch_size
+                    if block_bytes >= block_max_bytes:
+                        jobs = encode_block(datasets, datasets_compr, block, block_offset)
+                        if pending_jobs is not None:
+                            write_block(pending_jobs)  # previous block should be encoded by now
+                        pending_jobs = jobs
+                        block_offset = dataset_len
+                        block, block_bytes = {key: [] for key in target_keys}, 0
+                if dataset_len > block_offset:
+                    jobs = encode_block(datasets, datasets_compr, block, block_offset)
+                    if pending_jobs is not None:
+                        write_block(pending_jobs)
+                    pending_jobs = jobs
+                if pending_jobs is not None:
+                    write_block(pending_jobs)
+                fd[group].attrs["count"] = dataset_len
                 for key in target_keys:
-                    tensor = thelper.utils.to_numpy(batch[key])
-                    if datasets[key] is None:
-                        datasets[key] = create_dataset(group + "/" + key, max_dataset_len, tensor, datasets_compr[key])
-                    for idx in range(tensor.shape[0]):
-                        fill_dataset(datasets[key], datasets_len[key], idx, tensor, datasets_compr[key][0], **datasets_compr[key][1])
-                        datasets_len[key] += 1
-            assert len(set(datasets_len.values())) == 1
-            fd[group].attrs["count"] = datasets_len[task.input_key]
-            for key in target_keys:
-                datasets[key].resize(size=(datasets_len[key],))
+                    datasets[key].resize(dataset_len, axis=0)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def create_memmap(archive_path, task, train_loader, valid_loader, test_loader, compression=None, config_backup=None,
+                  shard_size=None):
+    """Saves the samples loaded from train/valid/test data loaders into a memory-mappable sharded array archive.
+
+    The loaded minibatches are decomposed into individual samples. The keys provided via the task interface are used
+    to fetch elements (input, groundtruth, ...) from the samples, and save them in raw ``.npy`` shards. Each shard
+    holds a fixed number of samples for a single key, meaning that all elements of a key must have the same shape
+    and type. The archive is a directory that contains three subdirectories (`train`, `valid`, and `test`) with the
+    shards of each key, and a JSON index that holds the task, the shapes, and the sample counts.
+
+    Since the shards are meant to be memory-mapped by :class:`thelper.data.parsers.MemmapDataset`, no compression
+    is supported; the compression configuration is only validated and kept in the index.
+
+    Args:
+        archive_path: path pointing where the archive directory should be created.
+        task: task object that defines the input, groundtruth, and meta keys tied to elements that should be
+            parsed from loaded samples and saved in the archive.
+        train_loader: training data loader (can be `None`).
+        valid_loader: validation data loader (can be `None`).
+        test_loader: testing data loader (can be `None`).
+        compression: the compression configuration dictionary (all types must be `none`, if specified).
+        config_backup: optional session configuration file that should be saved in the archive index.
+        shard_size: number of samples per shard (``None`` = pick a count that gives shards of about 1GB).
+
+    .. seealso::
+        | :func:`thelper.cli.split_data`
+        | :class:`thelper.data.parsers.MemmapDataset`
+        | :func:`thelper.data.utils.create_hdf5`
+    """
+    if compression is None:
+        compression = {}
+    if config_backup is None:
+        config_backup = {}
+    for key, compr_config in compression.items():
+        assert thelper.utils.get_key_def("type", compr_config, default="none") == "none", \
+            f"cannot compress elements of key '{key}' in memory-mapped archive"
+    assert shard_size is None or (isinstance(shard_size, int) and shard_size > 0), "invalid shard size"
+    shard_max_bytes = 2 ** 30
+    os.makedirs(archive_path, exist_ok=True)
+    index = {
+        "source": thelper.utils.get_log_stamp(),
+        "git_sha1": thelper.utils.get_git_stamp(),
+        "version": thelper.__version__,
+        "task": str(task),
+        "config": str(config_backup),
+        "compression": str(compression),
+        "subsets": {},
+    }
+    target_keys = task.keys
+    for loader, group in [(train_loader, "train"), (valid_loader, "valid"), (test_loader, "test")]:
+        if loader is None:
+            continue
+        os.makedirs(os.path.join(archive_path, group), exist_ok=True)
+        expected_len = len(loader) * loader.batch_size if loader.drop_last else loader.sample_count
+        group_shard_size = shard_size
+        keys_index = {key: None for key in target_keys}
+        shards = {key: None for key in target_keys}  # current shard array (memmap or list) for each key
+        dataset_len = 0
+
+        def close_shard(key):
+            shard_path = keys_index[key]["shards"][-1]["path"]
+            if isinstance(shards[key], list):  # non-numeric elements are buffered, and saved at once
+                np.save(os.path.join(archive_path, shard_path), np.asarray(shards[key]))
+            else:
+                shards[key].flush()
+            shards[key] = None
+
+        for batch in tqdm.tqdm(loader, desc=f"packing {group} loader"):
+            tensors = {key: thelper.utils.to_numpy(batch[key]) for key in target_keys}
+            batch_size = len(tensors[task.input_key])
+            assert all([len(t) == batch_size for t in tensors.values()]), "mismatched element counts in batch"
+            if group_shard_size is None:
+                sample_bytes = sum([t.nbytes for t in tensors.values()]) // max(batch_size, 1)
+                group_shard_size = max(shard_max_bytes // max(sample_bytes, 1), 1)
+            for key, tensor in tensors.items():
+                if keys_index[key] is None:
+                    keys_index[key] = {"dtype": tensor.dtype.str, "shape": list(tensor.shape[1:]), "shards": []}
+                assert list(tensor.shape[1:]) == keys_index[key]["shape"], \
+                    f"sample shape mismatch for key '{key}' (got {tensor.shape[1:]}, expected {keys_index[key]['shape']})"
+                for sample_idx in range(batch_size):
+                    shard_offset = (dataset_len + sample_idx) % group_shard_size
+                    if shard_offset == 0:
+                        if shards[key] is not None:
+                            close_shard(key)
+                        shard_len = min(group_shard_size, max(expected_len - dataset_len - sample_idx, 1))
+                        shard_path = os.path.join(group, f"{key}.{len(keys_index[key]['shards']):05d}.npy")
+                        keys_index[key]["shards"].append({"path": shard_path, "count": 0})
+                        if np.issubdtype(tensor.dtype, np.number) or np.issubdtype(tensor.dtype, np.bool_):
+                            shards[key] = np.lib.format.open_memmap(os.path.join(archive_path, shard_path), mode="w+",
+                                                                    dtype=tensor.dtype, shape=(shard_len, *tensor.shape[1:]))
+                        else:
+                            shards[key] = []
+                    if isinstance(shards[key], list):
+                        shards[key].append(tensor[sample_idx])
+                    else:
+                        shards[key][shard_offset] = tensor[sample_idx]
+                    keys_index[key]["shards"][-1]["count"] += 1
+            dataset_len += batch_size
+        assert dataset_len == expected_len, \
+            f"unexpected sample count for {group} loader (got {dataset_len}, expected {expected_len})"
+        for key in target_keys:
+            if shards[key] is not None:
+                close_shard(key)
+        index["subsets"][group] = {"count": dataset_len, "shard_size": group_shard_size, "keys": keys_index}
+    # the index is written last, so that incomplete archives cannot be opened
+    with open(os.path.join(archive_path, thelper.data.MemmapDataset.index_name), "w") as fd:
+        json.dump(index, fd, indent=4, sort_keys=False)
+
+
+def _encode_tar_member(element, compr_type, encode_params):
+    """Encodes a single sample element into the raw content of a tar member, returning its extension and bytes."""
+    if compr_type in ["jpg", "png"]:
+        return compr_type, thelper.utils.encode_data(element, compr_type, **encode_params).tobytes()
+    element = np.asarray(element)
+    if np.issubdtype(element.dtype, np.number) or np.issubdtype(element.dtype, np.bool_):
+        buffer = io.BytesIO()
+        np.save(buffer, element, allow_pickle=False)
+        return "npy", buffer.getvalue()
+    return "pkl", pickle.dumps(element.item() if element.ndim == 0 else element)
+
+
+def create_tar_shards(archive_path, task, train_loader, valid_loader, test_loader, compression=None, config_backup=None,
+                      shard_size=None):
+    """Saves the samples loaded from train/valid/test data loaders into a streaming tar shard archive.
+
+    The loaded minibatches are decomposed into individual samples. The keys provided via the task interface are used
+    to fetch elements (input, groundtruth, ...) from the samples, and save them as consecutive members of plain
+    (uncompressed) tar files, so that each shard can be read sequentially from start to end. The archive is a
+    directory that contains three subdirectories (`train`, `valid`, and `test`) with the shards of each set, and a
+    JSON index that holds the task, the decoding parameters of each key, and the sample counts of each shard.
+
+    Numeric elements are saved as ``.npy`` members, and other elements are pickled. Image elements can also be
+    compressed individually in ``jpg`` or ``png`` format using the same compression configuration as
+    :func:`thelper.data.utils.create_hdf5` (other compression types are not supported in tar shards).
+
+    Args:
+        archive_path: path pointing where the archive directory should be created.
+        task: task object that defines the input, groundtruth, and meta keys tied to elements that should be
+            parsed from loaded samples and saved in the archive.
+        train_loader: training data loader (can be `None`).
+        valid_loader: validation data loader (can be `None`).
+        test_loader: testing data loader (can be `None`).
+        compression: the compression configuration dictionary that will be parsed to determine how sample
+            elements should be compressed. If a mapping is missing, that element will not be compressed.
+        config_backup: optional session configuration file that should be saved in the archive index.
+        shard_size: number of samples per shard (``None`` = pick a count that gives shards of about 256MB).
+
+    .. seealso::
+        | :func:`thelper.cli.split_data`
+        | :class:`thelper.data.parsers.TarShardDataset`
+        | :func:`thelper.data.utils.create_hdf5`
+        | :func:`thelper.utils.encode_data`
+    """
+    if compression is None:
+        compression = {}
+    if config_backup is None:
+        config_backup = {}
+    for key, compr_config in compression.items():
+        assert thelper.utils.get_key_def("type", compr_config, default="none") in ["none", "jpg", "png"], \
+            f"unsupported compression type for elements of key '{key}' in tar shard archive"
+    assert shard_size is None or (isinstance(shard_size, int) and shard_size > 0), "invalid shard size"
+    shard_max_bytes = 256 * 1024 * 1024
+    os.makedirs(archive_path, exist_ok=True)
+    target_keys = task.keys
+    key_args = {}
+    for key in target_keys:
+        compr_config = thelper.utils.get_key_def(key, compression, default={})
+        key_args[key] = {
+            "type": thelper.utils.get_key_def("type", compr_config, default="none"),
+            "encode_params": thelper.utils.get_key_def("encode_params", compr_config, default={}),
+            "decode_params": thelper.utils.get_key_def("decode_params", compr_config,
+                                                       default={"flags": "cv.IMREAD_UNCHANGED"}),
+        }
+    index = {
+        "source": thelper.utils.get_log_stamp(),
+        "git_sha1": thelper.utils.get_git_stamp(),
+        "version": thelper.__version__,
+        "task": str(task),
+        "config": str(config_backup),
+        "compression": str(compression),
+        "keys": list(target_keys),
+        "key_args": {key: {"decode_params": args["decode_params"]} for key, args in key_args.items()},
+        "subsets": {},
+    }
+    for loader, group in [(train_loader, "train"), (valid_loader, "valid"), (test_loader, "test")]:
+        if loader is None:
+            continue
+        os.makedirs(os.path.join(archive_path, group), exist_ok=True)
+        expected_len = len(loader) * loader.batch_size if loader.drop_last else loader.sample_count
+        shards = []
+        tar, shard_bytes, dataset_len = None, 0, 0
+        for batch in tqdm.tqdm(loader, desc=f"packing {group} loader"):
+            tensors = {key: thelper.utils.to_numpy(batch[key]) for key in target_keys if key in batch}
+            batch_size = len(tensors[task.input_key])
+            assert all([len(t) == batch_size for t in tensors.values()]), "mismatched element counts in batch"
+            for sample_idx in range(batch_size):
+                if tar is not None and (shards[-1]["count"] == shard_size or
+                                        (shard_size is None and shard_bytes >= shard_max_bytes)):
+                    tar.close()
+                    tar = None
+                if tar is None:
+                    shard_path = os.path.join(group, f"shard-{len(shards):05d}.tar")
+                    shards.append({"path": shard_path, "count": 0})
+                    tar, shard_bytes = tarfile.open(os.path.join(archive_path, shard_path), "w"), 0
+                for key_idx, key in enumerate(target_keys):
+                    if key not in tensors:
+                        continue
+                    ext, data = _encode_tar_member(tensors[key][sample_idx], key_args[key]["type"],
+                                                   key_args[key]["encode_params"])
+                    member = tarfile.TarInfo(f"{dataset_len:09d}.{key_idx}.{ext}")
+                    member.size = len(data)
+                    tar.addfile(member, io.BytesIO(data))
+                    shard_bytes += len(data)
+                shards[-1]["count"] += 1
+                dataset_len += 1
+        if tar is not None:
+            tar.close()
+        assert dataset_len == expected_len, \
+            f"unexpected sample count for {group} loader (got {dataset_len}, expected {expected_len})"
+        index["subsets"][group] = {"count": dataset_len, "shards": shards}
+    # the index is written last, so that incomplete archives cannot be opened
+    with open(os.path.join(archive_path, thelper.data.TarShardDataset.index_name), "w") as fd:
+        json.dump(index, fd, indent=4, sort_keys=False)
+
+
+image_folder_exts = [".jpg", ".jpeg", ".bmp", ".png", ".ppm", ".pgm", ".tif"]
+"""Default list of file extensions parsed by :func:`thelper.data.utils.index_folder` for image datasets."""
+
+default_index_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "thelper", "index")
+"""Default directory where the folder manifests of :func:`thelper.data.utils.index_folder` are cached."""
+
+
+def _pack_names(names):
+    """Packs a list of file names into a compact (zero-separated) byte array for manifests."""
+    return np.frombuffer("\0".join(names).encode("utf-8", "surrogateescape"), dtype=np.uint8)
+
+
+def _unpack_names(array, count):
+    """Unpacks a list of file names from a compact byte array created with :func:`_pack_names`."""
+    if count == 0:
+        return []
+    return array.tobytes().decode("utf-8", "surrogateescape").split("\0")
+
+
+def index_folder(root, exts=None, cache_dir=None, workers=None):
+    """Returns the list of (sub)folders and of their files found under a root directory, using a cached manifest.
+
+    The directory tree is scanned with ``os.scandir`` using a pool of threads (one directory per task), which
+    is much faster than ``os.walk`` on network storage. Once scanned, the tree is saved in a compact manifest
+    (a ``.npz`` file keyed by the root path and extension filter) inside the cache directory. Later calls only
+    need to ``stat`` the indexed folders: unmodified folders (based on their mtime) are reused from the manifest,
+    and new or modified folders are rescanned, so that the index is refreshed incrementally.
+
+    The folders are returned in the same (top-down) order as ``os.walk``, and the files are kept in directory
+    listing order, so that the resulting sample indices match the ones of a direct walk of the tree.
+
+    Args:
+        root: path to the root directory to index.
+        exts: list of (lowercase) file extensions to keep; if `None`, all files are kept.
+        cache_dir: directory where the manifest should be cached. If `None`, the manifest is not cached.
+        workers: number of threads used to scan directories (`None` uses the executor's default, and `0`
+            scans all directories in the current thread).
+
+    Returns:
+        A tuple of two lists: the relative paths of all folders (the root itself is an empty string), and
+        the lists of file names found directly inside each of these folders.
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        raise AssertionError("invalid input data root '%s'" % root)
+    if exts is not None:
+        exts = sorted({ext.lower() for ext in exts})
+    manifest, manifest_path = {}, None
+    if cache_dir is not None:
+        manifest_path = os.path.join(cache_dir, "index-%s.npz" % thelper.utils.get_params_hash(root, exts))
+        if os.path.isfile(manifest_path):
+            try:
+                with np.load(manifest_path, allow_pickle=False) as fd:
+                    folders = _unpack_names(fd["folders"], len(fd["mtimes"]))
+                    file_counts, subdir_counts = fd["file_counts"], fd["subdir_counts"]
+                    files = _unpack_names(fd["files"], file_counts.sum())
+                    subdirs = _unpack_names(fd["subdirs"], subdir_counts.sum())
+                    file_offsets = np.concatenate(([0], np.cumsum(file_counts)))
+                    subdir_offsets = np.concatenate(([0], np.cumsum(subdir_counts)))
+                    for idx, (folder, mtime) in enumerate(zip(folders, fd["mtimes"].tolist())):
+                        manifest[folder] = (mtime, files[file_offsets[idx]:file_offsets[idx + 1]],
+                                            subdirs[subdir_offsets[idx]:subdir_offsets[idx + 1]])
+            except Exception as e:
+                logger.warning("could not load folder manifest at '%s' (%s), will rescan" % (manifest_path, str(e)))
+                manifest = {}
+
+    def scan(folder):
+        path = os.path.join(root, folder)
+        mtime = os.stat(path).st_mtime_ns
+        if folder in manifest and manifest[folder][0] == mtime:
+            return folder, manifest[folder], False
+        files, subdirs = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # like os.walk, only follow symlinked folders if they are found at the root level
+                    if not folder or not entry.is_symlink():
+                        subdirs.append(entry.name)
+                elif exts is None or os.path.splitext(entry.name)[1].lower() in exts:
+                    files.append(entry.name)
+        if time.time_ns() - mtime < 2 * 10 ** 9:
+            mtime = -1  # too recent for coarse mtime resolutions; force a rescan next time
+        return folder, (mtime, files, subdirs), True
+
+    tree, updated, pool = {}, False, None
+    if workers is None or workers > 0:
+        import concurrent.futures
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = [""]
+        while pending:
+            results = pool.map(scan, pending) if pool is not None else map(scan, pending)
+            pending = []
+            for folder, entry, rescanned in results:
+                tree[folder] = entry
+                updated = updated or rescanned
+                pending.extend(os.path.join(folder, subdir) for subdir in entry[2])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    updated = updated or len(tree) != len(manifest)
+    folders, stack = [], [""]
+    while stack:  # rebuild the os.walk (top-down, depth-first) ordering
+        folder = stack.pop()
+        folders.append(folder)
+        stack.extend(os.path.join(folder, subdir) for subdir in reversed(tree[folder][2]))
+    if manifest_path is not None and updated:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = manifest_path + ".%d.tmp.npz" % os.getpid()
+            np.savez(temp_path, folders=_pack_names(folders),
+                     mtimes=np.asarray([tree[f][0] for f in folders], dtype=np.int64),
+                     files=_pack_names([name for f in folders for name in tree[f][1]]),
+                     file_counts=np.asarray([len(tree[f][1]) for f in folders], dtype=np.int64),
+                     subdirs=_pack_names([name for f in folders for name in tree[f][2]]),
+                     subdir_counts=np.asarray([len(tree[f][2]) for f in folders], dtype=np.int64))
+            os.replace(temp_path, manifest_path)
+        except OSError as e:
+            logger.warning("could not save folder manifest at '%s' (%s)" % (manifest_path, str(e)))
+    return folders, [tree[f][1] for f in folders]
+
+
+_io_pools = {}  # (process id, thread count) pairs mapped to thread pools used by ``read_files``
+
+
+def read_file(path):
+    """Returns the raw content (bytes) of a file, or an empty byte string if it cannot be read.
+
+    Like ``cv2.imread``, this function does not throw on i/o errors; the (empty) result is instead
+    expected to be rejected when decoding it, e.g. via :func:`thelper.data.utils.decode_image`.
+    """
+    try:
+        with open(path, "rb") as fd:
+            return fd.read()
+    except OSError:
+        return b""
+
+
+def read_files(paths, io_threads=0):
+    """Returns an iterator over the raw content (bytes) of a list of files, read concurrently by a thread pool.
+
+    All reads are submitted at once, and their results are returned in order as soon as they are available,
+    meaning that the caller can start decoding the first files while the others are still being fetched. This
+    is mostly useful on high-latency (e.g. network) storage, where a data loader worker would otherwise spend
+    most of its time waiting on blocking reads. The thread pools are created lazily once per process, so each
+    data loader worker gets its own.
+
+    Args:
+        paths: list of paths to the files to read.
+        io_threads: number of threads to use for reading; if zero, the files are read sequentially (lazily).
+
+    Returns:
+        An iterator over the content of the files (as returned by :func:`thelper.data.utils.read_file`).
+    """
+    if io_threads <= 0 or len(paths) <= 1:
+        return (read_file(path) for path in paths)
+    pool_key = (os.getpid(), io_threads)
+    if pool_key not in _io_pools:  # pools cannot be shared with forked processes, so key them by pid
+        import concurrent.futures
+        _io_pools[pool_key] = concurrent.futures.ThreadPoolExecutor(max_workers=io_threads,
+                                                                    thread_name_prefix="thelper-io")
+    futures = [_io_pools[pool_key].submit(read_file, path) for path in paths]
+    return (future.result() for future in futures)
+
+
+def decode_image(buffer, flags=None):
+    """Decodes an image from the raw content of its file, returning ``None`` on failure (like ``cv2.imread``).
+
+    Args:
+        buffer: the raw (encoded) image file content, as a byte string or ``uint8`` array.
+        flags: the opencv image reading flags to use; by default, images are decoded in BGR color.
+    """
+    import cv2 as cv
+    if buffer is None or len(buffer) == 0:
+        return None
+    return cv.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv.IMREAD_COLOR if flags is None else flags)
+
+
+def get_image_size(image):
+    """Returns the (width, height) size of an image read from its file header (via PIL), without decoding it.
+
+    Args:
+        image: path to the image file, or its raw (encoded) content.
+
+    Returns:
+        The (width, height) size of the image, or ``None`` if its header could not be parsed.
+    """
+    import PIL.Image
+    try:
+        with PIL.Image.open(image if isinstance(image, str) else io.BytesIO(image)) as header:
+            return header.size
+    except Exception:
+        return None
+
+
+def read_image_sizes(images, io_threads=0):
+    """Returns the (width, height) sizes of a list of images read from their file headers, without decoding them.
+
+    The headers are parsed by a thread pool (like in :func:`thelper.data.utils.read_files`) if ``io_threads`` is
+    strictly positive, as this is mostly bound by file access latency.
+
+    Args:
+        images: list of paths to the image files, or of their raw (encoded) contents.
+        io_threads: number of threads to use for reading; if zero, the headers are read sequentially.
+
+    Returns:
+        A 2-dim ``int64`` array holding the (width, height) size of each image, with ``-1`` for unreadable images.
+    """
+    if io_threads <= 0 or len(images) <= 1:
+        sizes = [get_image_size(image) for image in images]
+    else:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=io_threads) as pool:
+            sizes = list(pool.map(get_image_size, images))
+    return np.asarray([size if size is not None else (-1, -1) for size in sizes], dtype=np.int64).reshape(-1, 2)
+
+
+def get_image_decode_flags(image, min_size):
+    """Returns the OpenCV flags to decode an image at the lowest resolution that is still larger than a given size.
+
+    OpenCV can decode images directly at 1/2, 1/4, or 1/8 of their resolution (``cv2.IMREAD_REDUCED_COLOR_*``),
+    which is much faster for JPEG images as most of the decoding work is then skipped. The size of the image is
+    read from its header (via PIL), and the largest reduction that keeps both of its sides above the largest
+    side of the minimum size is returned; this check does not depend on the image orientation.
+
+    Args:
+        image: path to the image file, or its raw (encoded) content.
+        min_size: minimum (width, height) size of the decoded image.
+
+    Returns:
+        The reduced decoding flags to use, or ``None`` if the image should be decoded at full resolution.
+    """
+    import cv2 as cv
+    size = get_image_size(image)
+    if size is None:
+        return None  # let opencv fail (or succeed) with the full resolution decoding
+    width, height = size
+    for factor, flags in ((8, cv.IMREAD_REDUCED_COLOR_8), (4, cv.IMREAD_REDUCED_COLOR_4), (2, cv.IMREAD_REDUCED_COLOR_2)):
+        if min(width, height) // factor >= max(min_size):
+            return flags
+    return None
 
 
 def get_class_weights(label_map, stype="linear", maxw=float('inf'), minw=0.0, norm=True, invmax=False):
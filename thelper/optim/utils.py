@@ -79,7 +79,7 @@ def create_loss_fn(config, model, loader=None, uploader=None):
     """
     # todo: add flag to toggle loss comp in validation? (add to trainer config maybe?)
     logger.debug("loading loss function")
-    if isinstance(model, torch.nn.DataParallel):
+    if isinstance(model, (torch.nn.DataParallel, torch.nn.parallel.DistributedDataParallel)):
         model = model.module  # to avoid interface getter issues
 
     def converter(x):
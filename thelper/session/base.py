@@ -1,3 +1,5 @@
+import collections
+import concurrent.futures
 import functools
 import json
 import logging
@@ -12,6 +14,8 @@ from typing import Any, AnyStr, Optional
 import cv2 as cv
 import numpy as np
 import torch
+import torch.distributed
+import torch.nn.parallel
 
 import thelper.data
 import thelper.nn
@@ -41,6 +45,8 @@ class SessionRunner:
         name: name of the session, used for printing and creating log folders.
         optimization_config: dictionary of optim-related parameters, parsed at training time.
         output_paths: map of session output paths where training/evaluation results should be saved.
+        prefetch_batches: number of minibatches to fetch, unpack, and upload ahead of time in a helper thread.
+        rank: rank of this process in the distributed process group (zero if not running distributed).
         save_freq: frequency of checkpoint saves while training (i.e. save every X epochs).
         save_raw: specifies whether to save raw types or thelper objects in checkpoints.
         skip_eval_iter: number of evaluation iterations to skip (useful for resuming a session).
@@ -48,6 +54,7 @@ class SessionRunner:
         task: reference to the object used to specialize the model and that holds task metainformation.
         tbx_histogram_freq: frequency of tbx histogram saves while training (i.e. save every X epochs).
         use_tbx: defines whether to use tensorboardX writers for logging or not.
+        world_size: number of processes in the distributed process group (one if not running distributed).
         writers: map of tbx writers used to save training/evaluation events.
 
     .. seealso::
@@ -74,6 +81,9 @@ class SessionRunner:
         # parse basic training config args
         # use 'trainer' key first for backward compatibility and to prioritize it - most configs will define it as so
         trainer_config = thelper.utils.get_key(["trainer", "runner", "tester"], config)
+        self.rank, self.world_size = 0, 1
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            self.rank, self.world_size = torch.distributed.get_rank(), torch.distributed.get_world_size()
         os.makedirs(session_dir, exist_ok=True)
         logs_dir = os.path.join(session_dir, "logs")
         os.makedirs(logs_dir, exist_ok=True)
@@ -85,7 +95,8 @@ class SessionRunner:
         train_logger_fh.setLevel(logging.NOTSET)
         train_logger_fh.setFormatter(train_logger_format)
         self.logger = thelper.utils.get_class_logger()
-        self.logger.addHandler(train_logger_fh)
+        if self.rank == 0:  # other replicas only log to the console
+            self.logger.addHandler(train_logger_fh)
         self.logger.info(f"created training log for session '{session_name}'")
         self.logger.debug(f"session directory = {os.path.abspath(session_dir)}")
         self.logger.debug(f"logs directory = {os.path.abspath(logs_dir)}")
@@ -112,11 +123,21 @@ class SessionRunner:
         self.logger.debug(f"output subdirectories {'will' if unique_output_dir else 'will not'} have unique names")
         devices_str = thelper.utils.get_key_def(["device", "devices", "train_device"], trainer_config, None)
         self.devices = self._load_devices(devices_str)
+        if self.world_size > 1:
+            self.logger.info(f"running as replica #{self.rank} out of {self.world_size} distributed processes")
+            if len(self.devices) > 1:
+                self.devices = [self.devices[self.rank % len(self.devices)]]  # one device per replica
         self.skip_eval_iter = thelper.utils.get_key_def("skip_eval_iter", trainer_config, 0)
+        prefetch_batches = thelper.utils.get_key_def("prefetch_batches", trainer_config, 0)
+        if isinstance(prefetch_batches, bool) or (isinstance(prefetch_batches, str) and not prefetch_batches.isdigit()):
+            prefetch_batches = int(thelper.utils.str2bool(prefetch_batches))
+        self.prefetch_batches = int(prefetch_batches)
+        assert self.prefetch_batches >= 0, "prefetch batch count should be a positive integer"
 
         # parse and prepare tbx stuff
         self.use_tbx = thelper.utils.str2bool(thelper.utils.get_key_def(["use_tbx", "tbx", "use_tb", "tb", "tensorboard"],
                                                                         trainer_config, False))
+        self.use_tbx = self.use_tbx and self.rank == 0  # only the first replica writes events
         if self.use_tbx:
             try:
                 import tensorboardX
@@ -140,7 +161,8 @@ class SessionRunner:
                 folder_name = f"{cname}-{str(platform.node())}-{timestr}" if unique_output_dir else cname
                 self.output_paths[cname] = os.path.join(output_root_dir, folder_name)
                 self.logger.debug(f"output {cname} directory = {os.path.abspath(self.output_paths[cname])}")
-                os.makedirs(self.output_paths[cname], exist_ok=True)
+                if self.rank == 0:
+                    os.makedirs(self.output_paths[cname], exist_ok=True)
             else:
                 self.output_paths[cname] = None
             self.writers[cname] = None  # will be instantiated only when needed based on above path
@@ -149,6 +171,10 @@ class SessionRunner:
         train_loader, valid_loader, test_loader = loaders
         assert (train_loader or valid_loader or test_loader), "must provide at least one loader with available data"
         self.train_loader, self.valid_loader, self.test_loader = train_loader, valid_loader, test_loader
+        for loader in loaders:
+            # if loaders encode labels, they must use the session task (which might be remapped from the dataset task)
+            if getattr(loader, "label_encoding_task", None) is not None and loader.label_encoding_task is not self.task:
+                loader.set_label_encoding(self.task)
         if train_loader:
             assert "epochs" in trainer_config and int(trainer_config["epochs"]) > 0, "bad trainer config epoch count"
             self.epochs = int(trainer_config["epochs"])
@@ -267,7 +293,19 @@ class SessionRunner:
 
     @staticmethod
     def _upload_model(model, dev):
-        """Uploads a model to a specific device, wrapping it in ``torch.nn.DataParallel`` if needed."""
+        """Uploads a model to a specific device, wrapping it in ``torch.nn.DataParallel`` if needed.
+
+        If a distributed process group with more than one replica is initialized, the model is instead wrapped
+        in ``torch.nn.parallel.DistributedDataParallel`` so that gradients are averaged across replicas.
+        """
+        if torch.distributed.is_available() and torch.distributed.is_initialized() and \
+                torch.distributed.get_world_size() > 1:
+            if isinstance(dev, list):
+                assert len(dev) <= 1, "distributed replicas should each use a single device"
+                if len(dev) == 0:
+                    return torch.nn.parallel.DistributedDataParallel(model.cpu())
+                return torch.nn.parallel.DistributedDataParallel(model.cuda(dev[0]), device_ids=dev)
+            return torch.nn.parallel.DistributedDataParallel(model.to(dev))
         if isinstance(dev, list):
             if len(dev) == 0:
                 return model.cpu()
@@ -279,12 +317,12 @@ class SessionRunner:
             return model.to(dev)
 
     @staticmethod
-    def _move_tensor(tensor, dev, detach=False):
+    def _move_tensor(tensor, dev, detach=False, non_blocking=False):
         """Uploads a tensor to a specific device."""
         if isinstance(tensor, (list, tuple)):
-            return [SessionRunner._move_tensor(t, dev) for t in tensor]
+            return [SessionRunner._move_tensor(t, dev, non_blocking=non_blocking) for t in tensor]
         if isinstance(tensor, dict):
-            return {k: SessionRunner._move_tensor(t, dev) for k, t in tensor.items()}
+            return {k: SessionRunner._move_tensor(t, dev, non_blocking=non_blocking) for k, t in tensor.items()}
         if not isinstance(tensor, torch.Tensor):
             return tensor  # ignored (cannot upload)
         if isinstance(dev, list):
@@ -292,11 +330,146 @@ class SessionRunner:
                 out = tensor.cpu()
             else:
                 # no reason to have multiple devices if not cuda-enabled GPUs
-                out = tensor.cuda(dev[0])
+                out = tensor.cuda(dev[0], non_blocking=non_blocking)
         else:
-            out = tensor.to(dev)
+            out = tensor.to(dev, non_blocking=non_blocking)
         return out.detach() if detach else out
 
+    @staticmethod
+    def _move_input(tensor, dev, loader=None, non_blocking=False):
+        """Uploads a minibatch input tensor to a specific device, and applies the loader's device transforms."""
+        out = SessionRunner._move_tensor(tensor, dev, non_blocking=non_blocking)
+        device_transforms = getattr(loader, "device_transforms", None)
+        return device_transforms(out) if device_transforms is not None else out
+
+    @staticmethod
+    def _get_tensors(tensor):
+        """Returns the flattened list of tensors contained in a (possibly nested) list or dictionary."""
+        if isinstance(tensor, (list, tuple)):
+            return [t for elem in tensor for t in SessionRunner._get_tensors(elem)]
+        if isinstance(tensor, dict):
+            return [t for elem in tensor.values() for t in SessionRunner._get_tensors(elem)]
+        return [tensor] if isinstance(tensor, torch.Tensor) else []
+
+    @staticmethod
+    def _pin_tensor(tensor):
+        """Returns a copy of a (possibly nested) tensor in page-locked memory, for asynchronous uploads."""
+        if isinstance(tensor, (list, tuple)):
+            return [SessionRunner._pin_tensor(t) for t in tensor]
+        if isinstance(tensor, dict):
+            return {k: SessionRunner._pin_tensor(t) for k, t in tensor.items()}
+        if not isinstance(tensor, torch.Tensor) or tensor.is_cuda or tensor.is_pinned():
+            return tensor
+        return tensor.pin_memory()
+
+    def _upload_batch(self, sample, dev, loader, upload_gt=True, non_blocking=False):
+        """Unpacks a minibatch into tensors with ``_to_tensor``, and uploads them to a specific device."""
+        input_val, gt_val = self._to_tensor(sample)
+        input_dev = self._pin_tensor(input_val) if non_blocking else input_val
+        input_dev = self._move_input(input_dev, dev, loader, non_blocking=non_blocking)
+        gt_dev = None
+        if upload_gt:
+            gt_dev = self._pin_tensor(gt_val) if non_blocking else gt_val
+            gt_dev = self._move_tensor(gt_dev, dev, non_blocking=non_blocking)
+        return input_val, gt_val, input_dev, gt_dev
+
+    def _fetch_batch(self, loader_iter, dev, loader, upload_gt, stream):
+        """Fetches, unpacks, and uploads the next minibatch of a loader iterator (used by the prefetching thread)."""
+        try:
+            sample = next(loader_iter)
+        except StopIteration:
+            return None
+        if stream is None:
+            return (sample, *self._upload_batch(sample, dev, loader, upload_gt)), None
+        with torch.cuda.stream(stream):
+            batch = (sample, *self._upload_batch(sample, dev, loader, upload_gt, non_blocking=True))
+            event = torch.cuda.Event()
+            event.record(stream)
+        return batch, event
+
+    @staticmethod
+    def _apply_batch_transforms(batch, loader):
+        """Applies the loader's batch-level transforms to the device tensors of an uploaded minibatch.
+
+        The groundtruth on device is transformed along with the input (or the host groundtruth tensor, if it
+        was not uploaded). If the transforms modify the groundtruth (e.g. label maps cropped along with their
+        images), the host groundtruth is replaced by a copy of the transformed one.
+        """
+        batch_transforms = getattr(loader, "batch_transforms", None)
+        if batch_transforms is None:
+            return batch
+        sample, input_val, gt_val, input_dev, gt_dev = batch
+        target = gt_dev if gt_dev is not None else gt_val
+        if isinstance(input_dev, list):  # augmented sample lists are transformed element-wise
+            targets = target if isinstance(target, list) else [target] * len(input_dev)
+            input_dev, out_targets = map(list, zip(*[batch_transforms(i, t) for i, t in zip(input_dev, targets)]))
+            out_target = out_targets if isinstance(target, list) else target
+        else:
+            input_dev, out_target = batch_transforms(input_dev, target)
+        if out_target is not target:
+            gt_val = SessionRunner._move_tensor(out_target, "cpu")
+            gt_dev = out_target if gt_dev is not None else None
+        return sample, input_val, gt_val, input_dev, gt_dev
+
+    def _iter_batches(self, loader, dev, upload_gt=True):
+        """Yields the minibatches of a loader along with their unpacked tensors and the device copies of these tensors.
+
+        The minibatches are unpacked with ``_to_tensor``, and their input (and optionally groundtruth) tensors are
+        uploaded with ``_move_input`` (and ``_move_tensor``). If ``prefetch_batches`` is set in the trainer config
+        and the loader uses worker processes, the next minibatches are fetched, unpacked, and uploaded (from pinned
+        memory, on a separate CUDA stream) by a helper thread while the current one is being processed. Since the
+        samples are loaded and transformed in the workers, and since the helper thread does not use the RNGs of
+        the main process, the results are the same with or without prefetching. The loader's batch-level
+        transforms (if any) are applied to the uploaded tensors by the main thread, before each minibatch is
+        returned (see ``_apply_batch_transforms``).
+
+        Args:
+            loader: the data loader to iterate over.
+            dev: the target device that tensors should be uploaded to.
+            upload_gt: specifies whether the groundtruth tensors should also be uploaded.
+
+        Returns:
+            A generator of (sample, input, groundtruth, input on device, groundtruth on device) tuples, where the
+            groundtruth on device is ``None`` if ``upload_gt`` is ``False``.
+        """
+        if self.prefetch_batches <= 0 or not getattr(loader, "num_workers", 0):
+            for sample in loader:
+                yield self._apply_batch_transforms((sample, *self._upload_batch(sample, dev, loader, upload_gt)), loader)
+            return
+        device = torch.device("cuda", dev[0]) if isinstance(dev, list) and dev else \
+            torch.device("cpu") if isinstance(dev, list) else torch.device(dev)
+        stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        loader_iter = iter(loader)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        pending = collections.deque()
+        try:
+            for _ in range(self.prefetch_batches):
+                pending.append(executor.submit(self._fetch_batch, loader_iter, dev, loader, upload_gt, stream))
+            while True:
+                result = pending.popleft().result()
+                if result is None:
+                    break
+                pending.append(executor.submit(self._fetch_batch, loader_iter, dev, loader, upload_gt, stream))
+                batch, event = result
+                if event is not None:
+                    current_stream = torch.cuda.current_stream(device)
+                    current_stream.wait_event(event)
+                    for tensor in self._get_tensors(batch[3:]):
+                        if tensor.is_cuda:
+                            tensor.record_stream(current_stream)  # memory is allocated on the prefetch stream
+                yield self._apply_batch_transforms(batch, loader)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _to_input_tensor(input_val):
+        """Converts a minibatch input to a float tensor, unless it is kept in bytes for device-side normalization."""
+        if isinstance(input_val, torch.Tensor) and input_val.dtype in (torch.float32, torch.uint8):
+            return input_val
+        return torch.FloatTensor(input_val)
+
     def _load_optimization(self, model, dev):
         """Instantiates and returns all optimization objects required for training the model."""
         config = self.optimization_config  # for abbrev only
@@ -418,8 +591,32 @@ class SessionRunner:
         if set_name == "train":
             self.current_iter += 1
 
+    def _reduce_metric_vals(self, metric_vals):
+        """Averages scalar metric values across distributed replicas, returning other values as-is.
+
+        Since the distributed samplers give the same number of samples to each replica, averaging the per-replica
+        values of mean-based metrics (e.g. accuracy or loss) gives their global value. This function must be called
+        by all replicas at the same time, and with the same metric names.
+        """
+        if self.world_size == 1 or not metric_vals:
+            return metric_vals
+        names = sorted(metric_vals.keys())
+        is_scalar = [isinstance(metric_vals[name], (int, float, np.number)) and not isinstance(metric_vals[name], bool)
+                     for name in names]
+        dev = torch.device("cuda", self.devices[0]) if torch.distributed.get_backend() == "nccl" else "cpu"
+        sums = torch.zeros((2, len(names)), dtype=torch.float64, device=dev)  # values + contributing replica counts
+        for idx, name in enumerate(names):
+            if is_scalar[idx]:
+                sums[0, idx], sums[1, idx] = float(metric_vals[name]), 1.0
+        torch.distributed.all_reduce(sums)
+        sums = sums.cpu()
+        return {name: (sums[0, idx] / sums[1, idx]).item() if is_scalar[idx] else metric_vals[name]
+                for idx, name in enumerate(names)}
+
     def _write_data(self, data, writer_prefix, file_suffix, writer, output_path, idx=None):
         """Writes a generic chunk of data passed as a dictionary to the specified output path."""
+        if self.rank != 0:
+            return  # only the first replica writes outputs
         os.makedirs(output_path, exist_ok=True)
         assert isinstance(data, dict) and all([isinstance(key, str) for key in data]), \
             "unexpected data chunk formatting (should be dict with str-based keys)"
@@ -461,6 +658,8 @@ class SessionRunner:
 
     def _write_metrics_data(self, epoch, metrics, tbx_writer, output_path, loss=None, optimizer=None, use_suffix=True):
         """Writes the cumulative evaluation result of all metrics using a specific writer."""
+        if self.rank != 0:
+            return  # only the first replica writes outputs
         os.makedirs(output_path, exist_ok=True)
         if tbx_writer is not None:
             if loss is not None:
@@ -491,6 +690,8 @@ class SessionRunner:
     def _save(self, epoch, iter, optimizer, scheduler, save_best=False):
         """Saves a session checkpoint containing all the information required to resume training."""
         # logically, this should only be called during training (i.e. with a valid optimizer)
+        if self.rank != 0:
+            return  # all replicas hold the same model state, only the first one writes checkpoints
         log_stamp = thelper.utils.get_log_stamp()
         # the saved state below should be kept compatible with the one in thelper.cli.export_model
         curr_state = {
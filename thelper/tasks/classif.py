@@ -49,8 +49,10 @@ class Classification(Task, ClassNamesHandler):
 
     def get_class_sizes(self, samples):
         """Given a list of samples, returns a map of sample counts for each class label."""
-        class_idxs = self.get_class_sample_map(samples)
-        return {class_name: len(class_idxs[class_name]) for class_name in class_idxs}
+        assert samples is not None and len(samples) > 0, "invalid sample list "
+        labels = self.get_class_label_array(samples)
+        counts = np.bincount(labels[labels >= 0], minlength=len(self.class_names))
+        return {class_name: int(count) for class_name, count in zip(self.class_names, counts)}
 
     def get_class_sample_map(self, samples, unset_key=None):
         """Splits a list of samples based on their labels into a map of sample lists.
@@ -69,34 +71,107 @@ class Classification(Task, ClassNamesHandler):
             A dictionary that maps each class label to its corresponding list of samples.
         """
         assert samples is not None and len(samples) > 0, "invalid sample list "
-        sample_idxs = {class_name: [] for class_name in self.class_names}
         import collections
         if unset_key is not None:
             assert isinstance(unset_key, collections.abc.Hashable), "unset class name key should be hashable"
-            assert unset_key not in sample_idxs, "unset class name key cannot already be in class names list"
-            sample_idxs[unset_key] = []
-        for sample_idx, sample in enumerate(samples):
-            if self.gt_key is None or self.gt_key not in sample:
-                if unset_key is not None:
-                    class_name = unset_key
-                else:
-                    continue
-            else:
-                class_name = sample[self.gt_key]
-                assert isinstance(class_name, (str, int, np.ndarray, torch.Tensor)) and thelper.utils.is_scalar(class_name), \
-                    "unexpected sample label type (need scalar, string or int)"
-                if isinstance(class_name, str):
-                    assert class_name in self.class_names, f"label '{class_name}' not found in original task class names list"
-                else:
-                    if isinstance(class_name, torch.Tensor):
-                        class_name = class_name.item()
-                    # dataset must already be using indices, we will forgive this...
-                    # (this is pretty much always the case for torchvision datasets)
-                    assert 0 <= class_name < len(self.class_names), "class name given as out-of-range index"
-                    class_name = self.class_names[class_name]
-            sample_idxs[class_name].append(sample_idx)
+            assert unset_key not in self.class_names, "unset class name key cannot already be in class names list"
+        labels = self.get_class_label_array(samples)
+        class_idxs = self.split_class_label_array(labels)
+        sample_idxs = {class_name: idxs.tolist() for class_name, idxs in zip(self.class_names, class_idxs)}
+        if unset_key is not None:
+            sample_idxs[unset_key] = class_idxs[-1].tolist()
         return sample_idxs
 
+    def get_class_label_array(self, samples):
+        """Returns the array of class indices (with ``-1`` for unlabeled samples) for a list of samples.
+
+        The label (gt) values can be class names or class indices. If a dataset parser implementing the
+        label-only access protocol is given (see :meth:`thelper.data.parsers.Dataset.get_label_array`), its
+        labels are used directly without loading any sample. For columnar sample stores (see
+        :class:`thelper.data.parsers.ColumnarSamples`), the labels are converted in a vectorized way
+        without rebuilding the sample dictionaries.
+
+        Args:
+            samples: the samples to parse, where each sample is provided as a dictionary.
+
+        Returns:
+            A 1-dim ``int64`` array with one class index per sample.
+        """
+        if hasattr(samples, "get_label_array"):
+            labels = samples.get_label_array(self)
+            if labels is not None:
+                return labels
+        if self.gt_key is not None and hasattr(samples, "column") and hasattr(samples, "mask") \
+                and self.gt_key in samples.keys:
+            return self.get_class_index_array(samples.column(self.gt_key), samples.mask(self.gt_key))
+        return self.get_class_index_array([sample[self.gt_key] if self.gt_key is not None and self.gt_key in sample
+                                           else None for sample in samples])
+
+    def get_class_index_array(self, labels, mask=None):
+        """Returns the array of class indices (with ``-1`` for unset labels) for a list of label values.
+
+        Args:
+            labels: list or array of label values, given as class names or class indices. ``None``
+                values are considered unset.
+            mask: optional boolean array that flags the label values that are set.
+
+        Returns:
+            A 1-dim ``int64`` array with one class index per label value.
+        """
+        if isinstance(labels, torch.Tensor):
+            labels = labels.cpu().numpy()
+        if isinstance(labels, np.ndarray) and labels.dtype.kind in "Uiu":
+            return self._get_class_index_array(labels.reshape(-1), mask)
+        class_idxs = np.full(len(labels), -1, dtype=np.int64)
+        for label_idx, class_name in enumerate(labels):
+            if class_name is None or (mask is not None and not mask[label_idx]):
+                continue
+            assert isinstance(class_name, (str, int, np.integer, np.ndarray, torch.Tensor)) and thelper.utils.is_scalar(class_name), \
+                "unexpected sample label type (need scalar, string or int)"
+            if isinstance(class_name, str):
+                assert class_name in self.class_indices, f"label '{class_name}' not found in original task class names list"
+                class_idxs[label_idx] = self.class_indices[class_name]
+            else:
+                if isinstance(class_name, (np.ndarray, torch.Tensor)):
+                    class_name = class_name.item()
+                # dataset must already be using indices, we will forgive this...
+                # (this is pretty much always the case for torchvision datasets)
+                assert 0 <= class_name < len(self.class_names), "class name given as out-of-range index"
+                class_idxs[label_idx] = class_name
+        return class_idxs
+
+    def _get_class_index_array(self, values, mask=None):
+        """Returns the array of class indices for an array of label names or indices (vectorized)."""
+        if values.dtype.kind == "U":
+            uniq_values, inv_idxs = np.unique(values, return_inverse=True)
+            inv_idxs = inv_idxs.reshape(-1)
+            uniq_labels = np.full(len(uniq_values), -1, dtype=np.int64)
+            used_idxs = np.unique(inv_idxs if mask is None else inv_idxs[mask])
+            for uniq_idx in used_idxs.tolist():
+                class_name = str(uniq_values[uniq_idx])
+                assert class_name in self.class_indices, f"label '{class_name}' not found in original task class names list"
+                uniq_labels[uniq_idx] = self.class_indices[class_name]
+            labels = uniq_labels[inv_idxs]
+        else:
+            labels = values.astype(np.int64)
+            used_labels = labels if mask is None else labels[mask]
+            assert len(used_labels) == 0 or (used_labels.min() >= 0 and used_labels.max() < len(self.class_names)), \
+                "class name given as out-of-range index"
+        if mask is not None:
+            labels[~mask] = -1
+        return labels
+
+    def split_class_label_array(self, labels):
+        """Splits an array of class indices into a list of sample index arrays, one per class.
+
+        The returned list contains one (sorted) array of sample indices per class name, followed by an
+        array for the unlabeled samples (i.e. those with a ``-1`` label).
+        """
+        labels = np.where(labels < 0, len(self.class_names), labels)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=len(self.class_names) + 1)
+        return np.split(order, np.cumsum(counts)[:-1])
+
     def check_compat(self, task, exact=False):
         # type: (Classification, Optional[bool]) -> bool
         """Returns whether the current task is compatible with the provided one or not.
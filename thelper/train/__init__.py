@@ -16,5 +16,7 @@ from thelper.train.utils import ConfusionMatrix  # noqa: F401
 from thelper.train.utils import DetectLogger  # noqa: F401
 from thelper.train.utils import create_consumers  # noqa: F401
 from thelper.train.utils import create_trainer  # noqa: F401
+from thelper.train.utils import get_distributed_config  # noqa: F401
+from thelper.train.utils import launch_distributed  # noqa: F401
 
 logger = logging.getLogger("thelper.train")
@@ -43,6 +43,12 @@ class Trainer(SessionRunner):
     - ``save_raw`` (optional, default=True): specifies whether to save raw types or thelper objects in checkpoints.
     - ``use_tbx`` (optional, default=False): defines whether to use tensorboardX writers for logging or not.
     - ``device`` (optional): specifies which device to train/evaluate the model on (default=all available).
+    - ``prefetch_batches`` (optional, default=0): number of minibatches to fetch, unpack, and upload to the device
+      ahead of time in a helper thread (and CUDA stream) while the current minibatch is being processed. This only
+      applies to data loaders that use worker processes, and it does not change the results.
+    - ``distributed`` (optional): number of processes (or dictionary of parameters) to use for multi-process
+      data-parallel training; see :func:`thelper.train.utils.get_distributed_config` for more information. In
+      this mode, scalar metrics are averaged across processes, and only the first process writes outputs.
     - ``metrics``: list of metrics to instantiate and update during training/evaluation; see related loading function for
       more information.
     - ``monitor``: specifies the name of the metric that should be monitored on the validation set for model improvement.
@@ -171,7 +177,8 @@ class Trainer(SessionRunner):
                         metric_anti_goal = thelper.optim.Metric.maximize \
                             if metric.goal == thelper.optim.Metric.minimize \
                             else thelper.optim.Metric.minimize
-                        metric_val = metric.eval() if self.current_epoch > 0 else metric_anti_goal
+                        metric_val = self._reduce_metric_vals({"val": metric.eval()})["val"] \
+                            if self.current_epoch > 0 else metric_anti_goal
                         scheduler.step(metrics=metric_val, epoch=self.current_epoch)
                 else:
                     scheduler.step(epoch=self.current_epoch)
@@ -197,11 +204,16 @@ class Trainer(SessionRunner):
                 self.train_loader.set_epoch(self.current_epoch)
             latest_loss = self.train_epoch(model, self.current_epoch, self.devices, loss, optimizer,
                                            self.train_loader, self.train_metrics, self.output_paths["train"])
+            latest_loss = self._reduce_metric_vals({"loss": latest_loss})["loss"]
+            if self.current_epoch + 1 < self.epochs and \
+                    hasattr(self.train_loader, "prefetch") and callable(self.train_loader.prefetch):
+                self.train_loader.prefetch()  # next epoch's first batches will load while we validate (if possible)
             self._write_metrics_data(self.current_epoch, self.train_metrics,
                                      self.writers["train"], self.output_paths["train"],
                                      loss=latest_loss, optimizer=optimizer)
-            train_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.train_metrics.items()
-                                 if isinstance(metric, thelper.optim.metrics.Metric)}
+            train_metric_vals = self._reduce_metric_vals({
+                metric_name: metric.eval() for metric_name, metric in self.train_metrics.items()
+                if isinstance(metric, thelper.optim.metrics.Metric)})
             result = {"train/loss": latest_loss, "train/metrics": train_metric_vals}
             monitor_type_key = "train/metrics"  # if we cannot run validation, will monitor progression on training metrics
             if self.valid_loader:
@@ -216,8 +228,9 @@ class Trainer(SessionRunner):
                                 self.valid_metrics, self.output_paths["valid"])
                 self._write_metrics_data(self.current_epoch, self.valid_metrics,
                                          self.writers["valid"], self.output_paths["valid"])
-                valid_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
-                                     if isinstance(metric, thelper.optim.metrics.Metric)}
+                valid_metric_vals = self._reduce_metric_vals({
+                    metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
+                    if isinstance(metric, thelper.optim.metrics.Metric)})
                 result = {**result, "valid/metrics": valid_metric_vals}
                 monitor_type_key = "valid/metrics"  # since validation is available, use that to monitor progression
                 uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
@@ -281,8 +294,9 @@ class Trainer(SessionRunner):
                             self.test_metrics, self.output_paths["test"])
             self._write_metrics_data(self.current_epoch, self.test_metrics,
                                      self.writers["test"], self.output_paths["test"], use_suffix=False)
-            test_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.test_metrics.items()
-                                if isinstance(metric, thelper.optim.metrics.Metric)}
+            test_metric_vals = self._reduce_metric_vals({
+                metric_name: metric.eval() for metric_name, metric in self.test_metrics.items()
+                if isinstance(metric, thelper.optim.metrics.Metric)})
             result = {**result, **test_metric_vals}
             output_group = "test/metrics"
             uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
@@ -302,8 +316,9 @@ class Trainer(SessionRunner):
                             self.valid_metrics, self.output_paths["valid"])
             self._write_metrics_data(self.current_epoch, self.valid_metrics,
                                      self.writers["valid"], self.output_paths["valid"], use_suffix=False)
-            valid_metric_vals = {metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
-                                 if isinstance(metric, thelper.optim.metrics.Metric)}
+            valid_metric_vals = self._reduce_metric_vals({
+                metric_name: metric.eval() for metric_name, metric in self.valid_metrics.items()
+                if isinstance(metric, thelper.optim.metrics.Metric)})
             result = {**result, **valid_metric_vals}
             output_group = "valid/metrics"
             uploader = functools.partial(self._move_tensor, dev=self.devices, detach=True)
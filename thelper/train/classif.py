@@ -2,6 +2,7 @@
 import logging
 from typing import AnyStr  # noqa: F401
 
+import numpy as np
 import torch
 import torch.optim
 
@@ -55,32 +56,19 @@ class ImageClassifTrainer(Trainer):
                                                                       self.task.gt_key: label[idx]})
             else:
                 for idx in range(len(input_val)):
-                    input_val[idx] = torch.FloatTensor(input_val[idx])
+                    input_val[idx] = self._to_input_tensor(input_val[idx])
         else:
-            input_val = torch.FloatTensor(input_val)
+            input_val = self._to_input_tensor(input_val)
             if self.task.gt_key in sample and sample[self.task.gt_key] is not None:
                 label = sample[self.task.gt_key]
                 if isinstance(label, torch.Tensor) and label.numel() == input_val.shape[0] \
                         and label.dtype == torch.int64:
-                    label_idx = label  # shortcut with less checks (dataset is already using tensor'd indices)
+                    label_idx = label  # shortcut with less checks (loader or dataset is already using tensor'd indices)
                 else:
-                    label_idx = label_idx or list()
-                    for class_name in label:
-                        assert isinstance(class_name, (int, torch.Tensor, str)), \
-                            "expected label to be a name (string) or index (int)"
-                        if isinstance(class_name, (int, torch.Tensor)):
-                            if isinstance(class_name, torch.Tensor):
-                                assert torch.numel(class_name) == 1, "unexpected scalar label, got vector"
-                                class_name = class_name.item()
-                            # dataset must already be using indices, we will forgive this...
-                            assert 0 <= class_name < len(self.task.class_names), \
-                                "class name given as out-of-range index (%d) for class list" % class_name
-                            label_idx.append(class_name)
-                        else:
-                            assert class_name in self.task.class_names, \
-                                "got unexpected label '%s' for a sample (unknown class)" % class_name
-                            label_idx.append(self.task.class_indices[class_name])
-                    label_idx = torch.LongTensor(label_idx)
+                    if isinstance(label, (list, tuple)) and all([isinstance(class_name, str) for class_name in label]):
+                        label = np.asarray(label)  # allows the vectorized lookup of class names
+                    label_idx = torch.from_numpy(self.task.get_class_index_array(label))
+                    assert (label_idx >= 0).all(), "expected label to be a name (string) or index (int)"
         return input_val, label_idx
 
     def train_epoch(self, model, epoch, dev, loss, optimizer, loader, metrics, output_path):
@@ -103,8 +91,7 @@ class ImageClassifTrainer(Trainer):
         epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            input_val, label = self._to_tensor(sample)
+        for idx, (sample, input_val, label, input_dev, label_dev) in enumerate(self._iter_batches(loader, dev)):
             assert label is not None, "groundtruth required when training a model"
             optimizer.zero_grad()
             if isinstance(input_val, list):  # training samples got augmented, we need to backprop in multiple steps
@@ -120,8 +107,8 @@ class ImageClassifTrainer(Trainer):
                 iter_pred = None
                 augs_count = len(input_val)
                 for input_idx in range(augs_count):
-                    aug_pred = model(self._move_tensor(input_val[input_idx], dev))
-                    aug_loss = loss(aug_pred, self._move_tensor(label[input_idx], dev))
+                    aug_pred = model(input_dev[input_idx])
+                    aug_loss = loss(aug_pred, label_dev[input_idx])
                     aug_loss.backward()  # test backprop all at once? might not fit in memory...
                     if iter_pred is None:
                         iter_loss = aug_loss.clone().detach()
@@ -132,8 +119,8 @@ class ImageClassifTrainer(Trainer):
                 iter_loss /= augs_count
                 label = torch.cat(label, dim=0)
             else:  # this is the default (simple) case where we generate predictions without augmentations
-                iter_pred = model(self._move_tensor(input_val, dev))
-                iter_loss = loss(iter_pred, self._move_tensor(label, dev))
+                iter_pred = model(input_dev)
+                iter_loss = loss(iter_pred, label_dev)
                 iter_loss.backward()
             optimizer.step()
             iter_pred_cpu = self._move_tensor(iter_pred, dev="cpu", detach=True)
@@ -164,10 +151,9 @@ class ImageClassifTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, (sample, input_val, label, input_dev, _) in enumerate(self._iter_batches(loader, dev, upload_gt=False)):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                input_val, label = self._to_tensor(sample)
                 if isinstance(input_val, list):  # evaluation samples got augmented, we need to get the mean prediction
                     assert input_val, "cannot eval with empty post-augment sample lists"
                     assert isinstance(label, list) and len(label) == len(input_val), \
@@ -178,14 +164,14 @@ class ImageClassifTrainer(Trainer):
                     label = label[0]  # since all identical, just pick the first one and pretend its the only one
                     preds = None
                     for input_idx in range(len(input_val)):
-                        pred = model(self._move_tensor(input_val[input_idx], dev))
+                        pred = model(input_dev[input_idx])
                         if preds is None:
                             preds = torch.unsqueeze(pred.clone(), 0)
                         else:
                             preds = torch.cat((preds, torch.unsqueeze(pred, 0)), 0)
                     pred = torch.mean(preds, dim=0)
                 else:  # this is the default (simple) case where we generate predictions without augmentations
-                    pred = model(self._move_tensor(input_val, dev))
+                    pred = model(input_dev)
                 pred_cpu = self._move_tensor(pred, dev="cpu", detach=True)
                 label_cpu = self._move_tensor(label, dev="cpu", detach=True)
                 for metric in metrics.values():
@@ -129,13 +129,10 @@ class ObjDetectTrainer(Trainer):
         epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            images, targets = self._to_tensor(sample)
+        for idx, (sample, images, targets, images_dev, targets_dev) in enumerate(self._iter_batches(loader, dev)):
             assert targets is not None and not any([not bset for bset in targets]), \
                 "groundtruth required when training a model"
             optimizer.zero_grad()
-            targets_dev = self._move_tensor(targets, dev)
-            images_dev = self._move_tensor(images, dev)
             if isinstance(model, thelper.nn.utils.ExternalModule):
                 model = model.model  # temporarily unwrap to simplify code below
             assert isinstance(model, torchvision.models.detection.generalized_rcnn.GeneralizedRCNN), \
@@ -184,11 +181,10 @@ class ObjDetectTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, (sample, images, targets, images_dev, _) in enumerate(self._iter_batches(loader, dev, upload_gt=False)):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                images, targets = self._to_tensor(sample)
-                pred = model(self._move_tensor(images, dev))
+                pred = model(images_dev)
                 pred = self._from_tensor(pred, sample)
                 target_bboxes = [target["refs"] for target in targets]
                 # pack image list back into 4d tensor
@@ -89,16 +89,14 @@ class RegressionTrainer(Trainer):
         epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            input_val, target = self._to_tensor(sample)
+        for idx, (sample, input_val, target, input_dev, target_dev) in enumerate(self._iter_batches(loader, dev)):
             # todo: add support to fraction samples that are too big for a single iteration
             # (e.g. when batching non-image data that would be too inefficient one sample at a time)
             assert target is not None, "groundtruth required when training a model"
             assert not isinstance(input_val, list), "missing regr trainer support for duped minibatches"
             optimizer.zero_grad()
-            target = self._move_tensor(target, dev)
-            iter_pred = model(self._move_tensor(input_val, dev))
-            iter_loss = loss(iter_pred, target.float())
+            iter_pred = model(input_dev)
+            iter_loss = loss(iter_pred, target_dev.float())
             iter_loss.backward()
             optimizer.step()
             iter_pred_cpu = self._move_tensor(iter_pred, dev="cpu", detach=True)
@@ -129,12 +127,11 @@ class RegressionTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, (sample, input_val, target, input_dev, _) in enumerate(self._iter_batches(loader, dev, upload_gt=False)):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                input_val, target = self._to_tensor(sample)
                 assert not isinstance(input_val, list), "missing regr trainer support for duped minibatches"
-                pred = model(self._move_tensor(input_val, dev))
+                pred = model(input_dev)
                 pred_cpu = self._move_tensor(pred, dev="cpu", detach=True)
                 target_cpu = self._move_tensor(target, dev="cpu", detach=True)
                 for metric in metrics.values():
@@ -58,13 +58,14 @@ class ImageSegmTrainer(Trainer):
                                                                       self.task.gt_key: label_map[idx]})
             else:
                 for idx in range(len(input_val)):
-                    input_val[idx] = torch.FloatTensor(input_val[idx])
+                    input_val[idx] = self._to_input_tensor(input_val[idx])
         else:
-            input_val = torch.FloatTensor(input_val)
+            input_val = self._to_input_tensor(input_val)
             if self.task.gt_key in sample and sample[self.task.gt_key] is not None:
                 label_map = sample[self.task.gt_key]
                 assert not isinstance(label_map, list), "unexpected label map type"
-                label_map = label_map.long()  # long instead of bytes to support large/negative values for dontcare
+                if label_map.dtype != torch.int64:  # already converted if the loader encodes labels
+                    label_map = label_map.long()  # long instead of bytes to support large/negative values for dontcare
         return input_val, label_map
 
     def train_epoch(self, model, epoch, dev, loss, optimizer, loader, metrics, output_path):
@@ -87,8 +88,7 @@ class ImageSegmTrainer(Trainer):
         epoch_loss = 0
         epoch_size = len(loader)
         self.logger.debug("fetching data loader samples...")
-        for idx, sample in enumerate(loader):
-            input_val, label_map = self._to_tensor(sample)
+        for idx, (sample, input_val, label_map, input_dev, label_map_dev) in enumerate(self._iter_batches(loader, dev)):
             assert label_map is not None, "groundtruth required when training a model"
             optimizer.zero_grad()
             if isinstance(input_val, list):
@@ -104,12 +104,12 @@ class ImageSegmTrainer(Trainer):
                 iter_pred = None
                 augs_count = len(input_val)
                 for aug_idx in range(augs_count):
-                    aug_pred = model(self._move_tensor(input_val[aug_idx], dev))
+                    aug_pred = model(input_dev[aug_idx])
                     if isinstance(aug_pred, dict):
                         aug_pred = aug_pred[self.output_pred_key]
                     if self.scale_preds:
-                        aug_pred = torch.nn.functional.interpolate(aug_pred, size=input_val[aug_idx].shape[-2:], mode="bilinear")
-                    aug_loss = loss(aug_pred, label_map[aug_idx].long())
+                        aug_pred = torch.nn.functional.interpolate(aug_pred, size=input_dev[aug_idx].shape[-2:], mode="bilinear")
+                    aug_loss = loss(aug_pred, label_map_dev[aug_idx].long())
                     aug_loss.backward()  # test backprop all at once? might not fit in memory...
                     if iter_pred is None:
                         iter_loss = aug_loss.clone().detach()
@@ -120,12 +120,12 @@ class ImageSegmTrainer(Trainer):
                 iter_loss /= augs_count
                 label_map = torch.cat(label_map, dim=0)
             else:  # this is the default (simple) case where we generate predictions without augmentations
-                iter_pred = model(self._move_tensor(input_val, dev))
+                iter_pred = model(input_dev)
                 if isinstance(iter_pred, dict):
                     iter_pred = iter_pred[self.output_pred_key]
                 if self.scale_preds:
-                    iter_pred = torch.nn.functional.interpolate(iter_pred, size=input_val.shape[-2:], mode="bilinear")
-                iter_loss = loss(iter_pred, self._move_tensor(label_map, dev).long())
+                    iter_pred = torch.nn.functional.interpolate(iter_pred, size=input_dev.shape[-2:], mode="bilinear")
+                iter_loss = loss(iter_pred, label_map_dev.long())
                 iter_loss.backward()
             optimizer.step()
             iter_pred_cpu = self._move_tensor(iter_pred, dev="cpu", detach=True)
@@ -156,10 +156,9 @@ class ImageSegmTrainer(Trainer):
         with torch.no_grad():
             epoch_size = len(loader)
             self.logger.debug("fetching data loader samples...")
-            for idx, sample in enumerate(loader):
+            for idx, (sample, input_val, label_map, input_dev, _) in enumerate(self._iter_batches(loader, dev, upload_gt=False)):
                 if idx < self.skip_eval_iter:
                     continue  # skip until previous iter count (if set externally; no effect otherwise)
-                input_val, label_map = self._to_tensor(sample)
                 if isinstance(input_val, list):
                     # evaluation samples got augmented, we need to get the mean prediction
                     assert input_val, "cannot eval with empty post-augment sample lists"
@@ -171,7 +170,7 @@ class ImageSegmTrainer(Trainer):
                     label_map = label_map[0]  # since all identical, just pick the first one and pretend its the only one
                     preds = None
                     for input_idx in range(len(input_val)):
-                        pred = model(self._move_tensor(input_val[input_idx], dev))
+                        pred = model(input_dev[input_idx])
                         if isinstance(pred, dict):
                             pred = pred[self.output_pred_key]
                         if preds is None:
@@ -180,11 +179,12 @@ class ImageSegmTrainer(Trainer):
                             preds = torch.cat((preds, torch.unsqueeze(pred, 0)), 0)
                     pred = torch.mean(preds, dim=0)
                 else:  # this is the default (simple) case where we generate predictions without augmentations
-                    pred = model(self._move_tensor(input_val, dev))
+                    pred = model(input_dev)
                     if isinstance(pred, dict):
                         pred = pred[self.output_pred_key]
                 if self.scale_preds:
-                    pred = torch.nn.functional.interpolate(pred, size=input_val.shape[-2:], mode="bilinear")
+                    pred = torch.nn.functional.interpolate(pred, size=input_dev[0].shape[-2:] if isinstance(input_dev, list)
+                                                           else input_dev.shape[-2:], mode="bilinear")
                 pred_cpu = self._move_tensor(pred, dev="cpu", detach=True)
                 label_map_cpu = self._move_tensor(label_map, dev="cpu", detach=True)
                 for metric in metrics.values():
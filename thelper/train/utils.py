@@ -8,12 +8,15 @@ training. See :mod:`thelper.optim.metrics` for more information on metrics.
 import json
 import logging
 import os
+import socket
 from typing import Any, AnyStr, Dict, List, Optional, Union  # noqa: F401
 
 import cv2 as cv
 import numpy as np
 import sklearn.metrics
 import torch
+import torch.distributed
+import torch.multiprocessing
 
 import thelper.concepts
 import thelper.ifaces
@@ -956,6 +959,110 @@ def create_trainer(session_name,    # type: AnyStr
     return trainer_type(session_name, save_dir, model, task, loaders, config, ckptdata=ckptdata)
 
 
+def get_distributed_config(config):
+    """Returns the multi-process data-parallel training parameters of a session, or ``None`` if it is not distributed.
+
+    These parameters are parsed from the ``distributed`` field of the trainer configuration, which can either be the
+    number of processes to launch, or a dictionary with the following fields:
+
+    - ``nprocs`` (mandatory): number of worker processes to launch (i.e. the world size of the process group).
+    - ``backend`` (optional, default="gloo"): name of the ``torch.distributed`` backend to use.
+    - ``init_method`` (optional): URL used to initialize the process group; by default, a free local TCP port is used.
+    - ``threads`` (optional): number of intra-op threads to use in each worker; by default, the available CPU cores
+      are split evenly across workers.
+
+    Example configuration file::
+
+        # ...
+        "trainer": {
+            # ...
+            "device": "cpu",
+            "distributed": {
+                "nprocs": 8,
+                "backend": "gloo",
+                "threads": 8
+            },
+            # ...
+        },
+        # ...
+
+    .. seealso::
+        | :func:`thelper.train.utils.launch_distributed`
+        | :class:`thelper.data.samplers.DistributedSubsetRandomSampler`
+    """
+    trainer_config = thelper.utils.get_key_def(["trainer", "runner", "tester"], config, {})
+    dist_config = thelper.utils.get_key_def("distributed", trainer_config, None)
+    if not dist_config:
+        return None
+    if isinstance(dist_config, int) and not isinstance(dist_config, bool):
+        dist_config = {"nprocs": dist_config}
+    assert isinstance(dist_config, dict), "distributed config should be a process count or a dictionary"
+    nprocs = int(thelper.utils.get_key(["nprocs", "world_size"], dist_config, msg="missing distributed process count"))
+    assert nprocs > 0, "distributed process count should be strictly positive integer"
+    if nprocs == 1:
+        return None
+    backend = thelper.utils.get_key_def("backend", dist_config, "gloo")
+    assert torch.distributed.is_available() and torch.distributed.is_backend_available(backend), \
+        f"torch.distributed backend '{backend}' is not available"
+    threads = thelper.utils.get_key_def(["threads", "nb_threads"], dist_config, None)
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // nprocs)
+    assert isinstance(threads, int) and threads > 0, "distributed worker thread count should be strictly positive integer"
+    return {
+        "nprocs": nprocs,
+        "backend": backend,
+        "init_method": thelper.utils.get_key_def("init_method", dist_config, None),
+        "threads": threads,
+    }
+
+
+def launch_distributed(func, dist_config, *args):
+    """Runs a function in several worker processes joined in a process group, and returns the output of rank 0.
+
+    Each worker initializes the default process group before calling the function with the provided arguments, so
+    the loaders and trainers it creates will automatically shard their data and synchronize their gradients. The
+    function and its arguments must be picklable, as workers are started using the 'spawn' method.
+
+    Args:
+        func: the function to call in each worker process (e.g. the body of a training session).
+        dist_config: distributed training parameters, as returned by :func:`thelper.train.utils.get_distributed_config`.
+        args: the arguments to pass to the function.
+
+    Returns:
+        The value returned by the function in the process with rank zero.
+    """
+    init_method = dist_config["init_method"]
+    if init_method is None:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            init_method = f"tcp://127.0.0.1:{sock.getsockname()[1]}"
+    logger.info(f"launching {dist_config['nprocs']} distributed workers with backend '{dist_config['backend']}'")
+    output_queue = torch.multiprocessing.get_context("spawn").SimpleQueue()
+    context = torch.multiprocessing.spawn(_distributed_worker, nprocs=dist_config["nprocs"], join=False,
+                                          args=(dist_config, init_method, output_queue, func, args))
+    outputs = None
+    while not context.join(timeout=1):
+        # the queue must be emptied while waiting, as large outputs might not fit in its pipe buffer
+        if not output_queue.empty():
+            outputs = output_queue.get()
+    if not output_queue.empty():
+        outputs = output_queue.get()
+    return outputs
+
+
+def _distributed_worker(rank, dist_config, init_method, output_queue, func, args):
+    """Worker process entrypoint used by :func:`thelper.train.utils.launch_distributed`."""
+    torch.set_num_threads(dist_config["threads"])
+    torch.distributed.init_process_group(dist_config["backend"], init_method=init_method,
+                                         world_size=dist_config["nprocs"], rank=rank)
+    try:
+        outputs = func(*args)
+        if rank == 0:
+            output_queue.put(outputs)
+    finally:
+        torch.distributed.destroy_process_group()
+
+
 # noinspection PyUnusedLocal
 def _draw_wrapper(task,         # type: thelper.tasks.utils.Task
                   input,        # type: thelper.typedefs.InputType
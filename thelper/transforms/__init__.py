@@ -6,9 +6,17 @@ augmentation, and normalization of data samples.
 
 import logging
 
+import thelper.transforms.batch  # noqa: F401
 import thelper.transforms.operations  # noqa: F401
 import thelper.transforms.utils  # noqa: F401
 import thelper.transforms.wrappers  # noqa: F401
+from thelper.transforms.batch import BatchColorJitter  # noqa: F401
+from thelper.transforms.batch import BatchCompose  # noqa: F401
+from thelper.transforms.batch import BatchNormalize  # noqa: F401
+from thelper.transforms.batch import BatchRandomAffine  # noqa: F401
+from thelper.transforms.batch import BatchRandomFlip  # noqa: F401
+from thelper.transforms.batch import BatchRandomResizedCrop  # noqa: F401
+from thelper.transforms.batch import DeviceNormalize  # noqa: F401
 from thelper.transforms.composers import Compose  # noqa: F401
 from thelper.transforms.composers import CustomStepCompose  # noqa: F401
 from thelper.transforms.operations import Affine  # noqa: F401
@@ -26,8 +34,11 @@ from thelper.transforms.operations import ToGray  # noqa: F401
 from thelper.transforms.operations import ToNumpy  # noqa: F401
 from thelper.transforms.operations import Transpose  # noqa: F401
 from thelper.transforms.operations import Unsqueeze  # noqa: F401
+from thelper.transforms.utils import get_output_size_hint  # noqa: F401
 from thelper.transforms.utils import load_augments  # noqa: F401
+from thelper.transforms.utils import load_batch_transforms  # noqa: F401
 from thelper.transforms.utils import load_transforms  # noqa: F401
+from thelper.transforms.utils import split_device_transforms  # noqa: F401
 from thelper.transforms.wrappers import AlbumentationsWrapper  # noqa: F401
 from thelper.transforms.wrappers import AugmentorWrapper  # noqa: F401
 from thelper.transforms.wrappers import TransformWrapper  # noqa: F401
@@ -0,0 +1,546 @@
+"""Batch-level transformation operations module.
+
+The operations in this module are applied to collated minibatch tensors instead of
+individual samples, typically by the session runner once the minibatches have been
+uploaded to their compute device. All of them expect their input tensors to have the
+batch dimension first, and process all samples at once with vectorized tensor ops.
+
+Stochastic operations (e.g. :class:`thelper.transforms.batch.BatchRandomFlip`) draw
+different random parameters for each sample of a minibatch from the PyTorch RNG of the
+minibatch's device. These operations are called with an input tensor and an optional
+groundtruth tensor, and they return both: spatial groundtruth tensors (e.g. label maps
+with the same height and width as the input) are warped along with the input tensor.
+
+All important parameters for an operation should also be passed in the
+constructor and exposed in the operation's ``__repr__`` function so that
+external parsers can discover exactly how to reproduce their behavior.
+"""
+
+import logging
+import math
+
+import numpy as np
+import torch
+import torch.nn.functional
+
+import thelper.transforms.operations
+import thelper.utils
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceNormalize:
+    """Applies a series of normalization/reordering operations to minibatch tensors on their device.
+
+    This operation reproduces the behavior of the trailing normalization stages of a sample transformation
+    pipeline (see :func:`thelper.transforms.utils.split_device_transforms`), but on minibatch tensors. This
+    allows data loaders to transport images as ``uint8`` tensors (which are four times smaller than their
+    ``float32`` counterparts), and to convert/normalize them after uploading them to the compute device.
+
+    The supported operations are :class:`thelper.transforms.operations.NormalizeZeroMeanUnitVar` and
+    :class:`thelper.transforms.operations.NormalizeMinMax` (with ``float32`` outputs), which are applied to
+    the last dimension of the tensors, :class:`thelper.transforms.operations.Transpose`, which is applied to
+    the non-batch dimensions of the tensors, and :class:`thelper.transforms.operations.ToNumpy`, which can
+    only reverse the channel order. Consecutive normalization operations are fused into a single scale and
+    offset, so that a typical ``uint8`` HxWxC image minibatch is converted in one multiply-add and a permute.
+
+    Attributes:
+        operations: the list of sample-level operations reproduced by this operation.
+        steps: the list of compiled (fused) tensor operations to apply.
+    """
+
+    def __init__(self, operations):
+        """Validates the sample-level operations to reproduce, and compiles them into tensor operations.
+
+        Args:
+            operations: the list of sample-level operations to reproduce (or their config dictionaries).
+        """
+        assert isinstance(operations, list) and operations, "expected operations to be provided as a non-empty list"
+        if all([isinstance(op, dict) for op in operations]):
+            operations = [thelper.utils.import_class(op["operation"])(
+                **thelper.utils.get_key_def(["params", "param", "parameters", "kwargs"], op, {})) for op in operations]
+        self.operations = operations
+        self.steps = []
+        for op in operations:
+            if isinstance(op, (thelper.transforms.operations.NormalizeZeroMeanUnitVar,
+                               thelper.transforms.operations.NormalizeMinMax)):
+                assert op.out_type == np.float32, "device normalization only supports float32 outputs"
+                if isinstance(op, thelper.transforms.operations.NormalizeZeroMeanUnitVar):
+                    offset, div = op.mean.astype(np.float64), op.std.astype(np.float64)
+                else:
+                    offset, div = op.min.astype(np.float64), op.diff.astype(np.float64)
+                scale, offset = 1 / div, -offset / div
+                if self.steps and self.steps[-1][0] == "affine":  # fuse with the previous normalization
+                    prev_scale, prev_offset = self.steps[-1][1:]
+                    scale, offset = prev_scale * scale, prev_offset * scale + offset
+                    self.steps.pop()
+                self.steps.append(("affine", scale, offset))
+            elif isinstance(op, thelper.transforms.operations.Transpose):
+                self.steps.append(("permute", (0, *[int(axis) + 1 for axis in op.axes])))
+            elif isinstance(op, thelper.transforms.operations.ToNumpy):
+                if op.reorder_bgr:
+                    self.steps.append(("flip",))
+            else:
+                raise AssertionError(f"unsupported device normalization operation: {repr(op)}")
+        self._device_params = {}  # device-specific scale and offset tensors, created on first use
+
+    def __call__(self, tensor):
+        """Converts a minibatch tensor to float32 and normalizes it on its current device.
+
+        Args:
+            tensor: the minibatch tensor to normalize (or a list of such tensors).
+
+        Returns:
+            The normalized minibatch tensor(s), in ``float32`` format.
+        """
+        if isinstance(tensor, (list, tuple)):
+            return [self(t) for t in tensor]
+        assert isinstance(tensor, torch.Tensor), f"sample type should be torch.Tensor (got {type(tensor)})"
+        tensor = tensor.float()
+        for step_idx, step in enumerate(self.steps):
+            if step[0] == "affine":
+                scale, offset = self._get_device_params(step_idx, tensor.device)
+                tensor = torch.addcmul(offset, tensor, scale)
+            elif step[0] == "permute":
+                assert tensor.dim() == len(step[1]), "unexpected minibatch tensor dimension count for transpose"
+                tensor = tensor.permute(*step[1])
+            elif step[0] == "flip":
+                tensor = tensor.flip(-1)
+        return tensor.contiguous()
+
+    def _get_device_params(self, step_idx, device):
+        """Returns the scale and offset tensors of a normalization step on the given device."""
+        key = (step_idx, str(device))
+        if key not in self._device_params:
+            _, scale, offset = self.steps[step_idx]
+            self._device_params[key] = (torch.as_tensor(scale, dtype=torch.float32, device=device),
+                                        torch.as_tensor(offset, dtype=torch.float32, device=device))
+        return self._device_params[key]
+
+    def __getstate__(self):
+        """Returns the state of the operation without its device-specific parameters."""
+        return {**self.__dict__, "_device_params": {}}
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(operations={repr(self.operations)})"
+
+
+def _is_spatial_target(tensor, target):
+    """Returns whether a groundtruth tensor has the same batch size, height, and width as a minibatch input tensor."""
+    return isinstance(target, torch.Tensor) and target.dim() >= 3 and target.shape[0] == tensor.shape[0] and \
+        target.shape[-2:] == tensor.shape[-2:]
+
+
+def _get_apply_mask(count, probability, device):
+    """Returns the boolean mask of samples to transform in a minibatch based on a probability of application."""
+    if probability >= 1:
+        return torch.ones(count, dtype=torch.bool, device=device)
+    return torch.rand(count, device=device) < probability
+
+
+def _uniform(count, low, high, device):
+    """Returns a vector of values sampled uniformly in the ``[low, high)`` range."""
+    return torch.rand(count, device=device) * (high - low) + low
+
+
+def _warp(tensor, theta, size, mode="bilinear", padding_mode="zeros", fill=0):
+    """Resamples a minibatch tensor (N x [C x] H x W) using per-sample affine matrices (N x 2 x 3).
+
+    The matrices map normalized output coordinates to normalized input coordinates (see
+    ``torch.nn.functional.affine_grid``). With the ``zeros`` padding mode, regions outside the input
+    are filled with the given value.
+    """
+    input_dtype, squeeze = tensor.dtype, tensor.dim() == 3
+    tensor = tensor.unsqueeze(1) if squeeze else tensor
+    tensor = tensor.float() - fill if fill else tensor.float()
+    grid = torch.nn.functional.affine_grid(theta.to(device=tensor.device, dtype=torch.float32),
+                                           [tensor.shape[0], tensor.shape[1], size[0], size[1]], align_corners=False)
+    out = torch.nn.functional.grid_sample(tensor, grid, mode=mode, padding_mode=padding_mode, align_corners=False)
+    out = out + fill if fill else out
+    out = out.squeeze(1) if squeeze else out
+    return out.to(input_dtype) if mode == "nearest" else out
+
+
+class BatchCompose:
+    """Composes several batch-level operations together.
+
+    Each operation is called with the input and groundtruth tensors returned by the previous one.
+
+    Attributes:
+        transforms: the list of batch-level operations to apply.
+    """
+
+    def __init__(self, transforms):
+        """Receives the list of operations (or their config dictionaries) to compose.
+
+        Args:
+            transforms: the list of batch-level operations to apply (or their config dictionaries).
+        """
+        assert isinstance(transforms, list) and transforms, "expected transforms to be provided as a non-empty list"
+        if all([isinstance(stage, dict) for stage in transforms]):
+            transforms = [thelper.utils.import_class(stage["operation"])(
+                **thelper.utils.get_key_def(["params", "param", "parameters", "kwargs"], stage, {})) for stage in transforms]
+        self.transforms = transforms
+
+    def __call__(self, tensor, target=None):
+        """Applies the composed operations to a minibatch.
+
+        Args:
+            tensor: the minibatch input tensor to transform.
+            target: the minibatch groundtruth tensor (optional).
+
+        Returns:
+            The transformed input and groundtruth tensors.
+        """
+        for t in self.transforms:
+            tensor, target = t(tensor, target)
+        return tensor, target
+
+    def __getitem__(self, idx):
+        """Returns the idx-th operation wrapped by the composer."""
+        assert 0 <= idx < len(self.transforms), "operation index is out of range"
+        return self.transforms[idx]
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + "(transforms=[\n\t" + \
+            ",\n\t".join([repr(t) for t in self.transforms]) + "\n])"
+
+
+class BatchRandomFlip:
+    """Randomly flips the samples of a minibatch horizontally or vertically.
+
+    The input tensor is expected to be in ``N x C x H x W`` format. Spatial groundtruth tensors
+    (e.g. ``N x H x W`` label maps) are flipped along with their input.
+
+    Attributes:
+        axis: the flip axis, i.e. ``horizontal`` (flips the columns) or ``vertical`` (flips the rows).
+        probability: the probability that each sample will be flipped.
+    """
+
+    def __init__(self, axis="horizontal", probability=0.5):
+        """Validates and copies the flip parameters.
+
+        Args:
+            axis: the flip axis, i.e. ``horizontal`` (flips the columns) or ``vertical`` (flips the rows).
+            probability: the probability that each sample will be flipped.
+        """
+        assert axis in ["horizontal", "vertical"], "flip axis should be 'horizontal' or 'vertical'"
+        assert 0 <= probability <= 1, "invalid probability value (range is [0,1]"
+        self.axis = axis
+        self.probability = probability
+
+    def __call__(self, tensor, target=None):
+        """Flips the samples of a minibatch (and their spatial groundtruth) using random per-sample decisions.
+
+        Args:
+            tensor: the minibatch input tensor to transform.
+            target: the minibatch groundtruth tensor (optional).
+
+        Returns:
+            The transformed input and groundtruth tensors.
+        """
+        assert isinstance(tensor, torch.Tensor) and tensor.dim() == 4, "input should be a N x C x H x W tensor"
+        dim = -1 if self.axis == "horizontal" else -2
+        mask = _get_apply_mask(tensor.shape[0], self.probability, tensor.device)
+        if _is_spatial_target(tensor, target):
+            target_mask = mask.to(target.device).view(-1, *([1] * (target.dim() - 1)))
+            target = torch.where(target_mask, target.flip(dim), target)
+        tensor = torch.where(mask.view(-1, 1, 1, 1), tensor.flip(dim), tensor)
+        return tensor, target
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(axis={repr(self.axis)}, probability={repr(self.probability)})"
+
+
+class BatchRandomResizedCrop:
+    """Crops random regions of the samples of a minibatch and resizes them to a fixed size.
+
+    This operation mimics ``torchvision.transforms.RandomResizedCrop``, but the crop regions of all
+    samples are resampled at once with bilinear interpolation. Crop regions that do not fit in the
+    image (based on the drawn scale and aspect ratio) are clipped to its borders. The input tensor is
+    expected to be in ``N x C x H x W`` format, and is returned in ``float32`` format. Spatial groundtruth
+    tensors (e.g. ``N x H x W`` label maps) are cropped along with their input using nearest-neighbor
+    interpolation.
+
+    Attributes:
+        output_size: the output size of the crops, in (width, height) format.
+        scale: the range of the crop areas, relative to the area of the images.
+        ratio: the range of the aspect ratios (width over height) of the crops.
+        probability: the probability that each sample will be cropped (otherwise, it is only resized).
+    """
+
+    def __init__(self, output_size, scale=(0.08, 1.0), ratio=(3 / 4, 4 / 3), probability=1.0):
+        """Validates and copies the crop parameters.
+
+        Args:
+            output_size: the output size of the crops, in (width, height) format (or a single int for square crops).
+            scale: the range of the crop areas, relative to the area of the images.
+            ratio: the range of the aspect ratios (width over height) of the crops.
+            probability: the probability that each sample will be cropped (otherwise, it is only resized).
+        """
+        if isinstance(output_size, int):
+            output_size = (output_size, output_size)
+        assert isinstance(output_size, (list, tuple)) and len(output_size) == 2 and all([s > 0 for s in output_size]), \
+            "invalid output size (should be a positive int or a pair of positive ints)"
+        assert isinstance(scale, (list, tuple)) and len(scale) == 2 and 0 < scale[0] <= scale[1] <= 1, \
+            "invalid crop area scale range (should be a pair of values in ]0,1])"
+        assert isinstance(ratio, (list, tuple)) and len(ratio) == 2 and 0 < ratio[0] <= ratio[1], \
+            "invalid crop aspect ratio range"
+        assert 0 <= probability <= 1, "invalid probability value (range is [0,1]"
+        self.output_size = tuple(output_size)
+        self.scale = tuple(scale)
+        self.ratio = tuple(ratio)
+        self.probability = probability
+
+    def __call__(self, tensor, target=None):
+        """Crops and resizes the samples of a minibatch (and their spatial groundtruth) using random per-sample regions.
+
+        Args:
+            tensor: the minibatch input tensor to transform.
+            target: the minibatch groundtruth tensor (optional).
+
+        Returns:
+            The transformed input and groundtruth tensors.
+        """
+        assert isinstance(tensor, torch.Tensor) and tensor.dim() == 4, "input should be a N x C x H x W tensor"
+        count, (height, width), device = tensor.shape[0], tensor.shape[-2:], tensor.device
+        mask = _get_apply_mask(count, self.probability, device)
+        area = _uniform(count, self.scale[0], self.scale[1], device)
+        aspect = torch.exp(_uniform(count, math.log(self.ratio[0]), math.log(self.ratio[1]), device))
+        # crop sizes and centers are expressed relative to the image sizes, in normalized [-1,1] coordinates
+        crop_w = torch.sqrt(area * aspect * height / width).clamp(max=1)
+        crop_h = torch.sqrt(area / aspect * width / height).clamp(max=1)
+        crop_w, crop_h = torch.where(mask, crop_w, torch.ones_like(crop_w)), torch.where(mask, crop_h, torch.ones_like(crop_h))
+        center_x = (torch.rand(count, device=device) * 2 - 1) * (1 - crop_w)
+        center_y = (torch.rand(count, device=device) * 2 - 1) * (1 - crop_h)
+        theta = torch.zeros((count, 2, 3), dtype=torch.float32, device=device)
+        theta[:, 0, 0], theta[:, 0, 2], theta[:, 1, 1], theta[:, 1, 2] = crop_w, center_x, crop_h, center_y
+        size = (self.output_size[1], self.output_size[0])
+        if _is_spatial_target(tensor, target):
+            target = _warp(target, theta, size, mode="nearest", padding_mode="border")
+        # crop regions are always inside the images, but their borders can be past the outermost pixel centers
+        return _warp(tensor, theta, size, padding_mode="border"), target
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(output_size={repr(self.output_size)}, scale={repr(self.scale)}, ratio={repr(self.ratio)}, " + \
+            f"probability={repr(self.probability)})"
+
+
+class BatchRandomAffine:
+    """Applies random rotations, translations, and scaling to the samples of a minibatch.
+
+    The transformations are applied around the center of the images, and all samples are resampled at
+    once with bilinear interpolation. Regions outside the original images are filled with zeros. The input
+    tensor is expected to be in ``N x C x H x W`` format, and is returned in ``float32`` format. Spatial
+    groundtruth tensors (e.g. ``N x H x W`` label maps) are transformed along with their input using
+    nearest-neighbor interpolation, and their outside regions are filled with ``target_fill``.
+
+    Attributes:
+        degrees: the maximum rotation angle (in degrees) to apply in either direction.
+        translate: the maximum horizontal and vertical translations to apply in either direction, relative
+            to the image sizes.
+        scale: the range of the scaling factors to apply.
+        probability: the probability that each sample will be transformed.
+        target_fill: the value used to fill the regions outside the original groundtruth maps.
+    """
+
+    def __init__(self, degrees=0.0, translate=(0.0, 0.0), scale=(1.0, 1.0), probability=1.0, target_fill=0):
+        """Validates and copies the transformation parameters.
+
+        Args:
+            degrees: the maximum rotation angle (in degrees) to apply in either direction.
+            translate: the maximum horizontal and vertical translations to apply in either direction, relative
+                to the image sizes.
+            scale: the range of the scaling factors to apply.
+            probability: the probability that each sample will be transformed.
+            target_fill: the value used to fill the regions outside the original groundtruth maps.
+        """
+        assert degrees >= 0, "maximum rotation angle should be positive"
+        assert isinstance(translate, (list, tuple)) and len(translate) == 2 and all([0 <= t <= 1 for t in translate]), \
+            "invalid translation range (should be a pair of values in [0,1])"
+        assert isinstance(scale, (list, tuple)) and len(scale) == 2 and 0 < scale[0] <= scale[1], "invalid scale range"
+        assert 0 <= probability <= 1, "invalid probability value (range is [0,1]"
+        self.degrees = degrees
+        self.translate = tuple(translate)
+        self.scale = tuple(scale)
+        self.probability = probability
+        self.target_fill = target_fill
+
+    def __call__(self, tensor, target=None):
+        """Transforms the samples of a minibatch (and their spatial groundtruth) using random per-sample parameters.
+
+        Args:
+            tensor: the minibatch input tensor to transform.
+            target: the minibatch groundtruth tensor (optional).
+
+        Returns:
+            The transformed input and groundtruth tensors.
+        """
+        assert isinstance(tensor, torch.Tensor) and tensor.dim() == 4, "input should be a N x C x H x W tensor"
+        count, (height, width), device = tensor.shape[0], tensor.shape[-2:], tensor.device
+        mask = _get_apply_mask(count, self.probability, device)
+        angle = _uniform(count, -self.degrees, self.degrees, device) * (math.pi / 180)
+        scale = _uniform(count, self.scale[0], self.scale[1], device)
+        shift_x = _uniform(count, -self.translate[0], self.translate[0], device) * 2
+        shift_y = _uniform(count, -self.translate[1], self.translate[1], device) * 2
+        angle, shift_x, shift_y = [torch.where(mask, v, torch.zeros_like(v)) for v in [angle, shift_x, shift_y]]
+        scale = torch.where(mask, scale, torch.ones_like(scale))
+        # theta maps output coords to input coords, i.e. it inverts the forward transform; since normalized
+        # coordinates are stretched differently on both axes, the rotation is corrected by the aspect ratio
+        cos, sin = torch.cos(angle) / scale, torch.sin(angle) / scale
+        theta = torch.zeros((count, 2, 3), dtype=torch.float32, device=device)
+        theta[:, 0, 0], theta[:, 0, 1], theta[:, 1, 0], theta[:, 1, 1] = cos, sin * height / width, -sin * width / height, cos
+        theta[:, 0, 2] = -(theta[:, 0, 0] * shift_x + theta[:, 0, 1] * shift_y)
+        theta[:, 1, 2] = -(theta[:, 1, 0] * shift_x + theta[:, 1, 1] * shift_y)
+        if _is_spatial_target(tensor, target):
+            target = _warp(target, theta, (height, width), mode="nearest", fill=self.target_fill)
+        return _warp(tensor, theta, (height, width)), target
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(degrees={repr(self.degrees)}, translate={repr(self.translate)}, scale={repr(self.scale)}, " + \
+            f"probability={repr(self.probability)}, target_fill={repr(self.target_fill)})"
+
+
+class BatchColorJitter:
+    """Randomly changes the brightness, contrast, and saturation of the samples of a minibatch.
+
+    Each factor is drawn uniformly in ``[max(0, 1 - x), 1 + x]`` for each sample, where ``x`` is the
+    corresponding constructor argument, and the adjustments are applied in that order. The input tensor
+    is expected to be in ``N x C x H x W`` format (with RGB channels for saturation changes), and it should
+    not be normalized yet. It is returned in ``float32`` format. The groundtruth is left untouched.
+
+    Attributes:
+        brightness: the maximum relative brightness change.
+        contrast: the maximum relative contrast change.
+        saturation: the maximum relative saturation change (requires 3-channel RGB inputs).
+        probability: the probability that each sample will be transformed.
+        max_value: the maximum pixel value used to clip the outputs (e.g. 255 for byte images), if needed.
+    """
+
+    def __init__(self, brightness=0.0, contrast=0.0, saturation=0.0, probability=1.0, max_value=None):
+        """Validates and copies the color jitter parameters.
+
+        Args:
+            brightness: the maximum relative brightness change.
+            contrast: the maximum relative contrast change.
+            saturation: the maximum relative saturation change (requires 3-channel RGB inputs).
+            probability: the probability that each sample will be transformed.
+            max_value: the maximum pixel value used to clip the outputs (e.g. 255 for byte images), if needed.
+        """
+        assert brightness >= 0 and contrast >= 0 and saturation >= 0, "color jitter factors should be positive"
+        assert 0 <= probability <= 1, "invalid probability value (range is [0,1]"
+        assert max_value is None or max_value > 0, "invalid maximum pixel value"
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.probability = probability
+        self.max_value = max_value
+
+    def _get_factors(self, amount, mask):
+        """Returns the per-sample adjustment factors (broadcastable over N x C x H x W tensors)."""
+        factors = _uniform(mask.shape[0], max(0.0, 1 - amount), 1 + amount, mask.device)
+        return torch.where(mask, factors, torch.ones_like(factors)).view(-1, 1, 1, 1)
+
+    @staticmethod
+    def _get_gray(tensor):
+        """Returns the N x 1 x H x W grayscale version of a minibatch tensor."""
+        if tensor.shape[1] != 3:
+            return tensor.mean(dim=1, keepdim=True)
+        weights = torch.as_tensor([0.299, 0.587, 0.114], dtype=tensor.dtype, device=tensor.device)
+        return (tensor * weights.view(1, 3, 1, 1)).sum(dim=1, keepdim=True)
+
+    def __call__(self, tensor, target=None):
+        """Adjusts the colors of the samples of a minibatch using random per-sample factors.
+
+        Args:
+            tensor: the minibatch input tensor to transform.
+            target: the minibatch groundtruth tensor (optional, returned as-is).
+
+        Returns:
+            The transformed input and groundtruth tensors.
+        """
+        assert isinstance(tensor, torch.Tensor) and tensor.dim() == 4, "input should be a N x C x H x W tensor"
+        tensor = tensor.float()
+        mask = _get_apply_mask(tensor.shape[0], self.probability, tensor.device)
+        if self.brightness > 0:
+            tensor = tensor * self._get_factors(self.brightness, mask)
+        if self.contrast > 0:
+            mean = self._get_gray(tensor).mean(dim=(1, 2, 3), keepdim=True)
+            tensor = torch.lerp(mean.expand_as(tensor), tensor, self._get_factors(self.contrast, mask))
+        if self.saturation > 0:
+            assert tensor.shape[1] == 3, "saturation changes require 3-channel RGB inputs"
+            tensor = torch.lerp(self._get_gray(tensor).expand_as(tensor), tensor, self._get_factors(self.saturation, mask))
+        if self.max_value is not None:
+            tensor = tensor.clamp(0, self.max_value)
+        return tensor, target
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(brightness={repr(self.brightness)}, contrast={repr(self.contrast)}, saturation={repr(self.saturation)}, " + \
+            f"probability={repr(self.probability)}, max_value={repr(self.max_value)})"
+
+
+class BatchNormalize:
+    """Normalizes the channels of the samples of a minibatch using mean and standard deviation values.
+
+    The input tensor is expected to be in ``N x C x ...`` format, and is returned in ``float32``
+    format. The groundtruth is left untouched.
+
+    Attributes:
+        mean: the per-channel mean values to subtract.
+        std: the per-channel standard deviation values to divide by.
+    """
+
+    def __init__(self, mean, std):
+        """Validates and copies the normalization parameters.
+
+        Args:
+            mean: the per-channel mean values to subtract.
+            std: the per-channel standard deviation values to divide by.
+        """
+        assert isinstance(mean, (list, tuple, np.ndarray)) and isinstance(std, (list, tuple, np.ndarray)), \
+            "mean and std values should be provided as lists or arrays"
+        assert len(mean) == len(std), "mean and std value counts should match"
+        assert all([s != 0 for s in std]), "std values should be non-null"
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self._device_params = {}  # device-specific mean and std tensors, created on first use
+
+    def __call__(self, tensor, target=None):
+        """Normalizes the channels of the samples of a minibatch.
+
+        Args:
+            tensor: the minibatch input tensor to transform.
+            target: the minibatch groundtruth tensor (optional, returned as-is).
+
+        Returns:
+            The transformed input and groundtruth tensors.
+        """
+        assert isinstance(tensor, torch.Tensor) and tensor.dim() >= 2, "input should be a N x C x ... tensor"
+        assert tensor.shape[1] == len(self.mean), "unexpected minibatch tensor channel count"
+        key = (str(tensor.device), tensor.dim())
+        if key not in self._device_params:
+            shape = (1, -1, *([1] * (tensor.dim() - 2)))
+            self._device_params[key] = (torch.as_tensor(self.mean, device=tensor.device).view(shape),
+                                        torch.as_tensor(self.std, device=tensor.device).view(shape))
+        mean, std = self._device_params[key]
+        return (tensor.float() - mean) / std, target
+
+    def __getstate__(self):
+        """Returns the state of the operation without its device-specific parameters."""
+        return {**self.__dict__, "_device_params": {}}
+
+    def __repr__(self):
+        """Provides print-friendly output for class attributes."""
+        return self.__class__.__module__ + "." + self.__class__.__qualname__ + \
+            f"(mean={repr(self.mean.tolist())}, std={repr(self.std.tolist())})"
@@ -40,6 +40,16 @@ class Compose(torchvision.transforms.Compose):
             transforms = transforms if isinstance(transforms, list) else [transforms]
         super(Compose, self).__init__(transforms)
 
+    def __call__(self, sample):
+        """Applies the transformations to a sample, passing PIL images directly between chained wrappers."""
+        for idx, t in enumerate(self.transforms):
+            if idx + 1 < len(self.transforms) and isinstance(t, thelper.transforms.wrappers.TransformWrapper) and \
+                    t.can_chain_pil(self.transforms[idx + 1]):
+                sample = t(sample, keep_pil=True)
+            else:
+                sample = t(sample)
+        return sample
+
     def invert(self, sample):
         """Tries to invert the transformations applied to a sample.
 
@@ -3,8 +3,11 @@
 This module contains utility functions used to instantiate transformation/augmentation ops.
 """
 
+import functools
 import logging
+import math
 
+import numpy as np
 import torchvision.transforms
 import torchvision.utils
 
@@ -224,3 +227,171 @@ def load_augments(config):
     if "transforms" in config and config["transforms"]:
         augments = thelper.transforms.load_transforms(config["transforms"])
     return augments, augments_append
+
+
+def load_batch_transforms(stages):
+    """Loads a batch-level transformation pipeline from a list of stages.
+
+    Batch-level transformations are applied by the session runner to collated minibatch tensors once they
+    are uploaded to their compute device, after the deferred normalization stages (if any). The operations
+    are typically taken from :mod:`thelper.transforms.batch`, and they process all samples of a minibatch
+    at once, with different random parameters for each sample.
+
+    Usage example inside a session configuration file::
+
+        # ...
+        # the 'loaders' field can contain several batch-level pipelines
+        # (see 'thelper.data.utils.create_loaders' for more information on these pipelines)
+        "loaders": {
+            # ...
+            # the 'train_batch_transforms' operations are applied to training minibatches only
+            "train_batch_transforms": [
+                {
+                    "operation": "thelper.transforms.batch.BatchRandomResizedCrop",
+                    "params": {"output_size": [224, 224]}
+                },
+                {
+                    "operation": "thelper.transforms.batch.BatchRandomFlip",
+                    "params": {"axis": "horizontal", "probability": 0.5}
+                },
+                {
+                    "operation": "thelper.transforms.batch.BatchNormalize",
+                    "params": {"mean": [123.7, 116.3, 103.5], "std": [58.4, 57.1, 57.4]}
+                }
+            ],
+            # ...
+        }
+        # ...
+
+    Args:
+        stages: a list defining a series of batch-level transformations to apply as a single pipeline.
+
+    Returns:
+        A batch-level transformation pipeline (or a single operation), or ``None`` if no stage is defined.
+
+    .. seealso::
+        | :class:`thelper.transforms.batch.BatchCompose`
+        | :func:`thelper.data.utils.create_loaders`
+    """
+    assert isinstance(stages, list), "expected stages to be provided as a list"
+    assert all([isinstance(stage, dict) or callable(stage) for stage in stages]), \
+        "expected all stages to be provided as dictionaries"
+    operations = []
+    for stage_idx, stage in enumerate(stages):
+        if callable(stage):
+            operations.append(stage)
+            continue
+        assert "operation" in stage and stage["operation"], f"stage #{stage_idx} is missing its operation field"
+        operation_params = thelper.utils.get_key_def(["params", "param", "parameters", "kwargs"], stage, {})
+        assert isinstance(operation_params, dict), f"stage #{stage_idx} parameters are not provided as a dictionary"
+        operations.append(thelper.utils.import_class(stage["operation"])(**operation_params))
+    if len(operations) > 1:
+        return thelper.transforms.batch.BatchCompose(operations)
+    elif len(operations) == 1:
+        return operations[0]
+    return None
+
+
+def get_output_size_hint(transforms, target_key=None):
+    """Returns the (width, height) size that images are first resized to by a transformation pipeline, if known.
+
+    This is used by image dataset parsers to decode images at a reduced resolution when they would be downscaled
+    right away anyway. Only the first operation applied to the images of the pipeline is considered, and only
+    if it is a (non-probabilistic) :class:`thelper.transforms.operations.Resize` with an absolute target size,
+    as its output then does not depend on the resolution of its input, or a
+    :class:`thelper.transforms.operations.RandomResizedCrop` with an absolute output size and relative minimum
+    crop widths and heights. In the latter case, the returned size is the output size divided by the minimum
+    relative crop edges, so that even the smallest crops are not upsampled. Area-based crops (i.e. those that
+    use an aspect ratio range) have edges that depend on the input aspect ratio, and give no hint.
+
+    Args:
+        transforms: the transformation pipeline (operation, list of operations, or composer) to inspect.
+        target_key: the sample key of the images; operations that target other keys only are skipped.
+
+    Returns:
+        The (width, height) tuple of the output of the first operation, or ``None`` if it cannot be determined.
+    """
+    stack = [transforms]
+    while stack:
+        op = stack.pop(0)
+        if op is None:
+            continue
+        if isinstance(op, list):
+            stack = op + stack
+            continue
+        if isinstance(op, thelper.transforms.Compose):
+            stack = list(op.transforms) + stack
+            continue
+        if isinstance(op, thelper.transforms.wrappers.TransformWrapper):
+            if op.target_keys is not None and target_key is not None and target_key not in op.target_keys:
+                continue  # this operation does not touch the images
+            if op.probability < 1:
+                return None
+            op = op.opcall
+        if isinstance(op, thelper.transforms.operations.Resize):
+            if op.fx or op.fy or not op.dsize[0] or not op.dsize[1]:
+                return None
+            return tuple(op.dsize)
+        if isinstance(op, thelper.transforms.operations.RandomResizedCrop):
+            if op.probability < 1 or op.output_size is None or not isinstance(op.output_size[0], int) or \
+                    op.ratio is not None or not isinstance(op.input_size[0][0], float):
+                return None
+            return tuple([int(math.ceil(size / min_edge)) for size, min_edge in zip(op.output_size, op.input_size[0])])
+        return None  # any other operation might depend on the input resolution
+    return None
+
+
+def split_device_transforms(transforms, target_key):
+    """Splits the trailing normalization stages of a transformation pipeline so they can be applied on device.
+
+    This is used by the data loaders when ``defer_normalization`` is turned on, in order to stop the sample
+    transformation pipeline before the images are converted to ``float32`` (and thus keep their compact
+    ``uint8`` format for transport). The trailing stages that can be moved are the non-probabilistic
+    :class:`thelper.transforms.operations.NormalizeZeroMeanUnitVar`,
+    :class:`thelper.transforms.operations.NormalizeMinMax`, :class:`thelper.transforms.operations.Transpose`,
+    and :class:`thelper.transforms.operations.ToNumpy` operations that only target the given key. Stages
+    placed before the first normalization operation are kept in the pipeline, as they do not need float data.
+
+    Args:
+        transforms: the transformation pipeline (operation, or composer) to split.
+        target_key: the sample key of the images that should be normalized on device.
+
+    Returns:
+        A tuple of the remaining transformation pipeline (or ``None`` if it becomes empty) and of the
+        :class:`thelper.transforms.batch.DeviceNormalize` operation to apply on minibatches (or ``None``
+        if no stage could be moved, in which case the pipeline is returned as-is).
+
+    .. seealso::
+        | :class:`thelper.transforms.batch.DeviceNormalize`
+        | :func:`thelper.data.utils.create_loaders`
+    """
+    stack, ops = [transforms], []
+    while stack:  # flatten the (possibly nested) composers into a single list of stages
+        op = stack.pop(0)
+        if isinstance(op, thelper.transforms.Compose):
+            stack = list(op.transforms) + stack
+        elif op is not None:
+            ops.append(op)
+    norm_types = (thelper.transforms.operations.NormalizeZeroMeanUnitVar, thelper.transforms.operations.NormalizeMinMax)
+    move_types = (*norm_types, thelper.transforms.operations.Transpose, thelper.transforms.operations.ToNumpy)
+    moved_ops = []
+    while ops:
+        op = ops[-1]
+        if not isinstance(op, thelper.transforms.wrappers.TransformWrapper) or op.probability < 1 or op.convert_pil or \
+                op.target_keys is None or list(op.target_keys) != [target_key]:
+            break
+        opcall = op.opcall
+        if isinstance(opcall, functools.partial):
+            if opcall.keywords or opcall.args:
+                break
+            opcall = opcall.func
+        if not isinstance(opcall, move_types) or (isinstance(opcall, norm_types) and opcall.out_type != np.float32):
+            break
+        moved_ops.insert(0, (op, opcall))
+        ops.pop()
+    while moved_ops and not isinstance(moved_ops[0][1], norm_types):
+        ops.append(moved_ops.pop(0)[0])  # stages before the first normalization stay in the pipeline
+    if not moved_ops:
+        return transforms, None
+    remaining = ops[0] if len(ops) == 1 else thelper.transforms.Compose(ops) if ops else None
+    return remaining, thelper.transforms.batch.DeviceNormalize([opcall for _, opcall in moved_ops])
@@ -331,6 +331,14 @@ class TransformWrapper:
         ``torchvision.transforms.RandomApply``, or simply provide the probability of applying the
         transforms to this wrapper's constructor.
 
+    Dictionary samples with a fixed layout (i.e. the same keys and value types for every sample) are
+    processed through a direct dispatch plan that is built on the first call for each layout; this plan
+    skips the recursive unpacking/repacking of the sample content when all targeted values are single
+    arrays, tensors, or PIL images. Samples with other layouts (e.g. with lists of images) are processed
+    through the generic recursive logic. When wrappers that both convert images to PIL format are chained
+    in a :class:`thelper.transforms.composers.Compose` object, the intermediate PIL images are also passed
+    directly from one operation to the next instead of being converted to arrays and back.
+
     Attributes:
         operation: the wrapped operation (callable object or class name string to import).
         params: the parameters that are passed to the operation when init'd or called.
@@ -340,6 +348,12 @@ class TransformWrapper:
         linked_fate: specifies whether images given in a list/tuple should have the same fate or not.
     """
 
+    max_layout_plans = 8
+    """Maximum number of sample layouts for which dispatch plans are cached by a single wrapper."""
+
+    # PIL image modes for which an array round-trip (via ``_pack`` and ``_unpack``) gives back the same image
+    _pil_passthrough_modes = ("L", "RGB", "RGBA", "I", "F")
+
     def __init__(self, operation, params=None, probability=1, convert_pil=False, target_keys=None, linked_fate=True):
         """Receives and stores a torchvision transform operation for later use.
 
@@ -369,6 +383,7 @@ class TransformWrapper:
         self.convert_pil = convert_pil
         self.target_keys = target_keys
         self.linked_fate = linked_fate
+        self._layout_plans = {}  # sample layout to target key list (or None if the layout is unsupported)
 
     @staticmethod
     def _unpack(sample, force_flatten=False, convert_pil=False):
@@ -424,7 +439,54 @@ class TransformWrapper:
                     cvts[idx] = False
         return samples, cvts
 
-    def __call__(self, sample, force_linked_fate=False, op_seed=None, in_cvts=None):
+    def _get_layout_plan(self, sample):
+        """Returns the list of keys to transform directly in a dict sample, or ``None`` if its layout is unsupported."""
+        layout = tuple((k, type(v)) for k, v in sample.items())
+        if layout in self._layout_plans:
+            return self._layout_plans[layout]
+        keys = [k for k, v in sample.items() if (
+            (self.target_keys is None and not thelper.utils.is_scalar(v)) or
+            (self.target_keys is not None and k in self.target_keys))]
+        plan = keys if keys and all([isinstance(sample[k], (np.ndarray, torch.Tensor, PIL.Image.Image)) for k in keys]) else None
+        if plan is not None and self.target_keys is None and \
+                any([isinstance(v, torch.Tensor) for v in sample.values()]):
+            plan = None  # tensors might be scalars or not based on their content, we cannot rely on their type
+        if len(self._layout_plans) < self.max_layout_plans:
+            self._layout_plans[layout] = plan
+        return plan
+
+    @staticmethod
+    def _is_passthrough_pil(sample):
+        """Returns whether a sample is a PIL image that would be left unchanged by an array round-trip."""
+        return isinstance(sample, PIL.Image.Image) and sample.mode in TransformWrapper._pil_passthrough_modes and \
+            min(sample.size) > 1
+
+    def _call_single(self, sample, op_seed=None, keep_pil=False):
+        """Transforms a single image with linked fate (shortcut for the generic logic of ``__call__``)."""
+        if self.convert_pil and self._is_passthrough_pil(sample):
+            sample, cvts = [sample], [True]  # image was kept in PIL format by the previous wrapper
+        else:
+            sample, cvts = self._unpack(sample, convert_pil=self.convert_pil)
+            if not isinstance(sample, list):
+                sample, cvts = [sample], [cvts]
+        if self.probability >= 1 or round(np.random.uniform(0, 1), 1) <= self.probability:
+            if op_seed is None:
+                op_seed = np.random.randint(np.iinfo(np.int32).max)
+            for idx, _ in enumerate(sample):
+                if hasattr(self.opcall, "set_seed") and callable(self.opcall.set_seed):
+                    self.opcall.set_seed(op_seed)
+                sample[idx] = self.opcall(sample[idx])
+        if keep_pil and isinstance(cvts, list) and cvts[0] and self._is_passthrough_pil(sample[0]):
+            return sample[0]
+        sample, _ = TransformWrapper._pack(sample, cvts, convert_pil=self.convert_pil)
+        return sample[0]
+
+    def can_chain_pil(self, next_op):
+        """Returns whether PIL images output by this wrapper can be passed as-is to the given operation."""
+        return isinstance(next_op, TransformWrapper) and self.convert_pil and next_op.convert_pil and \
+            self.target_keys == next_op.target_keys
+
+    def __call__(self, sample, force_linked_fate=False, op_seed=None, in_cvts=None, keep_pil=False):
         """Transforms a (dict) sample, a single image, or a list of images using a wrapped operation.
 
         Args:
@@ -432,10 +494,30 @@ class TransformWrapper:
             force_linked_fate: override flag for recursive use allowing forced linking of arrays.
             op_seed: seed to set before calling the wrapped operation.
             in_cvts: holds the input conversion flag array (for recursive usage).
+            keep_pil: specifies whether single PIL images can be returned without being converted back
+                to arrays (used when chaining PIL-based wrappers; see :meth:`can_chain_pil`).
 
         Returns:
             The transformed image(s), with the same list/tuple formatting as the input.
         """
+        if in_cvts is None and (self.linked_fate or force_linked_fate):
+            if isinstance(sample, dict):
+                keys = self._get_layout_plan(sample)
+                if keys is not None:
+                    out = dict(sample)
+                    if len(keys) == 1:
+                        out[keys[0]] = self._call_single(sample[keys[0]], op_seed=op_seed, keep_pil=keep_pil)
+                    elif self.probability >= 1 or round(np.random.uniform(0, 1), 1) <= self.probability:
+                        # note: like in the generic logic below, images are never converted to PIL here
+                        if op_seed is None:
+                            op_seed = np.random.randint(np.iinfo(np.int32).max)
+                        for k in keys:
+                            if hasattr(self.opcall, "set_seed") and callable(self.opcall.set_seed):
+                                self.opcall.set_seed(op_seed)
+                            out[k] = self.opcall(sample[k])
+                    return out
+            elif isinstance(sample, (np.ndarray, torch.Tensor, PIL.Image.Image)):
+                return self._call_single(sample, op_seed=op_seed, keep_pil=keep_pil)
         if isinstance(sample, dict):
             # recursive call for unpacking sample content w/ target keys
             assert in_cvts is None, "top-level call should never provide in_cvts"
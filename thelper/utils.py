@@ -828,10 +828,10 @@ def decode_data(data, approach="lz4", **kwargs):
         import lz4
         return lz4.frame.decompress(data, **kwargs)
     elif approach in ["jpg", "jpeg", "png"]:
+        import cv2 as cv  # noqa: F401  (might be needed to evaluate the flags string below)
         kwargs = copy.deepcopy(kwargs)
         if isinstance(kwargs["flags"], str):  # required arg by opencv
             kwargs["flags"] = eval(kwargs["flags"])
-        import cv2 as cv
         return cv.imdecode(data, **kwargs)
     else:
         raise NotImplementedError